@@ -37,7 +37,17 @@ from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
-from core.models import Group, MetaGroup, Notification, Page, RealGroup, SithFile, User
+from core.models import (
+    Group,
+    MetaGroup,
+    Notification,
+    Page,
+    PermissionSnapshot,
+    RealGroup,
+    SithFile,
+    User,
+    group_registry,
+)
 
 # Create your models here.
 
@@ -129,7 +139,7 @@ class Club(models.Model):
             self.home.view_groups.set([member, subscribers])
             self.home.save()
         self.make_page()
-        cache.set(f"sith_club_{self.unix_name}", self)
+        group_registry.invalidate()
 
     def get_absolute_url(self):
         return reverse("club:club_view", kwargs={"club_id": self.id})
@@ -164,6 +174,7 @@ class Club(models.Model):
             Group.objects.filter(name=old_name + settings.SITH_MEMBER_SUFFIX).update(
                 name=new_name + settings.SITH_MEMBER_SUFFIX
             )
+            group_registry.invalidate()
 
             if self.home:
                 self.home.name = new_name
@@ -216,8 +227,8 @@ class Club(models.Model):
         # Invalidate the cache of this club and of its memberships
         for membership in self.members.ongoing().select_related("user"):
             cache.delete(f"membership_{self.id}_{membership.user.id}")
-        cache.delete(f"sith_club_{self.unix_name}")
         super().delete(*args, **kwargs)
+        group_registry.invalidate()
 
     def get_display_name(self):
         return self.name
@@ -292,7 +303,9 @@ class MembershipQuerySet(models.QuerySet):
         nb_rows = super().update(**kwargs)
         if nb_rows > 0:
             # if at least a row was affected, refresh the cache
-            for membership in self.all():
+            memberships = list(self.all())
+            PermissionSnapshot.invalidate(m.user_id for m in memberships)
+            for membership in memberships:
                 if membership.end_date is not None:
                     cache.set(
                         f"membership_{membership.club_id}_{membership.user_id}",
@@ -316,6 +329,7 @@ class MembershipQuerySet(models.QuerySet):
         ids = list(self.values_list("club_id", "user_id"))
         nb_rows, _ = super().delete()
         if nb_rows > 0:
+            PermissionSnapshot.invalidate(user_id for _, user_id in ids)
             for club_id, user_id in ids:
                 cache.set(f"membership_{club_id}_{user_id}", "not_member")
 
@@ -192,7 +192,7 @@ class ClubView(ClubTabsMixin, DetailView):
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
         if self.object.page and self.object.page.revisions.exists():
-            kwargs["page_revision"] = self.object.page.revisions.last().content
+            kwargs["page_revision"] = self.object.page.revisions.last().content_html
         return kwargs
 
 
@@ -206,7 +206,7 @@ class ClubRevView(ClubView):
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
-        kwargs["page_revision"] = self.revision.content
+        kwargs["page_revision"] = self.revision.content_html
         return kwargs
 
 
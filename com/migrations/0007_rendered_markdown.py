@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:45
+
+from django.db import migrations
+
+import core.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("com", "0006_remove_sith_index_page"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="news",
+            name="content_html",
+            field=core.fields.RenderedMarkdownField(
+                editable=False, null=True, source="content"
+            ),
+        ),
+        migrations.AddField(
+            model_name="news",
+            name="summary_html",
+            field=core.fields.RenderedMarkdownField(
+                editable=False, null=True, source="summary"
+            ),
+        ),
+    ]
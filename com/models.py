@@ -34,6 +34,7 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from club.models import Club
+from core.fields import RenderedMarkdownField
 from core.models import Notification, Preferences, RealGroup, User
 
 
@@ -66,7 +67,9 @@ class News(models.Model):
 
     title = models.CharField(_("title"), max_length=64)
     summary = models.TextField(_("summary"))
+    summary_html = RenderedMarkdownField(source="summary")
     content = models.TextField(_("content"))
+    content_html = RenderedMarkdownField(source="content")
     type = models.CharField(
         _("type"), max_length=16, choices=NEWS_TYPES, default="EVENT"
     )
@@ -1,7 +1,10 @@
 import pytest
+from django.core.cache import cache
 from django.core.management import call_command
 from django.utils.translation import activate
 
+from core.models import group_registry
+
 
 @pytest.fixture(scope="session")
 def django_db_setup(django_db_setup, django_db_blocker):
@@ -12,3 +15,17 @@ def django_db_setup(django_db_setup, django_db_blocker):
 @pytest.fixture(scope="session", autouse=True)
 def set_default_language():
     activate("fr")
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Clear the cache between tests.
+
+    The database is rolled back at the end of each test,
+    but the cache and the group registry aren't,
+    so they could keep stale data from a previous test
+    (like the permissions of a user or the groups of a club).
+    """
+    yield
+    cache.clear()
+    group_registry.reset()
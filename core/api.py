@@ -12,15 +12,17 @@ from ninja_extra.schemas import PaginatedResponseSchema
 
 from club.models import Mailing
 from core.api_permissions import CanView, IsLoggedInCounter, IsOldSubscriber, IsRoot
+from core.markdown import render_markdown_many
 from core.models import User
 from core.schemas import (
     FamilyGodfatherSchema,
+    MarkdownBatchSchema,
     MarkdownSchema,
     UserFamilySchema,
     UserFilterSchema,
     UserProfileSchema,
 )
-from core.templatetags.renderer import markdown
+from core.templatetags.renderer import markdown, rendered_markdown
 
 
 @api_controller("/markdown")
@@ -30,6 +32,15 @@ class MarkdownController(ControllerBase):
         """Convert the markdown text into html."""
         return HttpResponse(markdown(body.text), content_type="text/html")
 
+    @route.post("/batch", response=list[str], url_name="markdown_batch")
+    def render_markdown_batch(self, body: MarkdownBatchSchema):
+        """Convert many markdown texts into html at once.
+
+        The html of each text is returned in the same order as the texts,
+        in the same format as the single text endpoint.
+        """
+        return [rendered_markdown(html) for html in render_markdown_many(body.texts)]
+
 
 @api_controller("/mailings")
 class MailingListController(ControllerBase):
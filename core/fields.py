@@ -3,8 +3,10 @@ from pathlib import Path
 from django.core.exceptions import FieldError
 from django.db import models
 from django.db.models.fields.files import ImageFieldFile
+from django.db.models.query_utils import DeferredAttribute
 from PIL import Image
 
+from core.markdown import render_markdown
 from core.utils import resize_image_explicit
 
 
@@ -123,3 +125,61 @@ class ResizedImageField(models.ImageField):
             kwargs["height"] = self.height
         kwargs["force_format"] = self.force_format
         return name, path, args, kwargs
+
+
+class RenderedMarkdownDescriptor(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        html = super().__get__(instance, cls)
+        if html is None:
+            # not rendered yet, because the object was saved
+            # before the field existed or with a bulk query
+            html = render_markdown(getattr(instance, self.field.source))
+        return html
+
+    def __set__(self, instance, value):
+        # a data descriptor, so that __get__ is called even once the value is loaded
+        instance.__dict__[self.field.attname] = value
+
+
+class RenderedMarkdownField(models.TextField):
+    """The HTML of a markdown field of the same model.
+
+    The HTML is rendered each time the object is saved,
+    so that it doesn't need to be rendered each time it is displayed.
+    When it hasn't been rendered yet, it is rendered when it's read
+    (see the `render_markdown` command to fill it for all the objects).
+
+    Warning:
+        The HTML isn't rendered by `QuerySet.update`,
+        nor by `save(update_fields=...)` if the field isn't in `update_fields`.
+
+    Examples:
+        ```python
+        class News(models.Model):
+            content = models.TextField()
+            content_html = RenderedMarkdownField(source="content")
+        ```
+
+    Args:
+        source: the name of the field containing the markdown
+    """
+
+    descriptor_class = RenderedMarkdownDescriptor
+
+    def __init__(self, source: str, **kwargs):
+        self.source = source
+        kwargs.setdefault("null", True)
+        kwargs.setdefault("editable", False)
+        super().__init__(**kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        html = render_markdown(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, html)
+        return html
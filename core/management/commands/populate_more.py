@@ -15,13 +15,16 @@ from faker import Faker
 from club.models import Club, Membership
 from core.models import RealGroup, User
 from counter.models import (
+    BalanceMovement,
     Counter,
     Customer,
     Permanency,
     Product,
     ProductType,
     Refilling,
+    RefillingRollup,
     Selling,
+    SellingRollup,
 )
 from forum.models import Forum, ForumMessage, ForumTopic
 from pedagogy.models import UV
@@ -42,7 +45,6 @@ class Command(BaseCommand):
         self.stdout.write("Creating users...")
         users = [
             User(
-                username=self.faker.user_name(),
                 first_name=self.faker.first_name(),
                 last_name=self.faker.last_name(),
                 date_of_birth=self.faker.date_of_birth(minimum_age=15, maximum_age=25),
@@ -52,7 +54,8 @@ class Command(BaseCommand):
             )
             for _ in range(600)
         ]
-        # there may a duplicate or two
+        User.generate_usernames(users)
+        # there may a duplicate email or two
         # Not a problem, we will just have 599 users instead of 600
         User.objects.bulk_create(users, ignore_conflicts=True)
         users = list(User.objects.order_by("-id")[: len(users)])
@@ -114,17 +117,10 @@ class Command(BaseCommand):
             return sub
 
         subscriptions = []
-        customers = []
         # first set of subscriptions
-        for i, user in enumerate(users):
+        for user in users:
             sub = prepare_subscription(user, self.faker.past_date("-10y"))
             subscriptions.append(sub)
-            customers.append(
-                Customer(
-                    user=user,
-                    account_id=f"{9900 + i}{self.faker.random_lowercase_letter()}",
-                )
-            )
             while sub.subscription_end < now().date() and random.random() > 0.7:
                 # 70% chances to subscribe again
                 # (expect if it would make the subscription start after tomorrow)
@@ -133,7 +129,7 @@ class Command(BaseCommand):
                 )
                 subscriptions.append(sub)
         Subscription.objects.bulk_create(subscriptions)
-        Customer.objects.bulk_create(customers, ignore_conflicts=True)
+        Customer.bulk_get_or_create(users)
 
     def make_club(self, club: Club, members: list[User], old_members: list[User]):
         def zip_roles(users: list[User]) -> Iterator[tuple[User, int]]:
@@ -282,6 +278,18 @@ class Command(BaseCommand):
                 Decimal("0"),
             ),
         ).annotate(real_balance=F("money_in") - F("money_out"))
+        customers = list(customers.annotate_ledger_balance())
+        # the refillings and the sellings have been created with bulk_create,
+        # so they are missing from the ledger
+        BalanceMovement.objects.bulk_create(
+            BalanceMovement(
+                customer=c,
+                amount=c.real_balance - c.ledger_balance,
+                label="Generated operations",
+            )
+            for c in customers
+            if c.real_balance != c.ledger_balance
+        )
         for c in customers:
             c.amount = c.real_balance
         Customer.objects.bulk_update(customers, fields=["amount"])
@@ -355,6 +363,8 @@ class Command(BaseCommand):
             sales.extend(this_customer_sales)
         Refilling.objects.bulk_create(reloads)
         Selling.objects.bulk_create(sales)
+        RefillingRollup.rebuild()
+        SellingRollup.rebuild()
         self._update_balances()
 
     def create_permanences(self, sellers: list[User]):
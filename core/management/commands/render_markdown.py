@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.fields import RenderedMarkdownField
+from core.markdown import render_markdown
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the markdown of the pages, news, forum messages and UV comments "
+        "which hasn't been rendered yet. "
+        "With --all, render it again for all the objects, "
+        "which is needed when the markdown syntax changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", help="Render all the objects again", action="store_true"
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of objects saved at once",
+            type=int,
+            default=500,
+        )
+
+    def handle(self, *args, **options):
+        for model in apps.get_models():
+            fields = [
+                f
+                for f in model._meta.get_fields()
+                if isinstance(f, RenderedMarkdownField)
+            ]
+            if not fields:
+                continue
+            queryset = model.objects.only("pk", *(f.source for f in fields))
+            if not options["all"]:
+                missing = Q()
+                for field in fields:
+                    missing |= Q(**{f"{field.name}__isnull": True})
+                queryset = queryset.filter(missing)
+            batch = []
+            nb_rendered = 0
+            for obj in queryset.iterator(chunk_size=options["batch_size"]):
+                for field in fields:
+                    setattr(
+                        obj, field.attname, render_markdown(getattr(obj, field.source))
+                    )
+                batch.append(obj)
+                if len(batch) >= options["batch_size"]:
+                    model.objects.bulk_update(batch, [f.name for f in fields])
+                    nb_rendered += len(batch)
+                    batch = []
+            model.objects.bulk_update(batch, [f.name for f in fields])
+            nb_rendered += len(batch)
+            self.stdout.write(f"{model._meta.label}: {nb_rendered} objects rendered")
@@ -14,10 +14,12 @@
 #
 from __future__ import annotations
 
+import hashlib
 import re
 from typing import TYPE_CHECKING
 
 import mistune
+from django.core.cache import cache
 from django.urls import reverse
 from mistune import HTMLRenderer, Markdown
 
@@ -130,3 +132,39 @@ markdown = mistune.create_markdown(
         "url",
     ],
 )
+
+
+RENDER_CACHE_TIMEOUT = 24 * 3600
+
+
+def _cache_key(text: str) -> str:
+    return f"markdown_{hashlib.sha256(text.encode()).hexdigest()}"
+
+
+def render_markdown(text: str) -> str:
+    """Return the HTML of the markdown text, from the cache if possible.
+
+    The rendered HTML is cached with a hash of the text as key,
+    so the same text is rendered once, whatever the object it belongs to.
+    """
+    return render_markdown_many([text])[0]
+
+
+def render_markdown_many(texts: list[str]) -> list[str]:
+    """Return the HTML of all the markdown texts, in the same order.
+
+    The cache is read and filled with a single operation for all the texts,
+    and each distinct text is rendered only once.
+    """
+    keys = {text: _cache_key(text) for text in texts if text}
+    cached = cache.get_many(keys.values()) if keys else {}
+    rendered = {text: cached.get(key) for text, key in keys.items()}
+    missing = [text for text, html in rendered.items() if html is None]
+    for text in missing:
+        rendered[text] = markdown(text)
+    if missing:
+        cache.set_many(
+            {keys[text]: rendered[text] for text in missing},
+            timeout=RENDER_CACHE_TIMEOUT,
+        )
+    return [rendered.get(text, "") for text in texts]
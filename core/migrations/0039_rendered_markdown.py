@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:45
+
+from django.db import migrations
+
+import core.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0038_alter_preferences_receive_weekmail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pagerev",
+            name="content_html",
+            field=core.fields.RenderedMarkdownField(
+                editable=False, null=True, source="content"
+            ),
+        ),
+    ]
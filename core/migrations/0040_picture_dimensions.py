@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0039_rendered_markdown"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sithfile",
+            name="dominant_color",
+            field=models.CharField(
+                blank=True, default="", max_length=7, verbose_name="dominant color"
+            ),
+        ),
+        migrations.AddField(
+            model_name="sithfile",
+            name="height",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="height"
+            ),
+        ),
+        migrations.AddField(
+            model_name="sithfile",
+            name="width",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="width"
+            ),
+        ),
+    ]
@@ -27,9 +27,10 @@ import importlib
 import logging
 import os
 import unicodedata
+import uuid
 from datetime import date, timedelta
 from pathlib import Path
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
 
 from django.conf import settings
 from django.contrib.auth.models import (
@@ -51,6 +52,7 @@ from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.core.mail import send_mail
 from django.db import models, transaction
+from django.db.models import Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
@@ -59,6 +61,8 @@ from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 from pydantic.v1 import NonNegativeInt
 
+from core.fields import RenderedMarkdownField
+
 if TYPE_CHECKING:
     from club.models import Club
 
@@ -96,13 +100,11 @@ class Group(AuthGroup):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        cache.set(f"sith_group_{self.id}", self)
-        cache.set(f"sith_group_{self.name.replace(' ', '_')}", self)
+        group_registry.invalidate()
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
-        cache.delete(f"sith_group_{self.id}")
-        cache.delete(f"sith_group_{self.name.replace(' ', '_')}")
+        group_registry.invalidate()
 
 
 class MetaGroup(Group):
@@ -128,27 +130,13 @@ class MetaGroup(Group):
     def associated_club(self) -> Club | None:
         """Return the group associated with this meta group.
 
-        The result of this function is cached
-
+        The club is taken from the group registry,
+        so this doesn't query the database.
 
         Returns:
             The associated club if it exists, else None
         """
-        from club.models import Club
-
-        if self.name.endswith(settings.SITH_BOARD_SUFFIX):
-            # replace this with str.removesuffix as soon as Python
-            # is upgraded to 3.10
-            club_name = self.name[: -len(settings.SITH_BOARD_SUFFIX)]
-        elif self.name.endswith(settings.SITH_MEMBER_SUFFIX):
-            club_name = self.name[: -len(settings.SITH_MEMBER_SUFFIX)]
-        else:
-            return None
-        club = cache.get(f"sith_club_{club_name}")
-        if club is None:
-            club = Club.objects.filter(unix_name=club_name).first()
-            cache.set(f"sith_club_{club_name}", club)
-        return club
+        return group_registry.get_club(self.id)
 
 
 class RealGroup(Group):
@@ -174,11 +162,105 @@ def validate_promo(value):
         )
 
 
+class GroupRegistry:
+    """In-process index of all the groups, and of the clubs of the meta groups.
+
+    Groups are looked up on almost every page render
+    (mostly through `User.is_in_group`), so all of them are loaded
+    into dicts the first time one is needed,
+    then lookups are just dict accesses.
+
+    The registry of each process is versioned by a key of the shared cache.
+    When a group is saved or deleted, a new version is written in the cache,
+    and the registries of all processes reload the groups
+    the next time they [check][core.models.GroupRegistry.check_version]
+    their version, which is done at the start of each request.
+    """
+
+    VERSION_KEY = "sith_groups_version"
+
+    def __init__(self):
+        self._version: str | None = None
+        self._by_id: dict[int, Group] = {}
+        self._by_name: dict[str, Group] = {}
+        self._clubs: dict[int, Club] = {}
+        self._loaded = False
+
+    def _load(self):
+        from club.models import Club
+
+        self._version = cache.get_or_set(
+            self.VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None
+        )
+        groups = list(Group.objects.all())
+        club_names = {}
+        for group in groups:
+            if not group.is_meta:
+                continue
+            for suffix in settings.SITH_BOARD_SUFFIX, settings.SITH_MEMBER_SUFFIX:
+                if group.name.endswith(suffix):
+                    club_names[group.id] = group.name.removesuffix(suffix)
+        clubs = Club.objects.in_bulk(set(club_names.values()), field_name="unix_name")
+        self._by_id = {g.id: g for g in groups}
+        self._by_name = {g.name: g for g in groups}
+        self._clubs = {
+            group_id: clubs[name]
+            for group_id, name in club_names.items()
+            if name in clubs
+        }
+        self._loaded = True
+
+    def check_version(self):
+        """Reload the groups on the next lookup if they changed in another process."""
+        if self._loaded and cache.get(self.VERSION_KEY) != self._version:
+            self._loaded = False
+
+    def invalidate(self):
+        """Mark the groups of all processes as outdated.
+
+        This must be called each time a group is created, modified or deleted.
+        The current process reloads the groups on its next lookup,
+        but the other processes are told only once the transaction is committed,
+        else they could reload the old groups and keep them under the new version.
+        """
+        self._loaded = False
+        transaction.on_commit(self._bump_version)
+
+    def _bump_version(self):
+        cache.set(self.VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        self._loaded = False
+
+    def reset(self):
+        """Forget the groups loaded by the current process.
+
+        Unlike [invalidate][core.models.GroupRegistry.invalidate],
+        this doesn't touch the shared cache nor the database.
+        """
+        self._loaded = False
+
+    def get(self, *, pk: int | None = None, name: str | None = None) -> Group | None:
+        """Return the group with the given primary key or name, if it exists."""
+        if not self._loaded:
+            self._load()
+        if pk is not None:
+            return self._by_id.get(pk)
+        return self._by_name.get(name)
+
+    def get_club(self, group_id: int) -> Club | None:
+        """Return the club associated with the meta group of the given id."""
+        if not self._loaded:
+            self._load()
+        return self._clubs.get(group_id)
+
+
+group_registry = GroupRegistry()
+
+
 def get_group(*, pk: int = None, name: str = None) -> Optional[Group]:
     """Search for a group by its primary key or its name.
     Either one of the two must be set.
 
-    The result is cached for the default duration (should be 5 minutes).
+    The group is taken from the in-process group registry.
 
     Args:
         pk: The primary key of the group
@@ -192,28 +274,95 @@ def get_group(*, pk: int = None, name: str = None) -> Optional[Group]:
     """
     if pk is None and name is None:
         raise ValueError("Either pk or name must be set")
+    return group_registry.get(pk=pk, name=name)
+
+
+class PermissionSnapshot(NamedTuple):
+    """Everything needed to check the permissions of a user, without db query.
+
+    The snapshot of a user is built once, then kept in cache
+    until its groups, subscriptions or memberships change
+    (see `core.signals`).
+    """
 
-    # replace space characters to hide warnings with memcached backend
-    pk_or_name: str | int = pk if pk is not None else name.replace(" ", "_")
-    group = cache.get(f"sith_group_{pk_or_name}")
-
-    if group == "not_found":
-        # Using None as a cache value is a little bit tricky,
-        # so we use a special string to represent None
-        return None
-    elif group is not None:
-        return group
-    # if this point is reached, the group is not in cache
-    if pk is not None:
-        group = Group.objects.filter(pk=pk).first()
-    else:
-        group = Group.objects.filter(name=name).first()
-    if group is not None:
-        cache.set(f"sith_group_{group.id}", group)
-        cache.set(f"sith_group_{group.name.replace(' ', '_')}", group)
-    else:
-        cache.set(f"sith_group_{pk_or_name}", "not_found")
-    return group
+    group_ids: frozenset[int]
+    """The ids of the groups the user has been explicitly added to."""
+    subscriptions: tuple[tuple[date, date], ...]
+    """The start and end dates of the subscriptions of the user."""
+    memberships: dict[str, tuple[int, int, date | None]]
+    """The id of the clubs the user is currently a member of,
+    the role of the user in them and the end of the memberships,
+    by unix name of the club."""
+
+    @staticmethod
+    def cache_key(user_id: int) -> str:
+        return f"user_{user_id}_permissions"
+
+    @classmethod
+    def of(cls, user: User) -> PermissionSnapshot:
+        """Return the snapshot of the given user, from the cache if possible."""
+        snapshot = cache.get(cls.cache_key(user.id))
+        if snapshot is None:
+            memberships = user.memberships.ongoing().values_list(
+                "club__unix_name", "club_id", "role", "end_date"
+            )
+            snapshot = cls(
+                group_ids=frozenset(user.groups.values_list("id", flat=True)),
+                subscriptions=tuple(
+                    user.subscriptions.values_list(
+                        "subscription_start", "subscription_end"
+                    )
+                ),
+                memberships={name: tuple(rest) for name, *rest in memberships},
+            )
+            cache.set(cls.cache_key(user.id), snapshot)
+        return snapshot
+
+    @classmethod
+    def invalidate(cls, user_ids: Iterable[int]) -> None:
+        """Remove the snapshots of the given users from the cache.
+
+        The snapshots are removed again once the transaction is committed,
+        because until then, another process may build them again
+        from the data of before the change.
+        """
+        keys = [cls.cache_key(user_id) for user_id in user_ids]
+        if not keys:
+            return
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    @property
+    def is_subscribed(self) -> bool:
+        today = timezone.localdate()
+        return any(start <= today <= end for start, end in self.subscriptions)
+
+    @property
+    def was_subscribed(self) -> bool:
+        return len(self.subscriptions) > 0
+
+    @property
+    def club_roles(self) -> dict[str, int]:
+        """The role of the user in the clubs of which the membership has no end,
+        by unix name of the club.
+
+        Those are the memberships taken into account by the club meta groups.
+        """
+        return {
+            name: role
+            for name, (_, role, end) in self.memberships.items()
+            if end is None
+        }
+
+    @property
+    def board_club_ids(self) -> set[int]:
+        """The ids of the clubs where the user has rights."""
+        today = timezone.localdate()
+        return {
+            club
+            for club, role, end in self.memberships.values()
+            if role > settings.SITH_MAXIMUM_FREE_ROLE and (end is None or end > today)
+        }
 
 
 class User(AbstractBaseUser):
@@ -397,16 +546,18 @@ class User(AbstractBaseUser):
     def to_dict(self):
         return self.__dict__
 
+    @property
+    def permissions(self) -> PermissionSnapshot:
+        """The snapshot of what this user is allowed to do."""
+        return PermissionSnapshot.of(self)
+
     @cached_property
     def was_subscribed(self):
-        return self.subscriptions.exists()
+        return self.permissions.was_subscribed
 
     @cached_property
     def is_subscribed(self):
-        s = self.subscriptions.filter(
-            subscription_start__lte=timezone.now(), subscription_end__gte=timezone.now()
-        )
-        return s.exists()
+        return self.permissions.is_subscribed
 
     @cached_property
     def account_balance(self):
@@ -445,17 +596,19 @@ class User(AbstractBaseUser):
             return self.is_root
         if group.is_meta:
             # check if this group is associated with a club
-            group.__class__ = MetaGroup
-            club = group.associated_club
-            if club is None:
+            if group.name.endswith(settings.SITH_BOARD_SUFFIX):
+                club_name = group.name.removesuffix(settings.SITH_BOARD_SUFFIX)
+            elif group.name.endswith(settings.SITH_MEMBER_SUFFIX):
+                club_name = group.name.removesuffix(settings.SITH_MEMBER_SUFFIX)
+            else:
                 return False
-            membership = club.get_membership_for(self)
-            if membership is None:
+            role = self.permissions.club_roles.get(club_name)
+            if role is None:
                 return False
             if group.name.endswith(settings.SITH_MEMBER_SUFFIX):
                 return True
-            return membership.role > settings.SITH_MAXIMUM_FREE_ROLE
-        return group in self.cached_groups
+            return role > settings.SITH_MAXIMUM_FREE_ROLE
+        return group.id in self.permissions.group_ids
 
     @property
     def cached_groups(self) -> list[Group]:
@@ -475,8 +628,7 @@ class User(AbstractBaseUser):
     def is_root(self) -> bool:
         if self.is_superuser:
             return True
-        root_id = settings.SITH_GROUP_ROOT_ID
-        return any(g.id == root_id for g in self.cached_groups)
+        return settings.SITH_GROUP_ROOT_ID in self.permissions.group_ids
 
     @cached_property
     def is_board_member(self):
@@ -487,36 +639,20 @@ class User(AbstractBaseUser):
     def can_read_subscription_history(self):
         if self.is_root or self.is_board_member:
             return True
-
-        from club.models import Club
-
-        for club in Club.objects.filter(
-            id__in=settings.SITH_CAN_READ_SUBSCRIPTION_HISTORY
-        ):
-            if club in self.clubs_with_rights:
-                return True
-        return False
+        return not self.permissions.board_club_ids.isdisjoint(
+            settings.SITH_CAN_READ_SUBSCRIPTION_HISTORY
+        )
 
     @cached_property
     def can_create_subscription(self):
-        from club.models import Club
-
-        for club in Club.objects.filter(id__in=settings.SITH_CAN_CREATE_SUBSCRIPTIONS):
-            if club in self.clubs_with_rights:
-                return True
-        return False
+        return not self.permissions.board_club_ids.isdisjoint(
+            settings.SITH_CAN_CREATE_SUBSCRIPTIONS
+        )
 
     @cached_property
     def is_launderette_manager(self):
-        from club.models import Club
-
-        return (
-            Club.objects.filter(
-                unix_name=settings.SITH_LAUNDERETTE_MANAGER["unix_name"]
-            )
-            .first()
-            .get_membership_for(self)
-        )
+        launderette_club = settings.SITH_LAUNDERETTE_MANAGER["unix_name"]
+        return launderette_club in self.permissions.club_roles
 
     @cached_property
     def is_banned_alcohol(self):
@@ -656,27 +792,52 @@ class User(AbstractBaseUser):
         Returns:
             The generated username.
         """
+        User.generate_usernames([self])
+        return self.username
 
-        def remove_accents(data):
-            return "".join(
+    @staticmethod
+    def base_username(first_name: str, last_name: str) -> str:
+        """Return the username of a user, before the number added to make it unique."""
+        return (
+            "".join(
                 x
-                for x in unicodedata.normalize("NFKD", data)
+                for x in unicodedata.normalize("NFKD", first_name[0] + last_name)
                 if unicodedata.category(x)[0] == "L"
-            ).lower()
-
-        user_name = (
-            remove_accents(self.first_name[0] + self.last_name)
+            )
+            .lower()
             .encode("ascii", "ignore")
             .decode("utf-8")
         )
-        un_set = [u.username for u in User.objects.all()]
-        if user_name in un_set:
-            i = 1
-            while user_name + str(i) in un_set:
-                i += 1
-            user_name += str(i)
-        self.username = user_name
-        return user_name
+
+    @classmethod
+    def generate_usernames(cls, users: Iterable[User]) -> None:
+        """Give a unique username to all the given users, without saving them.
+
+        Only the usernames starting like the generated ones are fetched,
+        with one query for up to 500 different names,
+        so that creating many users at once doesn't read the whole table.
+        """
+        bases = [
+            (user, cls.base_username(user.first_name, user.last_name)) for user in users
+        ]
+        names = sorted({name for _, name in bases})
+        taken = set()
+        for i in range(0, len(names), 500):
+            prefixes = Q()
+            for name in names[i : i + 500]:
+                prefixes |= Q(username__startswith=name)
+            taken.update(
+                cls.objects.filter(prefixes).values_list("username", flat=True)
+            )
+        for user, user_name in bases:
+            if user_name in taken:
+                i = 1
+                while user_name + str(i) in taken:
+                    i += 1
+                user_name += str(i)
+            # the users of the batch must not get the same name
+            taken.add(user_name)
+            user.username = user_name
 
     def is_owner(self, obj):
         """Determine if the object is owned by the user."""
@@ -761,8 +922,10 @@ class User(AbstractBaseUser):
     @cached_property
     def clubs_with_rights(self) -> list[Club]:
         """The list of clubs where the user has rights"""
-        memberships = self.memberships.ongoing().board().select_related("club")
-        return [m.club for m in memberships]
+        from club.models import Club
+
+        club_ids = self.permissions.board_club_ids
+        return list(Club.objects.filter(id__in=club_ids)) if club_ids else []
 
     @cached_property
     def is_com_admin(self):
@@ -773,6 +936,13 @@ class AnonymousUser(AuthAnonymousUser):
     def __init__(self):
         super().__init__()
 
+    @property
+    def permissions(self) -> PermissionSnapshot:
+        """The anonymous user isn't in any group, nor club."""
+        return PermissionSnapshot(
+            group_ids=frozenset(), subscriptions=(), memberships={}
+        )
+
     @property
     def can_create_subscription(self):
         return False
@@ -856,6 +1026,166 @@ class AnonymousUser(AuthAnonymousUser):
         return _("Visitor")
 
 
+class PermissionResolver:
+    """Check the permissions of a user on many objects at once.
+
+    Checking the permissions of a user on an object with
+    `user.can_view(obj)` or `user.can_edit(obj)` costs at least a query
+    to fetch the groups of the object, plus the ones needed
+    to know if the user is in those groups.
+    On a list of objects, this quickly adds up.
+
+    The resolver gives the same results, but fetches the groups
+    of all the objects given to [prefetch][core.models.PermissionResolver.prefetch]
+    with one query per kind of groups, and remembers whether the user
+    is in each group it checked.
+    As the group memberships may change, a resolver is meant
+    to live no longer than a request.
+
+    The resolver can be given instead of the user
+    to the `can_view`, `can_edit` and `can_edit_prop` functions
+    of `core.views`.
+
+    The groups of a model are prefetched only if they are many-to-many fields.
+    A model whose instances don't give the groups of those fields
+    (because they are computed from something else)
+    must opt out by setting its `resolver_prefetch` attribute to False ;
+    its groups are then fetched object by object, as the user would.
+
+    Example:
+        ```python
+        resolver = PermissionResolver(request.user)
+        pages = list(Page.objects.all())
+        resolver.prefetch(pages)
+        viewable = [p for p in pages if resolver.can_view(p)]
+        ```
+    """
+
+    GROUP_FIELDS = ("view_groups", "edit_groups")
+
+    def __init__(self, user: User | AnonymousUser):
+        self.user = user
+        self._in_group: dict[int | str, bool] = {}
+        # group ids of the prefetched objects, by field, model and object id
+        self._groups: dict[tuple[str, type[models.Model]], dict[int, list[int]]] = {}
+
+    @property
+    def is_root(self) -> bool:
+        return self.user.is_root
+
+    @property
+    def is_anonymous(self) -> bool:
+        return self.user.is_anonymous
+
+    def is_in_group(self, *, pk: int | None = None, name: str | None = None) -> bool:
+        """Same as `User.is_in_group`, but remember the result."""
+        key = pk if pk is not None else name
+        if key not in self._in_group:
+            self._in_group[key] = self.user.is_in_group(pk=pk, name=name)
+        return self._in_group[key]
+
+    @cached_property
+    def group_ids(self) -> set[int]:
+        """The ids of all the groups the user is in.
+
+        This includes the groups which don't depend on `user.groups`,
+        like the subscribers group and the groups of the clubs.
+        """
+        if self.user.is_anonymous:
+            return {settings.SITH_GROUP_PUBLIC_ID}
+        special = {
+            settings.SITH_GROUP_PUBLIC_ID: True,
+            settings.SITH_GROUP_SUBSCRIBERS_ID: self.user.is_subscribed,
+            settings.SITH_GROUP_OLD_SUBSCRIBERS_ID: self.user.was_subscribed,
+            settings.SITH_GROUP_ROOT_ID: self.user.is_root,
+        }
+        meta_names = []
+        for unix_name, role in self.user.permissions.club_roles.items():
+            meta_names.append(unix_name + settings.SITH_MEMBER_SUFFIX)
+            if role > settings.SITH_MAXIMUM_FREE_ROLE:
+                meta_names.append(unix_name + settings.SITH_BOARD_SUFFIX)
+        # The meta groups the user has been explicitly added to don't count
+        ids = set(
+            Group.objects.filter(
+                Q(is_meta=False, id__in=self.user.permissions.group_ids)
+                | Q(is_meta=True, name__in=meta_names)
+            ).values_list("id", flat=True)
+        )
+        ids -= special.keys()
+        ids |= {group_id for group_id, is_in in special.items() if is_in}
+        return ids
+
+    def prefetch(self, objects: list[models.Model]) -> None:
+        """Fetch the view and edit groups of all the given objects."""
+        by_model: dict[type[models.Model], list[int]] = {}
+        for obj in objects:
+            by_model.setdefault(type(obj), []).append(obj.pk)
+        for model, pks in by_model.items():
+            if not getattr(model, "resolver_prefetch", True):
+                continue
+            for field_name in self.GROUP_FIELDS:
+                field = getattr(model, field_name, None)
+                if not isinstance(field, models.fields.related.ManyToManyDescriptor):
+                    continue
+                m2m = field.field
+                groups = self._groups.setdefault((field_name, model), {})
+                rows = m2m.remote_field.through.objects.filter(
+                    **{f"{m2m.m2m_field_name()}__in": pks}
+                ).values_list(m2m.m2m_field_name(), m2m.m2m_reverse_field_name())
+                for pk in pks:
+                    groups.setdefault(pk, [])
+                for pk, group_id in rows:
+                    groups[pk].append(group_id)
+
+    def _group_ids(self, obj, field_name: str) -> list[int]:
+        prefetched = self._groups.get((field_name, type(obj)), {})
+        if obj.pk in prefetched:
+            return prefetched[obj.pk]
+        return list(getattr(obj, field_name).values_list("pk", flat=True))
+
+    def is_owner(self, obj) -> bool:
+        """Same as `User.is_owner`."""
+        if self.user.is_anonymous:
+            return False
+        if hasattr(obj, "is_owned_by") and obj.is_owned_by(self.user):
+            return True
+        if hasattr(obj, "owner_group"):
+            group_id = getattr(obj, "owner_group_id", None) or obj.owner_group.id
+            if self.is_in_group(pk=group_id):
+                return True
+        return self.user.is_root
+
+    def can_edit(self, obj) -> bool:
+        """Same as `User.can_edit`."""
+        if self.user.is_anonymous:
+            return False
+        if hasattr(obj, "can_be_edited_by") and obj.can_be_edited_by(self.user):
+            return True
+        if hasattr(obj, "edit_groups") and any(
+            self.is_in_group(pk=pk) for pk in self._group_ids(obj, "edit_groups")
+        ):
+            return True
+        if isinstance(obj, User) and obj == self.user:
+            return True
+        return self.is_owner(obj)
+
+    def can_view(self, obj) -> bool:
+        """Same as `User.can_view`."""
+        if self.user.is_anonymous:
+            if hasattr(obj, "view_groups") and settings.SITH_GROUP_PUBLIC_ID in (
+                self._group_ids(obj, "view_groups")
+            ):
+                return True
+            return hasattr(obj, "can_be_viewed_by") and obj.can_be_viewed_by(self.user)
+        if hasattr(obj, "can_be_viewed_by") and obj.can_be_viewed_by(self.user):
+            return True
+        if hasattr(obj, "view_groups") and any(
+            self.is_in_group(pk=pk) for pk in self._group_ids(obj, "view_groups")
+        ):
+            return True
+        return self.can_edit(obj)
+
+
 class Preferences(models.Model):
     user = models.OneToOneField(
         User, related_name="_preferences", on_delete=models.CASCADE
@@ -951,14 +1281,46 @@ class SithFile(models.Model):
     is_in_sas = models.BooleanField(
         _("is in the SAS"), default=False, db_index=True
     )  # Allows to query this flag, updated at each call to save()
+    # the following fields are only filled for the pictures of the SAS,
+    # when their thumbnails are generated
+    width = models.PositiveIntegerField(_("width"), null=True, blank=True)
+    height = models.PositiveIntegerField(_("height"), null=True, blank=True)
+    dominant_color = models.CharField(
+        _("dominant color"), max_length=7, blank=True, default=""
+    )
 
     class Meta:
         verbose_name = _("file")
 
+    VISIBILITY_FIELDS = ("is_in_sas", "is_moderated", "parent_id")
+    """The fields which decide who can see a file of the SAS."""
+
     def __str__(self):
         return self.get_parent_path() + "/" + self.name
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # keep the loaded values, so that the SAS signals know
+        # if the users who can see the file may have changed when it's saved
+        if set(cls.VISIBILITY_FIELDS) <= set(field_names):
+            instance._loaded_visibility = instance.visibility
+        return instance
+
+    @property
+    def visibility(self) -> tuple[bool, bool, int | None]:
+        """The values of the `VISIBILITY_FIELDS` of this file."""
+        return tuple(getattr(self, field) for field in self.VISIBILITY_FIELDS)
+
+    def save(self, *args, notify_moderators: bool = True, **kwargs):
+        """Save the file.
+
+        Args:
+            notify_moderators: if the file is in the SAS,
+                tell the SAS admins there is something to moderate.
+                When many files are saved at once, set it to False
+                and call `SithFile.notify_sas_moderators` once at the end.
+        """
         sas = SithFile.objects.filter(id=settings.SITH_SAS_ROOT_DIR_ID).first()
         self.is_in_sas = sas in self.get_parent_list() or self == sas
         copy_rights = False
@@ -967,18 +1329,22 @@ class SithFile(models.Model):
         super().save(*args, **kwargs)
         if copy_rights:
             self.copy_rights()
-        if self.is_in_sas:
-            for u in (
-                RealGroup.objects.filter(id=settings.SITH_GROUP_SAS_ADMIN_ID)
-                .first()
-                .users.all()
-            ):
-                Notification(
-                    user=u,
-                    url=reverse("sas:moderation"),
-                    type="SAS_MODERATION",
-                    param="1",
-                ).save()
+        if self.is_in_sas and notify_moderators:
+            self.notify_sas_moderators()
+
+    @staticmethod
+    def notify_sas_moderators():
+        for u in (
+            RealGroup.objects.filter(id=settings.SITH_GROUP_SAS_ADMIN_ID)
+            .first()
+            .users.all()
+        ):
+            Notification(
+                user=u,
+                url=reverse("sas:moderation"),
+                type="SAS_MODERATION",
+                param="1",
+            ).save()
 
     def is_owned_by(self, user):
         if user.is_anonymous:
@@ -1457,6 +1823,7 @@ class PageRev(models.Model):
     revision = models.IntegerField(_("revision"))
     title = models.CharField(_("page title"), max_length=255, blank=True)
     content = models.TextField(_("page content"), blank=True)
+    content_html = RenderedMarkdownField(source="content")
     date = models.DateTimeField(_("date"), auto_now=True)
     author = models.ForeignKey(User, related_name="page_rev", on_delete=models.CASCADE)
     page = models.ForeignKey(Page, related_name="revisions", on_delete=models.CASCADE)
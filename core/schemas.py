@@ -1,6 +1,6 @@
 from typing import Annotated
 
-from annotated_types import MinLen
+from annotated_types import MaxLen, MinLen
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.db.models import Q
 from django.utils.text import slugify
@@ -80,6 +80,10 @@ class MarkdownSchema(Schema):
     text: str
 
 
+class MarkdownBatchSchema(Schema):
+    texts: Annotated[list[str], MaxLen(100)]
+
+
 class FamilyGodfatherSchema(Schema):
     godfather: int
     godchild: int
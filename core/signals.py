@@ -1,15 +1,52 @@
 from django.core.cache import cache
-from django.db.models.signals import m2m_changed
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from core.models import User
+from club.models import Membership
+from core.models import PermissionSnapshot, User, group_registry
+from subscription.models import Subscription
+
+
+@receiver(request_started, dispatch_uid="check_groups_version")
+def check_groups_version(sender, **kwargs):
+    """Reload the groups if they were changed by another process."""
+    group_registry.check_version()
 
 
 @receiver(m2m_changed, sender=User.groups.through, dispatch_uid="user_groups_changed")
-def user_groups_changed(sender, instance: User, **kwargs):
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
     """Clear the cached groups of the user."""
     # As a m2m relationship doesn't live within the model
     # but rather on an intermediary table, there is no
     # model method to override, meaning we must use
     # a signal to invalidate the cache when a user is removed from a group
-    cache.delete(f"user_{instance.pk}_groups")
+    if action == "pre_clear" and reverse:
+        # the users removed from the group side are only known before the clear
+        user_ids = list(instance.users.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove") or (
+        action == "post_clear" and not reverse
+    ):
+        # When the users are added from the group side, the instance is the group
+        user_ids = list(pk_set) if reverse else [instance.pk]
+    else:
+        return
+    keys = [f"user_{user_id}_groups" for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    PermissionSnapshot.invalidate(user_ids)
+
+
+@receiver(post_save, sender=Subscription, dispatch_uid="subscription_saved")
+@receiver(post_delete, sender=Subscription, dispatch_uid="subscription_deleted")
+def user_subscriptions_changed(sender, instance: Subscription, **kwargs):
+    """Clear the permission snapshot of the subscriber."""
+    PermissionSnapshot.invalidate([instance.member_id])
+
+
+@receiver(post_save, sender=Membership, dispatch_uid="membership_saved")
+@receiver(post_delete, sender=Membership, dispatch_uid="membership_deleted")
+def user_memberships_changed(sender, instance: Membership, **kwargs):
+    """Clear the permission snapshot of the member."""
+    PermissionSnapshot.invalidate([instance.user_id])
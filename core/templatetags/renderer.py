@@ -30,7 +30,7 @@ from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
 from django.utils.translation import ngettext
 
-from core.markdown import markdown as md
+from core.markdown import render_markdown
 
 register = template.Library()
 
@@ -38,7 +38,16 @@ register = template.Library()
 @register.filter(is_safe=False)
 @stringfilter
 def markdown(text):
-    return mark_safe('<div class="markdown">%s</div>' % md(text))
+    return mark_safe('<div class="markdown">%s</div>' % render_markdown(text))
+
+
+@register.filter(is_safe=True)
+def rendered_markdown(html):
+    """Display markdown already rendered to HTML, like the markdown filter does.
+
+    It's meant for the fields stored by a `RenderedMarkdownField`.
+    """
+    return mark_safe('<div class="markdown">%s</div>' % html)
 
 
 @register.filter(name="phonenumber")
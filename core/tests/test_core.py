@@ -14,13 +14,16 @@
 #
 
 from datetime import date, timedelta
+from io import StringIO
 from smtplib import SMTPException
+from unittest import mock
 
 import freezegun
 import pytest
 from django.core import mail
 from django.core.cache import cache
 from django.core.mail import EmailMessage
+from django.core.management import call_command
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils.timezone import now
@@ -28,10 +31,24 @@ from model_bakery import baker
 from pytest_django.asserts import assertInHTML, assertRedirects
 
 from antispam.models import ToxicDomain
-from club.models import Membership
-from core.markdown import markdown
-from core.models import AnonymousUser, Group, Page, User
+from club.models import Club, Membership
+from com.models import News
+from core.markdown import markdown, render_markdown
+from core.models import (
+    AnonymousUser,
+    Group,
+    GroupRegistry,
+    MetaGroup,
+    Page,
+    PermissionResolver,
+    PermissionSnapshot,
+    RealGroup,
+    User,
+    get_group,
+    group_registry,
+)
 from core.utils import get_semester_code, get_start_of_semester
+from counter.models import Counter
 from sith import settings
 
 
@@ -233,6 +250,53 @@ def test_full_markdown_syntax():
     assert result == html
 
 
+@pytest.mark.django_db
+class TestRenderedMarkdown:
+    def test_rendered_on_save(self):
+        news = baker.make(News, summary="__text__", content="")
+        assert news.summary_html == "<p><u>text</u></p>\n"
+        news.refresh_from_db()
+        assert news.summary_html == "<p><u>text</u></p>\n"
+        assert news.content_html == ""
+
+    def test_not_rendered_yet(self):
+        news = baker.make(News, summary="__text__")
+        News.objects.filter(id=news.id).update(summary_html=None)
+        news.refresh_from_db()
+        assert news.summary_html == "<p><u>text</u></p>\n"
+
+    def test_render_command(self):
+        news = baker.make(News, summary="__text__")
+        News.objects.filter(id=news.id).update(summary_html=None)
+        call_command("render_markdown", stdout=StringIO())
+        news.refresh_from_db()
+        assert news.__dict__["summary_html"] == "<p><u>text</u></p>\n"
+
+    def test_cached(self):
+        render_markdown("**cached**")
+        with mock.patch("core.markdown.markdown") as md:
+            assert render_markdown("**cached**") == "<p><strong>cached</strong></p>\n"
+        md.assert_not_called()
+
+    def test_batch_api(self, client):
+        texts = ["__text__", "", "**bold**", "__text__"]
+        with mock.patch("core.markdown.markdown", wraps=markdown) as md:
+            response = client.post(
+                reverse("api:markdown_batch"),
+                {"texts": texts},
+                content_type="application/json",
+            )
+        assert response.status_code == 200
+        assert response.json() == [
+            '<div class="markdown"><p><u>text</u></p>\n</div>',
+            '<div class="markdown"></div>',
+            '<div class="markdown"><p><strong>bold</strong></p>\n</div>',
+            '<div class="markdown"><p><u>text</u></p>\n</div>',
+        ]
+        # each distinct text is rendered once
+        assert md.call_count == 2
+
+
 class TestPageHandling(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -363,8 +427,6 @@ class TestUserIsInGroup(TestCase):
 
     @classmethod
     def setUpTestData(cls):
-        from club.models import Club
-
         cls.root_group = Group.objects.get(name="Root")
         cls.public = Group.objects.get(name="Public")
         cls.skia = User.objects.get(username="skia")
@@ -439,9 +501,11 @@ class TestUserIsInGroup(TestCase):
         skia_groups = self.skia.groups.all()
 
         group_in = skia_groups.first()
+        get_group(pk=group_in.id)  # load the group registry
         cache.clear()
         # Test when the user is in the group
-        with self.assertNumQueries(2):
+        # (the groups, subscriptions and memberships of the user)
+        with self.assertNumQueries(3):
             self.skia.is_in_group(pk=group_in.id)
         with self.assertNumQueries(0):
             self.skia.is_in_group(pk=group_in.id)
@@ -450,7 +514,7 @@ class TestUserIsInGroup(TestCase):
         group_not_in = Group.objects.exclude(pk__in=ids).first()
         cache.clear()
         # Test when the user is not in the group
-        with self.assertNumQueries(2):
+        with self.assertNumQueries(3):
             self.skia.is_in_group(pk=group_not_in.id)
         with self.assertNumQueries(0):
             self.skia.is_in_group(pk=group_not_in.id)
@@ -465,11 +529,10 @@ class TestUserIsInGroup(TestCase):
         meta_groups_members = self.club.unix_name + settings.SITH_MEMBER_SUFFIX
         cache.clear()
         assert self.toto.is_in_group(name=meta_groups_members) is True
-        assert membership == cache.get(f"membership_{self.club.id}_{self.toto.id}")
+        assert cache.get(PermissionSnapshot.cache_key(self.toto.id)) is not None
         membership.end_date = now() - timedelta(minutes=5)
         membership.save()
-        cached_membership = cache.get(f"membership_{self.club.id}_{self.toto.id}")
-        assert cached_membership == "not_member"
+        assert cache.get(PermissionSnapshot.cache_key(self.toto.id)) is None
         assert self.toto.is_in_group(name=meta_groups_members) is False
 
     def test_cache_properly_cleared_group(self):
@@ -490,6 +553,23 @@ class TestUserIsInGroup(TestCase):
         self.toto.groups.remove(self.sas_admin.pk)
         assert self.toto.is_in_group(name="SAS admin") is False
 
+    def test_cache_cleared_when_group_cleared(self):
+        """Test that the users of a group cleared from the group side
+        are not in the group anymore.
+        """
+        self.toto.groups.add(self.com_admin.pk)
+        assert self.toto.is_in_group(pk=self.com_admin.pk) is True
+        RealGroup.objects.get(pk=self.com_admin.pk).users.clear()
+        assert self.toto.is_in_group(pk=self.com_admin.pk) is False
+
+    def test_cache_cleared_again_on_commit(self):
+        """Test that a snapshot cached before the commit of a change is removed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.toto.groups.add(self.com_admin.pk)
+            # another process builds the snapshot from the committed data
+            cache.set(PermissionSnapshot.cache_key(self.toto.id), "stale")
+        assert cache.get(PermissionSnapshot.cache_key(self.toto.id)) is None
+
     def test_not_existing_group(self):
         """Test that searching for a not existing group
         returns False.
@@ -497,6 +577,75 @@ class TestUserIsInGroup(TestCase):
         assert self.skia.is_in_group(name="This doesn't exist") is False
 
 
+class TestGroupRegistry(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.club = Club.objects.create(name="Fake Club", unix_name="fake-club")
+
+    def test_lookups_without_queries(self):
+        """Test that once loaded, the registry doesn't query the database."""
+        group_registry.get(pk=settings.SITH_GROUP_PUBLIC_ID)
+        board = MetaGroup.objects.get(name="fake-club" + settings.SITH_BOARD_SUFFIX)
+        with self.assertNumQueries(0):
+            assert get_group(pk=settings.SITH_GROUP_ROOT_ID).name == "Root"
+            assert get_group(name=board.name) == board
+            assert get_group(name="This doesn't exist") is None
+            assert board.associated_club == self.club
+
+    def test_reload_on_other_process_change(self):
+        """Test that the registry is reloaded when another process changes a group."""
+        group = baker.make(RealGroup)
+        get_group(pk=group.id)  # load the group registry
+        # another process renaming the group only changes the shared version
+        RealGroup.objects.filter(id=group.id).update(name="new name")
+        cache.set(GroupRegistry.VERSION_KEY, "new version")
+        # the change is seen only when the version is checked
+        assert get_group(pk=group.id).name != "new name"
+        group_registry.check_version()
+        assert get_group(pk=group.id).name == "new name"
+
+    def test_version_changed_on_commit(self):
+        """Test that the other processes are told about a change once it's committed."""
+        get_group(pk=settings.SITH_GROUP_PUBLIC_ID)  # load the group registry
+        version = cache.get(GroupRegistry.VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            group = baker.make(RealGroup)
+            assert cache.get(GroupRegistry.VERSION_KEY) == version
+            # but the current process already sees the new group
+            assert get_group(pk=group.id) == group
+        assert len(callbacks) == 1
+        assert cache.get(GroupRegistry.VERSION_KEY) != version
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "username", [None, "public", "subscriber", "old_subscriber", "sli", "skia", "root"]
+)
+def test_permission_resolver(username: str | None):
+    """Test that the resolver gives the same permissions as the user."""
+    user = AnonymousUser() if username is None else User.objects.get(username=username)
+    pages = list(Page.objects.all())
+    resolver = PermissionResolver(user)
+    resolver.prefetch(pages)
+    for page in pages:
+        assert resolver.can_view(page) == user.can_view(page)
+        assert resolver.can_edit(page) == user.can_edit(page)
+        assert resolver.is_owner(page) == user.is_owner(page)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("username", ["public", "sli", "skia", "root"])
+def test_permission_resolver_counters(username: str):
+    """Test that the resolver uses the groups computed by the counters."""
+    user = User.objects.get(username=username)
+    counters = list(Counter.objects.all())
+    resolver = PermissionResolver(user)
+    resolver.prefetch(counters)
+    for counter in counters:
+        assert resolver.can_view(counter) == user.can_view(counter)
+        assert resolver.can_edit(counter) == user.can_edit(counter)
+
+
 class TestDateUtils(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -0,0 +1,68 @@
+"""Benchmark of the markdown rendering.
+
+The custom plugins of `core.markdown` (underline, links to the wiki pages...)
+are regexes run on all the texts of the site.
+A badly written regex can make the rendering much slower,
+so these tests compare the throughput of the sith markdown
+with the one of a bare mistune with the same builtin plugins.
+"""
+
+import time
+
+import mistune
+import pytest
+from django.conf import settings
+
+from core.markdown import markdown
+
+BUILTIN_PLUGINS = [
+    "strikethrough",
+    "footnotes",
+    "table",
+    "spoiler",
+    "subscript",
+    "superscript",
+    "url",
+]
+
+FORUM_POST = (
+    "Salut à tous,\n\n"
+    "> Est-ce que __quelqu'un__ sait où trouver les [annales](page://annales) ?\n\n"
+    "Il y en a sur le [wiki](page://wiki.uv) et sur https://ae.utbm.fr, "
+    "mais les ~~liens~~ sont *parfois* cassés. Voir aussi [^1].\n\n"
+    "| UV | Semestre |\n|----|----|\n| MT01 | A24 |\n| IF2 | P25 |\n\n"
+    "- un\n- deux\n- __trois__ avec un `code`\n\n"
+    "[^1]: Une note de bas de page.\n"
+)
+
+
+@pytest.fixture(scope="module")
+def corpus() -> list[str]:
+    """A mix of long wiki pages and short forum posts."""
+    wiki_page = (settings.BASE_DIR / "core" / "fixtures" / "SYNTAX.md").read_text()
+    posts = [f"{FORUM_POST}\nMessage n°{i}" for i in range(200)]
+    return [wiki_page] * 20 + posts
+
+
+def throughput(render, corpus: list[str]) -> float:
+    """Return the number of kilobytes rendered per second, the best of 3 runs."""
+    size = sum(len(text) for text in corpus) / 1024
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for text in corpus:
+            render(text)
+        best = min(best, time.perf_counter() - start)
+    return size / best
+
+
+@pytest.mark.slow
+def test_markdown_throughput(corpus):
+    reference = mistune.create_markdown(escape=True, plugins=BUILTIN_PLUGINS)
+    sith_speed = throughput(markdown, corpus)
+    reference_speed = throughput(reference, corpus)
+    print(  # noqa: T201
+        f"sith markdown: {sith_speed:.0f} kB/s, bare mistune: {reference_speed:.0f} kB/s"
+    )
+    # the custom plugins may cost a bit, but not change the order of magnitude
+    assert sith_speed > reference_speed / 3
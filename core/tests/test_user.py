@@ -95,3 +95,35 @@ class TestSearchUsersView(TestSearchUsers):
         self.client.force_login(subscriber_user.make())
         response = self.client.get(reverse("core:search"))
         assert response.status_code == 200
+
+
+class TestGenerateUsername(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        baker.make(User, username="gcarlier")
+        baker.make(User, username="gcarlier1")
+        baker.make(User, username="gcarlierx")
+
+    def test_generate_username(self):
+        user = User(first_name="Guy", last_name="Carlier")
+        with self.assertNumQueries(1):
+            assert user.generate_username() == "gcarlier2"
+        assert User(first_name="Éloïse", last_name="Dûpont").generate_username() == (
+            "edupont"
+        )
+
+    def test_generate_usernames(self):
+        users = [
+            User(first_name="Guy", last_name="Carlier"),
+            User(first_name="Gaston", last_name="Carlier"),
+            User(first_name="Jean", last_name="Valjean"),
+            User(first_name="Jeanne", last_name="Valjean"),
+        ]
+        with self.assertNumQueries(1):
+            User.generate_usernames(users)
+        assert [u.username for u in users] == [
+            "gcarlier2",
+            "gcarlier3",
+            "jvaljean",
+            "jvaljean1",
+        ]
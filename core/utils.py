@@ -135,6 +135,53 @@ def exif_auto_rotate(image):
     return image
 
 
+EXIF_ROTATIONS = {1: 0, 8: 90, 3: 180, 6: 270}
+"""The counterclockwise rotation applied by `exif_auto_rotate`
+for each EXIF orientation."""
+
+
+def set_jpeg_rotation(data: bytes, degree: int) -> bytes:
+    """Rotate a JPEG image counterclockwise, without losing any quality.
+
+    The image itself isn't encoded again :
+    only the orientation stored in its EXIF segment is changed.
+
+    Args:
+        data: the content of the JPEG file
+        degree: the rotation, a multiple of 90
+    """
+    exif = PIL.Image.open(BytesIO(data)).getexif()
+    current = EXIF_ROTATIONS.get(exif.get(ExifTags.Base.Orientation, 1), 0)
+    rotation = (current + degree) % 360
+    exif[ExifTags.Base.Orientation] = next(
+        o for o, r in EXIF_ROTATIONS.items() if r == rotation
+    )
+    payload = exif.tobytes()
+    segment = b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+    # the file is a list of segments, each one made of a marker,
+    # its length and its content, until the start of the image data (0xDA)
+    pos = 2  # after the Start Of Image marker
+    insert_at = pos
+    while data[pos] == 0xFF and data[pos + 1] != 0xDA:
+        length = int.from_bytes(data[pos + 2 : pos + 4], "big")
+        if data[pos + 1] == 0xE1 and data[pos + 4 : pos + 10] == b"Exif\x00\x00":
+            return data[:pos] + segment + data[pos + 2 + length :]
+        if data[pos + 1] == 0xE0:
+            # the EXIF segment must come after the JFIF one
+            insert_at = pos + 2 + length
+        pos += 2 + length
+    return data[:insert_at] + segment + data[insert_at:]
+
+
+def dominant_color(image: Image) -> str:
+    """Return the average colour of the image, as a `#rrggbb` string.
+
+    It is meant to be shown as a placeholder while the image is loading.
+    """
+    pixel = image.convert("RGB").resize((1, 1), Resampling.BOX).getpixel((0, 0))
+    return "#%02x%02x%02x" % pixel
+
+
 def get_client_ip(request: HttpRequest) -> str | None:
     headers = (
         "X_FORWARDED_FOR",  # Common header for proixes
@@ -41,7 +41,7 @@ from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import FormView
 from sentry_sdk import last_event_id
 
-from core.models import User
+from core.models import PermissionResolver, User
 from core.views.forms import LoginForm
 
 
@@ -68,7 +68,7 @@ def can_edit_prop(obj: Any, user: User) -> bool:
 
     Args:
         obj: Object to test for permission
-        user: core.models.User to test permissions against
+        user: core.models.User (or PermissionResolver) to test permissions against
 
     Returns:
         True if user is authorized to edit object properties else False
@@ -89,7 +89,7 @@ def can_edit(obj: Any, user: User) -> bool:
 
     Args:
         obj: Object to test for permission
-        user: core.models.User to test permissions against
+        user: core.models.User (or PermissionResolver) to test permissions against
 
     Returns:
         True if user is authorized to edit object else False
@@ -110,7 +110,7 @@ def can_view(obj: Any, user: User) -> bool:
 
     Args:
         obj: Object to test for permission
-        user: core.models.User to test permissions against
+        user: core.models.User (or PermissionResolver) to test permissions against
 
     Returns:
         True if user is authorized to see object else False
@@ -132,11 +132,19 @@ class GenericContentPermissionMixinBuilder(View):
     This view protect any child view that would be showing an object that is restricted based
       on two properties.
 
+    On a ListView, the permissions on all the objects are checked
+    with a single [PermissionResolver][core.models.PermissionResolver].
+    If the queryset has a method named after `queryset_filter`,
+    this method is used instead to filter the objects in the db.
+
     Attributes:
         raised_error: permission to be raised
+        queryset_filter: name of the queryset method filtering
+            the objects the user is allowed to access
     """
 
     raised_error = PermissionDenied
+    queryset_filter: str | None = None
 
     @staticmethod
     def permission_function(obj: Any, user: User) -> bool:
@@ -157,8 +165,16 @@ class GenericContentPermissionMixinBuilder(View):
         # If we get here, it's a ListView
 
         queryset = self.get_queryset()
-        l_id = [o.id for o in queryset if self.get_permission_function(o, request.user)]
-        if not l_id and queryset.count() != 0:
+        if self.queryset_filter is not None and hasattr(queryset, self.queryset_filter):
+            # The permissions are checked by the db
+            allowed = getattr(queryset, self.queryset_filter)(request.user)
+            l_id = list(allowed.values_list("id", flat=True))
+        else:
+            objects = list(queryset)
+            resolver = PermissionResolver(request.user)
+            resolver.prefetch(objects)
+            l_id = [o.id for o in objects if self.get_permission_function(o, resolver)]
+        if not l_id and queryset.exists():
             raise self.raised_error
         self._get_queryset = self.get_queryset
 
@@ -223,6 +239,7 @@ class CanViewMixin(GenericContentPermissionMixinBuilder):
     """
 
     permission_function = can_view
+    queryset_filter = "viewable_by"
 
 
 class UserIsRootMixin(GenericContentPermissionMixinBuilder):
@@ -21,10 +21,9 @@
 # Place - Suite 330, Boston, MA 02111-1307, USA.
 #
 #
-import logging
 
 # This file contains all the views that concern the user model
-from datetime import date, timedelta
+from datetime import timedelta
 from smtplib import SMTPException
 
 from django.conf import settings
@@ -68,7 +67,7 @@ from core.views.forms import (
     UserProfileForm,
 )
 from counter.forms import StudentCardForm
-from subscription.models import Subscription
+from counter.stats import CustomerStats
 from trombi.views import UserTrombiForm
 
 
@@ -396,74 +395,17 @@ class UserStatsView(UserTabsMixin, CanViewMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
-        from django.db.models import Sum
-
-        from counter.models import Counter
-
-        foyer = Counter.objects.filter(name="Foyer").first()
-        mde = Counter.objects.filter(name="MDE").first()
-        gommette = Counter.objects.filter(name="La Gommette").first()
-        semester_start = Subscription.compute_start(d=date.today(), duration=3)
-        kwargs["total_perm_time"] = sum(
-            [p.end - p.start for p in self.object.permanencies.exclude(end=None)],
-            timedelta(),
-        )
-        kwargs["total_foyer_time"] = sum(
-            [
-                p.end - p.start
-                for p in self.object.permanencies.filter(counter=foyer).exclude(
-                    end=None
-                )
-            ],
-            timedelta(),
-        )
-        kwargs["total_mde_time"] = sum(
-            [
-                p.end - p.start
-                for p in self.object.permanencies.filter(counter=mde).exclude(end=None)
-            ],
-            timedelta(),
-        )
-        kwargs["total_gommette_time"] = sum(
-            [
-                p.end - p.start
-                for p in self.object.permanencies.filter(counter=gommette).exclude(
-                    end=None
-                )
-            ],
-            timedelta(),
-        )
-        kwargs["total_foyer_buyings"] = sum(
-            [
-                b.unit_price * b.quantity
-                for b in self.object.customer.buyings.filter(
-                    counter=foyer, date__gte=semester_start
-                )
-            ]
-        )
-        kwargs["total_mde_buyings"] = sum(
-            [
-                b.unit_price * b.quantity
-                for b in self.object.customer.buyings.filter(
-                    counter=mde, date__gte=semester_start
-                )
-            ]
-        )
-        kwargs["total_gommette_buyings"] = sum(
-            [
-                b.unit_price * b.quantity
-                for b in self.object.customer.buyings.filter(
-                    counter=gommette, date__gte=semester_start
-                )
-            ]
-        )
-        kwargs["top_product"] = (
-            self.object.customer.buyings.values("product__name")
-            .annotate(product_sum=Sum("quantity"))
-            .exclude(product_sum=None)
-            .order_by("-product_sum")
-            .all()[:10]
-        )
+        stats = CustomerStats.of(self.object.customer)
+        perm_time = stats.perm_time_by_counter
+        buyings = stats.buyings_by_counter
+        kwargs["total_perm_time"] = stats.total_perm_time
+        kwargs["total_foyer_time"] = perm_time.get("Foyer", timedelta())
+        kwargs["total_mde_time"] = perm_time.get("MDE", timedelta())
+        kwargs["total_gommette_time"] = perm_time.get("La Gommette", timedelta())
+        kwargs["total_foyer_buyings"] = buyings.get("Foyer", 0)
+        kwargs["total_mde_buyings"] = buyings.get("MDE", 0)
+        kwargs["total_gommette_buyings"] = buyings.get("La Gommette", 0)
+        kwargs["top_product"] = stats.top_products
         return kwargs
 
 
@@ -635,45 +577,20 @@ class UserAccountView(UserAccountBase):
 
     template_name = "core/user_account.jinja"
 
-    def expense_by_month(self, obj, calc):
-        stats = []
-
-        for year in obj.datetimes("date", "year", order="DESC"):
-            stats.append([])
-            i = 0
-            for month in obj.filter(date__year=year.year).datetimes(
-                "date", "month", order="DESC"
-            ):
-                q = obj.filter(date__year=month.year, date__month=month.month)
-                stats[i].append({"sum": sum([calc(p) for p in q]), "date": month})
-            i += 1
-        return stats
-
-    def invoices_calc(self, query):
-        t = 0
-        for it in query.items.all():
-            t += it.quantity * it.product_unit_price
-        return t
-
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
         kwargs["profile"] = self.object
-        try:
-            kwargs["customer"] = self.object.customer
-            kwargs["buyings_month"] = self.expense_by_month(
-                self.object.customer.buyings, (lambda q: q.unit_price * q.quantity)
-            )
-            kwargs["invoices_month"] = self.expense_by_month(
-                self.object.customer.user.invoices, self.invoices_calc
-            )
-            kwargs["refilling_month"] = self.expense_by_month(
-                self.object.customer.refillings, (lambda q: q.amount)
-            )
-            kwargs["etickets"] = self.object.customer.buyings.exclude(
-                product__eticket=None
-            ).all()
-        except Exception as e:
-            logging.error(e)
+        if not hasattr(self.object, "customer"):
+            return kwargs
+        customer = self.object.customer
+        stats = CustomerStats.of(customer)
+        kwargs["customer"] = customer
+        kwargs["buyings_month"] = stats.buyings_by_month
+        kwargs["invoices_month"] = stats.invoices_by_month
+        kwargs["refilling_month"] = stats.refillings_by_month
+        kwargs["etickets"] = customer.buyings.exclude(
+            product__eticket=None
+        ).select_related("product__eticket")
         return kwargs
 
 
@@ -12,11 +12,21 @@
 # OR WITHIN THE LOCAL FILE "LICENSE"
 #
 #
+from django.conf import settings
+from ninja import Query
 from ninja_extra import ControllerBase, api_controller, route
+from ninja_extra.exceptions import NotFound, PermissionDenied
 
-from core.api_permissions import CanView, IsRoot
-from counter.models import Counter
-from counter.schemas import CounterSchema
+from core.api_permissions import CanView, IsInGroup, IsRoot
+from counter.basket import Basket, Catalogue, is_barman
+from counter.models import Counter, Customer
+from counter.schemas import (
+    BasketItemSchema,
+    BasketSchema,
+    CashSumsFilterSchema,
+    CounterCashSumsSchema,
+    CounterSchema,
+)
 
 
 @api_controller("/counter")
@@ -35,3 +45,72 @@ class CounterController(ControllerBase):
         for c in counters:
             self.check_object_permissions(c)
         return counters
+
+    @route.get(
+        "bar/cash-sums",
+        response=list[CounterCashSumsSchema],
+        permissions=[IsRoot | IsInGroup(settings.SITH_GROUP_COUNTER_ADMIN_ID)],
+        url_name="cash_sums",
+    )
+    def fetch_cash_sums(self, filters: Query[CashSumsFilterSchema]):
+        """Return the money refilled in each bar and counted in its cash register.
+
+        If no begin date is given, the sums start after the last time
+        the cash register of each bar was emptied.
+        """
+        return Counter.objects.filter(type="BAR").annotate_cash_sums(
+            filters.begin_date, filters.end_date
+        )
+
+    @route.post(
+        "{counter_id}/basket/{user_id}",
+        response=BasketSchema,
+        permissions=[CanView],
+        url_name="check_basket",
+    )
+    def check_basket(
+        self, counter_id: int, user_id: int, items: list[BasketItemSchema]
+    ):
+        """Check the basket a customer wants to buy in a counter.
+
+        The items are added to the basket one after the other,
+        and the ones that cannot be bought are returned in the errors,
+        with the reason why.
+        Nothing is stored in the session, nor bought.
+        """
+        counter = self.get_object_or_exception(Counter, pk=counter_id)
+        request = self.context.request
+        if counter.type == "BAR":
+            if (
+                request.session.get("counter_token") != counter.token
+                or not counter.is_open
+            ):
+                raise PermissionDenied
+        elif not request.user.is_authenticated:
+            raise PermissionDenied
+        customer = (
+            Customer.objects.select_related("user").filter(user_id=user_id).first()
+        )
+        if customer is None or not customer.can_buy:
+            raise NotFound
+        basket = Basket(
+            Catalogue.of(counter.id), customer, is_barman=is_barman(counter, customer)
+        )
+        errors = []
+        for item in items:
+            error = basket.add(item.id, item.quantity)
+            if error is not None:
+                errors.append({"id": item.id, "error": error})
+        return {
+            "items": [
+                {
+                    "id": line.product.id,
+                    "quantity": line.quantity,
+                    "bonus_quantity": line.bonus_quantity,
+                    "unit_price": line.unit_price,
+                }
+                for line in basket.lines.values()
+            ],
+            "total": basket.total,
+            "errors": errors,
+        }
@@ -0,0 +1,392 @@
+"""Baskets of the counters, checked and bought without a query per product.
+
+The click view used to fetch each product of the basket
+from the database every time a product was added or removed.
+Now, the products sold in a counter are loaded once in a
+[Catalogue][counter.basket.Catalogue], kept in memory by each process,
+and a [Basket][counter.basket.Basket] checks the products against
+the rights and the account of the customer using only this catalogue.
+Once complete, the basket is bought in a single transaction
+with [Basket.checkout][counter.basket.Basket.checkout].
+
+Example:
+    ```python
+    catalogue = Catalogue.of(counter.id)
+    basket = Basket(catalogue, customer, is_barman=False)
+    error = basket.add(product_id, quantity=2)
+    if error is not None:
+        print(f"The product couldn't be added : {error}")
+    print(basket.total)
+    ```
+"""
+
+from __future__ import annotations
+
+import uuid
+from decimal import Decimal
+from typing import ClassVar, NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from core.models import Notification, User
+from counter.etickets import render_in_background
+from counter.models import (
+    BalanceMovement,
+    Counter,
+    Customer,
+    CustomerSummary,
+    Eticket,
+    Product,
+    Selling,
+    SellingRollup,
+)
+
+TRAY_SIZE = 6
+"""When a product is sold by tray, one product out of `TRAY_SIZE` is free."""
+
+
+class CatalogueProduct(NamedTuple):
+    """The data of a product needed to sell it."""
+
+    id: int
+    name: str
+    code: str
+    club_id: int
+    selling_price: Decimal
+    special_selling_price: Decimal
+    tray: bool
+    limit_age: int
+    buying_group_ids: frozenset[int]
+
+    @property
+    def is_record_product(self) -> bool:
+        return settings.SITH_ECOCUP_CONS == self.id
+
+    @property
+    def is_unrecord_product(self) -> bool:
+        return settings.SITH_ECOCUP_DECO == self.id
+
+    def price_for(self, *, is_barman: bool) -> Decimal:
+        return self.special_selling_price if is_barman else self.selling_price
+
+
+class Catalogue:
+    """The products sold in a counter.
+
+    The catalogue of a counter is loaded once per process,
+    then kept until a product or the products of a counter change.
+    As for the [GroupRegistry][core.models.GroupRegistry],
+    a change is signaled to all processes through a version key of the cache.
+    """
+
+    VERSION_KEY = "counter_catalogues_version"
+    _catalogues: ClassVar[dict[int, Catalogue]] = {}
+
+    def __init__(self, version: str, products: list[CatalogueProduct]):
+        self.version = version
+        self.products = {p.id: p for p in products}
+        self._by_code = {p.code.upper(): p for p in products if p.code}
+
+    @classmethod
+    def _load(cls, counter_id: int, version: str) -> Catalogue:
+        products = Product.objects.filter(counters=counter_id).prefetch_related(
+            "buying_groups"
+        )
+        return cls(
+            version,
+            [
+                CatalogueProduct(
+                    id=p.id,
+                    name=p.name,
+                    code=p.code,
+                    club_id=p.club_id,
+                    selling_price=p.selling_price,
+                    special_selling_price=p.special_selling_price,
+                    tray=p.tray,
+                    limit_age=p.limit_age,
+                    buying_group_ids=frozenset(g.id for g in p.buying_groups.all()),
+                )
+                for p in products
+            ],
+        )
+
+    @classmethod
+    def of(cls, counter_id: int) -> Catalogue:
+        """Return the catalogue of the given counter, loading it if needed."""
+        version = cache.get_or_set(cls.VERSION_KEY, lambda: uuid.uuid4().hex, None)
+        catalogue = cls._catalogues.get(counter_id)
+        if catalogue is None or catalogue.version != version:
+            catalogue = cls._load(counter_id, version)
+            cls._catalogues[counter_id] = catalogue
+        return catalogue
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Mark the catalogues of all the counters of all processes as outdated."""
+        cache.set(cls.VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+    def get(self, product_id: int) -> CatalogueProduct | None:
+        return self.products.get(product_id)
+
+    def get_by_code(self, code: str) -> CatalogueProduct | None:
+        return self._by_code.get(code.upper())
+
+
+class BasketLine(NamedTuple):
+    product: CatalogueProduct
+    quantity: int
+    bonus_quantity: int
+    unit_price: Decimal
+
+
+class Basket:
+    """The products a customer is buying in a counter.
+
+    Each product added to the basket is checked against the rights,
+    the age and the account of the customer.
+    When a product cannot be added, the reason is returned
+    as one of the error codes of `Basket.ERRORS`.
+    """
+
+    ERRORS = ("unknown_product", "not_allowed", "not_enough", "no_age", "too_young")
+
+    def __init__(self, catalogue: Catalogue, customer: Customer, *, is_barman: bool):
+        self.catalogue = catalogue
+        self.customer = customer
+        self.is_barman = is_barman
+        self.lines: dict[int, BasketLine] = {}
+
+    @classmethod
+    def from_session(
+        cls,
+        catalogue: Catalogue,
+        customer: Customer,
+        data: dict[str, dict[str, int]],
+        *,
+        is_barman: bool,
+    ) -> Basket:
+        """Rebuild a basket stored in a session by `Basket.to_session`."""
+        basket = cls(catalogue, customer, is_barman=is_barman)
+        for product_id, infos in data.items():
+            product = catalogue.get(int(product_id))
+            if product is None:
+                # the product has been removed from the counter in the meantime
+                continue
+            basket.lines[product.id] = BasketLine(
+                product=product,
+                quantity=infos["qty"],
+                bonus_quantity=infos["bonus_qty"],
+                unit_price=Decimal(infos["price"]) / 100,
+            )
+        return basket
+
+    def to_session(self) -> dict[str, dict[str, int]]:
+        """Return the basket in a format that can be stored in a session."""
+        return {
+            str(line.product.id): {
+                "qty": line.quantity,
+                "price": int(line.unit_price * 100),
+                "bonus_qty": line.bonus_quantity,
+            }
+            for line in self.lines.values()
+        }
+
+    @property
+    def total(self) -> Decimal:
+        return sum(
+            (line.unit_price * line.quantity for line in self.lines.values()),
+            start=Decimal(0),
+        )
+
+    def recorded_products(self, extra: CatalogueProduct | None = None) -> int:
+        """The balance of the ecocups given back and taken in this basket.
+
+        Args:
+            extra: a product to count once more, as if it was added to the basket
+        """
+        recorded = 0
+        lines = [(line.product, line.quantity) for line in self.lines.values()]
+        if extra is not None:
+            lines.append((extra, 1))
+        for product, quantity in lines:
+            if product.is_record_product:
+                recorded -= quantity
+            elif product.is_unrecord_product:
+                recorded += quantity
+        return recorded
+
+    def can_buy(self, product: CatalogueProduct) -> bool:
+        """Check that the customer is allowed to buy the given product."""
+        user = self.customer.user
+        return not product.buying_group_ids or any(
+            user.is_in_group(pk=group_id) for group_id in product.buying_group_ids
+        )
+
+    def add(self, product_id: int, quantity: int = 1) -> str | None:
+        """Add the product to the basket.
+
+        Returns:
+            None if the product has been added, else the reason why it couldn't.
+        """
+        product = self.catalogue.get(product_id)
+        if product is None:
+            return "unknown_product"
+        if not self.can_buy(product):
+            return "not_allowed"
+        line = self.lines.get(product.id)
+        bonus_quantity = 0
+        if product.tray:
+            # every TRAY_SIZE-th product of the basket is free
+            in_basket = line.quantity + line.bonus_quantity if line else 0
+            bonus_quantity = (in_basket % TRAY_SIZE + quantity) // TRAY_SIZE
+            quantity -= bonus_quantity
+        unit_price = product.price_for(is_barman=self.is_barman)
+        if self.customer.amount < self.total + quantity * unit_price:
+            return "not_enough"
+        if product.is_unrecord_product and not self.customer.can_record_more(
+            self.recorded_products(extra=product)
+        ):
+            return "not_allowed"
+        user = self.customer.user
+        if product.limit_age >= 18 and not user.date_of_birth:
+            return "no_age"
+        if product.limit_age >= 18 and user.is_banned_alcohol:
+            return "not_allowed"
+        if user.is_banned_counter:
+            return "not_allowed"
+        if user.date_of_birth and user.get_age() < product.limit_age:
+            return "too_young"
+        if line is None:
+            line = BasketLine(product, 0, 0, unit_price)
+        self.lines[product.id] = line._replace(
+            quantity=line.quantity + quantity,
+            bonus_quantity=line.bonus_quantity + bonus_quantity,
+        )
+        return None
+
+    def remove(self, product_id: int) -> None:
+        """Remove one unit of the product from the basket.
+
+        For products sold by tray, the free products are removed first.
+        """
+        line = self.lines.get(product_id)
+        if line is None:
+            return
+        if (
+            line.product.tray
+            and (line.quantity + line.bonus_quantity) % TRAY_SIZE == 0
+            and line.bonus_quantity
+        ):
+            line = line._replace(bonus_quantity=line.bonus_quantity - 1)
+        else:
+            line = line._replace(quantity=line.quantity - 1)
+        if line.quantity <= 0:
+            del self.lines[product_id]
+        else:
+            self.lines[product_id] = line
+
+    def checkout(self, counter: Counter, seller: User) -> list[Selling]:
+        """Buy all the products of the basket, in a single transaction.
+
+        The customer is debited with a single conditional update,
+        so that concurrent purchases cannot make the account go negative,
+        and with a single movement in the ledger.
+        Then all the sellings are created at once.
+        The mails of the etickets are sent once the transaction is committed.
+
+        Raises:
+            ValidationError: if the customer hasn't enough money
+        """
+        now = timezone.now()
+        sellings = []
+        for line in self.lines.values():
+            infos = {
+                "product_id": line.product.id,
+                "club_id": line.product.club_id,
+                "counter": counter,
+                "seller": seller,
+                "customer": self.customer,
+                "date": now,
+                "is_validated": True,
+            }
+            sellings.append(
+                Selling(
+                    label=line.product.name,
+                    unit_price=line.unit_price,
+                    quantity=line.quantity,
+                    **infos,
+                )
+            )
+            if line.bonus_quantity:
+                sellings.append(
+                    Selling(
+                        label=line.product.name + " (Plateau)",
+                        unit_price=0,
+                        quantity=line.bonus_quantity,
+                        **infos,
+                    )
+                )
+        user = self.customer.user
+        with transaction.atomic():
+            debited = Customer.objects.filter(
+                pk=self.customer.pk, amount__gte=self.total
+            ).update(
+                amount=F("amount") - self.total,
+                recorded_products=F("recorded_products") - self.recorded_products(),
+            )
+            if not debited:
+                raise ValidationError(_("Not enough money"))
+            CustomerSummary.invalidate([self.customer.pk])
+            BalanceMovement.objects.create(
+                customer=self.customer, amount=-self.total, label="Selling"
+            )
+            Selling.objects.bulk_create(sellings)
+            SellingRollup.add(sellings)
+            if user.was_subscribed:
+                for selling in sellings:
+                    selling.subscribe_customer()
+            if user.preferences.notify_on_click:
+                url = reverse(
+                    "core:user_account_detail",
+                    kwargs={"user_id": user.id, "year": now.year, "month": now.month},
+                )
+                Notification.objects.bulk_create(
+                    Notification(
+                        user=user,
+                        url=url,
+                        param="%d x %s" % (s.quantity, s.label),
+                        type="SELLING",
+                    )
+                    for s in sellings
+                )
+            etickets = set(
+                Eticket.objects.filter(product_id__in=self.lines.keys()).values_list(
+                    "product_id", flat=True
+                )
+            )
+            if etickets:
+                render_in_background(s.id for s in sellings if s.product_id in etickets)
+                transaction.on_commit(
+                    lambda: [
+                        s.send_mail_customer()
+                        for s in sellings
+                        if s.product_id in etickets
+                    ]
+                )
+        self.customer.refresh_from_db(fields=["amount", "recorded_products"])
+        return sellings
+
+
+def is_barman(counter: Counter, customer: Customer) -> bool:
+    """Check if the customer is currently a barman of the counter.
+
+    Barmen buy the products at their special selling price.
+    """
+    return counter.type == "BAR" and customer.user in counter.barmen_list
@@ -0,0 +1,229 @@
+"""Rendering of the etickets.
+
+The PDF of an eticket used to be drawn again each time it was downloaded,
+reading the background, the banner of the event and the profile picture
+of the customer from the disk every time.
+Now, the images are decoded once per process,
+and the PDF of each selling is stored with a name derived from
+everything which is drawn on it, so that it is drawn only once.
+
+The etickets bought at a counter are rendered by a pool of threads,
+once the transaction of the purchase is committed,
+so that they are ready when the customer opens the link of the mail.
+
+Example:
+    ```python
+    pdf: bytes = eticket_pdf(selling)
+
+    # render all the tickets of an event in a single document
+    with open("door.pdf", "wb") as f:
+        render_event(eticket, f)
+    ```
+"""
+
+from __future__ import annotations
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from typing import BinaryIO, Iterable
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils.translation import gettext as _
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from counter.models import Eticket, Selling
+
+RENDER_VERSION = 1
+"""To increment when the layout of the etickets changes,
+so that the stored PDFs are drawn again."""
+
+STORAGE_DIR = "etickets/pdf"
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="eticket")
+
+
+@lru_cache(maxsize=None)
+def _static_image(path: str) -> ImageReader:
+    return ImageReader(str(settings.BASE_DIR / path))
+
+
+@lru_cache(maxsize=32)
+def _banner(eticket_id: int, name: str) -> ImageReader:
+    # the name of the file is part of the key,
+    # so a new banner isn't hidden by the old one
+    with default_storage.open(name) as f:
+        return ImageReader(BytesIO(f.read()))
+
+
+def _ticket_code(selling: Selling) -> str:
+    code = "%s %s %s %s" % (
+        selling.customer.user_id,
+        selling.product_id,
+        selling.id,
+        selling.quantity,
+    )
+    return code + " " + selling.product.eticket.get_hash(code)[:8].upper()
+
+
+def _digest(selling: Selling) -> str:
+    """Return a hash of everything drawn on the eticket of the selling.
+
+    The secret of the eticket is part of it,
+    so the name of the stored PDF cannot be guessed.
+    """
+    eticket = selling.product.eticket
+    user = selling.customer.user
+    parts = (
+        RENDER_VERSION,
+        eticket.secret,
+        eticket.banner.name if eticket.banner else "",
+        eticket.event_title,
+        eticket.event_date,
+        _ticket_code(selling),
+        user.get_display_name(),
+        user.profile_pict.file.name if user.profile_pict else "",
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def _draw(p: canvas.Canvas, selling: Selling) -> None:
+    """Draw the eticket of the selling on the current page of the canvas."""
+    eticket = selling.product.eticket
+    user = selling.customer.user
+    code = _ticket_code(selling)
+    im = _static_image("core/static/core/img/eticket.jpg")
+    width, height = im.getSize()
+    size = max(width, height)
+    width = 8 * cm * width / size
+    height = 8 * cm * height / size
+    p.drawImage(im, 10 * cm, 25 * cm, width, height)
+    if eticket.banner:
+        im = _banner(eticket.id, eticket.banner.name)
+        width, height = im.getSize()
+        size = max(width, height)
+        width = 6 * cm * width / size
+        height = 6 * cm * height / size
+        p.drawImage(im, 1 * cm, 25 * cm, width, height)
+    if user.profile_pict:
+        im = ImageReader(user.profile_pict.file)
+        width, height = im.getSize()
+        size = max(width, height)
+        width = 150 * width / size
+        height = 150 * height / size
+        p.drawImage(im, 10.5 * cm - width / 2, 16 * cm, width, height)
+    if eticket.event_title:
+        p.setFont("Helvetica-Bold", 20)
+        p.drawCentredString(10.5 * cm, 23.6 * cm, eticket.event_title)
+    if eticket.event_date:
+        p.setFont("Helvetica-Bold", 16)
+        p.drawCentredString(
+            10.5 * cm, 22.6 * cm, eticket.event_date.strftime("%d %b %Y")
+        )  # FIXME with a locale
+    p.setFont("Helvetica-Bold", 14)
+    p.drawCentredString(
+        10.5 * cm,
+        15 * cm,
+        "%s : %d %s" % (user.get_display_name(), selling.quantity, _("people(s)")),
+    )
+    p.setFont("Courier-Bold", 14)
+    qrcode = QrCodeWidget(code)
+    bounds = qrcode.getBounds()
+    width = bounds[2] - bounds[0]
+    height = bounds[3] - bounds[1]
+    d = Drawing(260, 260, transform=[260.0 / width, 0, 0, 260.0 / height, 0, 0])
+    d.add(qrcode)
+    renderPDF.draw(d, p, 10.5 * cm - 130, 6.1 * cm)
+    p.drawCentredString(10.5 * cm, 6 * cm, code)
+
+    partners = _static_image("core/static/core/img/partners.png")
+    width, height = partners.getSize()
+    width = width * 2 / 3
+    height = height * 2 / 3
+    p.drawImage(partners, 0 * cm, 0 * cm, width, height)
+    p.showPage()
+
+
+def _render(sellings: Iterable[Selling], output: BinaryIO) -> None:
+    p = canvas.Canvas(output)
+    p.setTitle("Eticket")
+    for selling in sellings:
+        _draw(p, selling)
+    p.save()
+
+
+def eticket_pdf(selling: Selling) -> bytes:
+    """Return the PDF of the eticket of the selling.
+
+    The PDF is drawn only if it hasn't been stored yet.
+    """
+    name = f"{STORAGE_DIR}/{_digest(selling)}.pdf"
+    if default_storage.exists(name):
+        with default_storage.open(name) as f:
+            return f.read()
+    output = BytesIO()
+    _render([selling], output)
+    pdf = output.getvalue()
+    if not default_storage.exists(name):
+        # another thread may have stored it in the meantime
+        default_storage.save(name, ContentFile(pdf))
+    return pdf
+
+
+def _eticket_sellings() -> Iterable[Selling]:
+    return Selling.objects.exclude(product__eticket=None).select_related(
+        "product__eticket", "customer__user__profile_pict"
+    )
+
+
+def render_in_background(selling_ids: Iterable[int]) -> None:
+    """Draw and store the etickets of the sellings in a background thread,
+    once the current transaction is committed.
+    """
+    selling_ids = list(selling_ids)
+    transaction.on_commit(lambda: _executor.submit(_render_in_thread, selling_ids))
+
+
+def _render_in_thread(selling_ids: list[int]) -> None:
+    try:
+        render_batch(selling_ids)
+    finally:
+        # each thread of the pool has its own connection,
+        # which must not be left open
+        connection.close()
+
+
+def render_batch(selling_ids: Iterable[int]) -> int:
+    """Draw and store the etickets of the given sellings.
+
+    Returns:
+        The number of etickets.
+    """
+    sellings = list(_eticket_sellings().filter(id__in=selling_ids))
+    for selling in sellings:
+        eticket_pdf(selling)
+    return len(sellings)
+
+
+def render_event(eticket: Eticket, output: BinaryIO) -> int:
+    """Draw all the etickets sold for an event in a single document.
+
+    Returns:
+        The number of drawn etickets.
+    """
+    sellings = list(
+        _eticket_sellings()
+        .filter(product__eticket=eticket)
+        .order_by("customer__user__last_name", "customer__user__first_name", "id")
+    )
+    _render(sellings, output)
+    return len(sellings)
@@ -8,7 +8,7 @@ from core.views.forms import NFCTextInput, SelectDate, SelectDateTime
 from counter.models import (
     BillingInfo,
     Counter,
-    Customer,
+    CustomerSummary,
     Eticket,
     Product,
     Refilling,
@@ -78,22 +78,15 @@ class GetUserForm(forms.Form):
 
     def clean(self):
         cleaned_data = super().clean()
-        cus = None
+        customer = None
         if cleaned_data["code"] != "":
-            if len(cleaned_data["code"]) == StudentCard.UID_SIZE:
-                card = StudentCard.objects.filter(uid=cleaned_data["code"])
-                if card.exists():
-                    cus = card.first().customer
-            if cus is None:
-                cus = Customer.objects.filter(
-                    account_id__iexact=cleaned_data["code"]
-                ).first()
+            customer = CustomerSummary.lookup(cleaned_data["code"])
         elif cleaned_data["id"] is not None:
-            cus = Customer.objects.filter(user=cleaned_data["id"]).first()
-        if cus is None or not cus.can_buy:
+            customer = CustomerSummary.of(cleaned_data["id"].id)
+        if customer is None or not customer.can_buy:
             raise forms.ValidationError(_("User not found"))
-        cleaned_data["user_id"] = cus.user.id
-        cleaned_data["user"] = cus.user
+        cleaned_data["user_id"] = customer.user_id
+        cleaned_data["customer"] = customer
         return cleaned_data
 
 
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from counter.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that the amount of each customer account "
+        "is the sum of the movements of its ledger. "
+        "With --fix, set the amount of the wrong accounts to this sum."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            help="Rebuild the amount of the wrong accounts from their ledger",
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        unbalanced = list(
+            Customer.objects.unbalanced().values_list(
+                "account_id", "amount", "ledger_balance"
+            )
+        )
+        if not unbalanced:
+            self.stdout.write("All the accounts are balanced.")
+            return
+        for account_id, amount, ledger_balance in unbalanced:
+            self.stdout.write(f"{account_id}: {amount} instead of {ledger_balance}")
+        if not options["fix"]:
+            self.stdout.write(f"{len(unbalanced)} accounts are unbalanced.")
+            return
+        # the amounts are computed again by the update itself,
+        # so the movements added in the meantime are taken into account
+        nb_fixed = Customer.objects.filter(
+            account_id__in=[account_id for account_id, *_ in unbalanced]
+        ).rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f"{nb_fixed} accounts have been fixed."))
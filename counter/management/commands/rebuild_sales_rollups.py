@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from counter.models import RefillingRollup, SellingRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute again the daily rollups of the sellings and refillings "
+        "used by the counter statistics. "
+        "Needed after sellings or refillings have been edited "
+        "or bulk-created outside of the site."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            SellingRollup.rebuild()
+            RefillingRollup.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{SellingRollup.objects.count()} selling rollups and "
+                f"{RefillingRollup.objects.count()} refilling rollups built."
+            )
+        )
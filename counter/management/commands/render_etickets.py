@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from counter.etickets import render_batch, render_event
+from counter.models import Eticket, Selling
+
+
+class Command(BaseCommand):
+    help = (
+        "Draw all the etickets sold for an event. "
+        "Each eticket is stored, so that it is downloaded without delay. "
+        "With --output, all the etickets are also written in a single PDF, "
+        "to be printed for the checks at the door."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("eticket_id", type=int, help="The id of the eticket")
+        parser.add_argument(
+            "--output", help="The PDF file in which all the etickets are written"
+        )
+
+    def handle(self, *args, **options):
+        eticket = Eticket.objects.filter(id=options["eticket_id"]).first()
+        if eticket is None:
+            raise CommandError(f"There is no eticket with id {options['eticket_id']}")
+        selling_ids = Selling.objects.filter(product__eticket=eticket).values_list(
+            "id", flat=True
+        )
+        nb_rendered = render_batch(selling_ids)
+        self.stdout.write(f"{nb_rendered} etickets have been drawn.")
+        if options["output"]:
+            with open(options["output"], "wb") as f:
+                render_event(eticket, f)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"The etickets have been written in {options['output']}"
+                )
+            )
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+import accounting.models
+
+
+def open_ledger(apps, schema_editor):
+    """Start the ledger of each customer with its current amount."""
+    Customer = apps.get_model("counter", "Customer")
+    BalanceMovement = apps.get_model("counter", "BalanceMovement")
+    BalanceMovement.objects.bulk_create(
+        [
+            BalanceMovement(customer_id=pk, amount=amount, label="Initial balance")
+            for pk, amount in Customer.objects.exclude(amount=0).values_list(
+                "pk", "amount"
+            )
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("counter", "0023_billinginfo_phone_number"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BalanceMovement",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "amount",
+                    accounting.models.CurrencyField(
+                        decimal_places=2, max_digits=12, verbose_name="amount"
+                    ),
+                ),
+                ("label", models.CharField(max_length=64, verbose_name="label")),
+                (
+                    "date",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="date"
+                    ),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_movements",
+                        to="counter.customer",
+                        verbose_name="customer",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "balance movement",
+            },
+        ),
+        migrations.RunPython(open_ledger, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,172 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+import accounting.models
+
+
+def fill_rollups(apps, schema_editor):
+    """Compute the rollups of all the existing sellings and refillings."""
+    Selling = apps.get_model("counter", "Selling")
+    Refilling = apps.get_model("counter", "Refilling")
+    SellingRollup = apps.get_model("counter", "SellingRollup")
+    RefillingRollup = apps.get_model("counter", "RefillingRollup")
+    keys = ["counter_id", "club_id", "product_id", "customer_id", "payment_method"]
+    SellingRollup.objects.bulk_create(
+        (
+            SellingRollup(
+                day=r["day"],
+                quantity=r["sum_quantity"],
+                total=r["sum_total"],
+                **{k: r[k] for k in keys},
+            )
+            for r in Selling.objects.annotate(day=TruncDate("date"))
+            .values("day", *keys)
+            .annotate(
+                sum_quantity=Sum("quantity"),
+                sum_total=Sum(F("quantity") * F("unit_price")),
+            )
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+    keys = ["counter_id", "customer_id", "payment_method"]
+    RefillingRollup.objects.bulk_create(
+        (
+            RefillingRollup(
+                day=r["day"], total=r["sum_total"], **{k: r[k] for k in keys}
+            )
+            for r in Refilling.objects.annotate(day=TruncDate("date"))
+            .values("day", *keys)
+            .annotate(sum_total=Sum("amount"))
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("club", "0011_auto_20180426_2013"),
+        ("counter", "0024_balancemovement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SellingRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(db_index=True, verbose_name="day")),
+                (
+                    "payment_method",
+                    models.CharField(max_length=255, verbose_name="payment method"),
+                ),
+                ("quantity", models.IntegerField(default=0, verbose_name="quantity")),
+                (
+                    "total",
+                    accounting.models.CurrencyField(
+                        decimal_places=2, default=0, max_digits=12, verbose_name="total"
+                    ),
+                ),
+                (
+                    "club",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="club.club",
+                    ),
+                ),
+                (
+                    "counter",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="counter.counter",
+                    ),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="counter.customer",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="counter.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "selling rollup",
+            },
+        ),
+        migrations.CreateModel(
+            name="RefillingRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(db_index=True, verbose_name="day")),
+                (
+                    "payment_method",
+                    models.CharField(max_length=255, verbose_name="payment method"),
+                ),
+                (
+                    "total",
+                    accounting.models.CurrencyField(
+                        decimal_places=2, default=0, max_digits=12, verbose_name="total"
+                    ),
+                ),
+                (
+                    "counter",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="counter.counter",
+                    ),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="counter.customer",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "refilling rollup",
+            },
+        ),
+        migrations.RunPython(fill_rollups, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:37
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+
+def init_sequence(apps, schema_editor):
+    """Start the sequence after the highest existing account number."""
+    Customer = apps.get_model("counter", "Customer")
+    AccountIdSequence = apps.get_model("counter", "AccountIdSequence")
+    last = (
+        Customer.objects.order_by(Length("account_id"), "account_id")
+        .values_list("account_id", flat=True)
+        .last()
+    )
+    # 1504 is the first account number, legacy from the old site
+    AccountIdSequence.objects.create(pk=1, last_number=int(last[:-1]) if last else 1503)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("counter", "0025_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountIdSequence",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "last_number",
+                    models.PositiveIntegerField(verbose_name="last number"),
+                ),
+            ],
+            options={
+                "verbose_name": "account id sequence",
+            },
+        ),
+        migrations.RunPython(init_sequence, reverse_code=migrations.RunPython.noop),
+    ]
@@ -20,14 +20,16 @@ import random
 import string
 from datetime import date, datetime, timedelta
 from datetime import timezone as tz
-from typing import Tuple
+from decimal import Decimal
+from typing import Iterable, NamedTuple, Tuple
 
 from dict2xml import dict2xml
 from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import MinLengthValidator
-from django.db import models
-from django.db.models import Exists, F, OuterRef, QuerySet, Sum, Value
-from django.db.models.functions import Concat, Length
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Length, TruncDate
 from django.forms import ValidationError
 from django.urls import reverse
 from django.utils import timezone
@@ -37,7 +39,7 @@ from django_countries.fields import CountryField
 from phonenumber_field.modelfields import PhoneNumberField
 
 from accounting.models import CurrencyField
-from club.models import Club
+from club.models import Club, Membership
 from core.fields import ResizedImageField
 from core.models import Group, Notification, User
 from core.utils import get_start_of_semester
@@ -45,6 +47,115 @@ from sith.settings import SITH_COUNTER_OFFICES, SITH_MAIN_CLUB
 from subscription.models import Subscription
 
 
+class CustomerQuerySet(models.QuerySet):
+    def annotate_ledger_balance(self) -> CustomerQuerySet:
+        """Annotate the customers with the `ledger_balance` field.
+
+        This field is the sum of all the balance movements of the customer,
+        which is the amount the account should have.
+        """
+        return self.annotate(ledger_balance=self._ledger_balance())
+
+    def unbalanced(self) -> CustomerQuerySet:
+        """Keep only the customers whose amount isn't the sum of their movements."""
+        return self.annotate_ledger_balance().exclude(amount=F("ledger_balance"))
+
+    def rebuild_balances(self) -> int:
+        """Set the amount of all the customers to the sum of their movements.
+
+        All the accounts are updated with a single query.
+
+        Returns:
+            The number of updated customers
+        """
+        CustomerSummary.invalidate(self.values_list("pk", flat=True))
+        return self.update(amount=self._ledger_balance())
+
+    @staticmethod
+    def _ledger_balance() -> Coalesce:
+        movements = (
+            BalanceMovement.objects.filter(customer=OuterRef("pk"))
+            .values("customer")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        )
+        return Coalesce(Subquery(movements), Value(0), output_field=CurrencyField())
+
+
+class AccountIdSequence(models.Model):
+    """The last number given to the account id of a customer.
+
+    An account id is a number followed by a random letter.
+    Finding the next number used to require to sort the whole customer table.
+    Now, the numbers are taken from this single row,
+    locked with `SELECT ... FOR UPDATE` while it is incremented,
+    so that concurrent creations never get the same number.
+    """
+
+    last_number = models.PositiveIntegerField(_("last number"))
+
+    FIRST_NUMBER = 1504
+    """The first account number, legacy from the old site."""
+
+    class Meta:
+        verbose_name = _("account id sequence")
+
+    def __str__(self):
+        return str(self.last_number)
+
+    @classmethod
+    def _current_max(cls) -> int:
+        """Return the highest number of the existing account ids."""
+        last = (
+            Customer.objects.order_by(Length("account_id"), "account_id")
+            .values_list("account_id", flat=True)
+            .last()
+        )
+        return int(last[:-1]) if last else cls.FIRST_NUMBER - 1
+
+    @classmethod
+    def allocate(cls, n: int = 1) -> list[str]:
+        """Return `n` new and unique account ids.
+
+        Example:
+            ```python
+            ids = AccountIdSequence.allocate(len(users))
+            Customer.objects.bulk_create(
+                Customer(user=user, account_id=account_id)
+                for user, account_id in zip(users, ids)
+            )
+            ```
+        """
+        if n <= 0:
+            return []
+        with transaction.atomic():
+            sequence = cls.objects.select_for_update().filter(pk=1).first()
+            if sequence is None:
+                # the row is created by the migrations,
+                # so this only happens once the database has been flushed
+                sequence = cls.objects.create(pk=1, last_number=cls._current_max())
+            first = sequence.last_number + 1
+            sequence.last_number += n
+            sequence.save(update_fields=["last_number"])
+        return [
+            f"{number}{random.choice(string.ascii_lowercase)}"
+            for number in range(first, first + n)
+        ]
+
+    @classmethod
+    def follow(cls, account_id: str) -> None:
+        """Make sure the sequence is past the number of the given account id.
+
+        This is needed when an account id is chosen by hand
+        rather than by [allocate][counter.models.AccountIdSequence.allocate].
+        """
+        number = account_id[:-1]
+        if number.isdigit():
+            cls.objects.filter(pk=1, last_number__lt=int(number)).update(
+                last_number=int(number)
+            )
+
+
 class Customer(models.Model):
     """Customer data of a User.
 
@@ -57,6 +168,8 @@ class Customer(models.Model):
     amount = CurrencyField(_("amount"), default=0)
     recorded_products = models.IntegerField(_("recorded product"), default=0)
 
+    objects = CustomerQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("customer")
         verbose_name_plural = _("customers")
@@ -72,11 +185,45 @@ class Customer(models.Model):
         """
         if self.amount < 0 and (is_selling and not allow_negative):
             raise ValidationError(_("Not enough money"))
+        creation = self._state.adding
         super().save(*args, **kwargs)
+        if creation:
+            AccountIdSequence.follow(self.account_id)
+        if creation and self.amount:
+            BalanceMovement.objects.create(
+                customer=self, amount=self.amount, label="Initial balance"
+            )
 
     def get_absolute_url(self):
         return reverse("core:user_account", kwargs={"user_id": self.user.pk})
 
+    def credit(self, amount: Decimal, label: str) -> None:
+        """Atomically add money to the account, and write it in the ledger."""
+        self._change_amount(amount, label)
+
+    def debit(self, amount: Decimal, label: str, *, allow_negative=False) -> None:
+        """Atomically remove money from the account, and write it in the ledger.
+
+        The amount of the account is checked and updated in a single query,
+        so concurrent operations on the same account can't be lost.
+
+        Raises:
+            ValidationError: if there isn't enough money on the account
+                and allow_negative is False
+        """
+        self._change_amount(-amount, label, check_balance=not allow_negative)
+
+    def _change_amount(self, amount: Decimal, label: str, *, check_balance=False):
+        customers = Customer.objects.filter(pk=self.pk)
+        if check_balance:
+            customers = customers.filter(amount__gte=-amount)
+        with transaction.atomic():
+            if not customers.update(amount=F("amount") + amount):
+                raise ValidationError(_("Not enough money"))
+            BalanceMovement.objects.create(customer=self, amount=amount, label=label)
+        CustomerSummary.invalidate([self.pk])
+        self.refresh_from_db(fields=["amount"])
+
     @property
     def can_record(self):
         return self.recorded_products > -settings.SITH_ECOCUP_LIMIT
@@ -94,10 +241,10 @@ class Customer(models.Model):
         about the relation between a User (not a Customer,
         don't mix them) and a Product.
         """
-        subscription = self.user.subscriptions.order_by("subscription_end").last()
-        if subscription is None:
+        ends = [end for _, end in self.user.permissions.subscriptions]
+        if not ends:
             return False
-        return (date.today() - subscription.subscription_end) < timedelta(days=90)
+        return (date.today() - max(ends)) < timedelta(days=90)
 
     @classmethod
     def get_or_create(cls, user: User) -> Tuple[Customer, bool]:
@@ -118,45 +265,176 @@ class Customer(models.Model):
         """
         if hasattr(user, "customer"):
             return user.customer, False
-
-        # account_id are always a number with a letter appended
-        account_id = (
-            Customer.objects.order_by(Length("account_id"), "account_id")
-            .values("account_id")
-            .last()
-        )
-        if account_id is None:
-            # legacy from the old site
-            account = cls.objects.create(user=user, account_id="1504a")
-            return account, True
-
-        account_id = account_id["account_id"]
-        account_num = int(account_id[:-1])
-        while Customer.objects.filter(account_id=account_id).exists():
-            # when entering the first iteration, we are using an already existing account id
-            # so the loop should always execute at least one time
-            account_num += 1
-            account_id = f"{account_num}{random.choice(string.ascii_lowercase)}"
-
+        account_id = AccountIdSequence.allocate()[0]
         account = cls.objects.create(user=user, account_id=account_id)
         return account, True
 
+    @classmethod
+    def bulk_get_or_create(cls, users: Iterable[User]) -> list[Customer]:
+        """Return the accounts of all the given users,
+        creating the missing ones at once.
+
+        This is the same as calling `get_or_create` for each user,
+        but with a constant number of queries.
+        """
+        users = list(users)
+        existing = cls.objects.in_bulk([u.id for u in users])
+        new = [u for u in users if u.id not in existing]
+        account_ids = AccountIdSequence.allocate(len(new))
+        created = cls.objects.bulk_create(
+            cls(user=user, account_id=account_id)
+            for user, account_id in zip(new, account_ids)
+        )
+        CustomerSummary.invalidate([u.id for u in new])
+        existing.update({c.user_id: c for c in created})
+        return [existing[u.id] for u in users]
+
     def recompute_amount(self):
+        """Set the amount to the sum of the refillings minus the purchases.
+
+        The difference with the current amount is written in the ledger
+        as a correction.
+        """
         refillings = self.refillings.aggregate(sum=Sum(F("amount")))["sum"]
-        self.amount = refillings if refillings is not None else 0
+        amount = refillings if refillings is not None else 0
         purchases = (
             self.buyings.filter(payment_method="SITH_ACCOUNT")
             .annotate(amount=F("quantity") * F("unit_price"))
             .aggregate(sum=Sum(F("amount")))
         )["sum"]
         if purchases is not None:
-            self.amount -= purchases
-        self.save()
+            amount -= purchases
+        self.refresh_from_db(fields=["amount"])
+        if amount != self.amount:
+            self.credit(amount - self.amount, "Correction")
 
     def get_full_url(self):
         return "".join(["https://", settings.SITH_URL, self.get_absolute_url()])
 
 
+class CustomerSummary(NamedTuple):
+    """What a counter needs to know about a customer before selling anything.
+
+    The summaries are kept in the cache, along with the student card uids
+    and the account ids leading to them, so that identifying a customer
+    at a counter usually doesn't query the database at all.
+    They are dropped when the customer, its user, its subscriptions,
+    its groups or its student cards change (see `counter.signals`),
+    and when the amount of its account changes.
+    """
+
+    user_id: int
+    account_id: str
+    amount: Decimal
+    recorded_products: int
+    subscription_end: date | None
+    date_of_birth: date | None
+    is_banned_alcohol: bool
+    is_banned_counter: bool
+
+    @staticmethod
+    def cache_key(user_id: int) -> str:
+        return f"customer_summary_{user_id}"
+
+    @staticmethod
+    def code_key(code: str) -> str:
+        return f"customer_code_{code.upper()}"
+
+    @classmethod
+    def of(cls, user_id: int) -> CustomerSummary | None:
+        """Return the summary of the customer of the given user, if any."""
+        summary = cache.get(cls.cache_key(user_id))
+        if summary is None:
+            summary = cls._fetch(Customer.objects.filter(user_id=user_id))
+        return summary
+
+    @classmethod
+    def lookup(cls, code: str) -> CustomerSummary | None:
+        """Return the summary of the customer with the given code.
+
+        The code is either the uid of a student card of the customer
+        or its account id, the student cards having precedence.
+        """
+        user_id = cache.get(cls.code_key(code))
+        if user_id is not None:
+            return cls.of(user_id)
+        customers = Customer.objects.filter(account_id__iexact=code)
+        if len(code) == StudentCard.UID_SIZE:
+            card = StudentCard.objects.filter(uid=code, customer=OuterRef("pk"))
+            customers = (
+                Customer.objects.annotate(has_card=Exists(card))
+                .filter(Q(has_card=True) | Q(account_id__iexact=code))
+                .order_by("-has_card")
+            )
+        summary = cls._fetch(customers)
+        if summary is not None:
+            cache.set(cls.code_key(code), summary.user_id)
+        return summary
+
+    @classmethod
+    def invalidate(cls, user_ids: Iterable[int]) -> None:
+        cache.delete_many([cls.cache_key(user_id) for user_id in user_ids])
+
+    @classmethod
+    def invalidate_codes(cls, codes: Iterable[str]) -> None:
+        cache.delete_many([cls.code_key(code) for code in codes])
+
+    @classmethod
+    def _fetch(cls, customers: CustomerQuerySet) -> CustomerSummary | None:
+        """Build the summary of the first of the customers with a single query."""
+        subscriptions = Subscription.objects.filter(member=OuterRef("user_id"))
+        groups = User.groups.through.objects.filter(user=OuterRef("user_id"))
+        row = (
+            customers.annotate(
+                subscription_end=Subquery(
+                    subscriptions.order_by("-subscription_end").values(
+                        "subscription_end"
+                    )[:1]
+                ),
+                is_banned_alcohol=Exists(
+                    groups.filter(realgroup=settings.SITH_GROUP_BANNED_ALCOHOL_ID)
+                ),
+                is_banned_counter=Exists(
+                    groups.filter(realgroup=settings.SITH_GROUP_BANNED_COUNTER_ID)
+                ),
+            )
+            .values_list(
+                "user_id",
+                "account_id",
+                "amount",
+                "recorded_products",
+                "subscription_end",
+                "user__date_of_birth",
+                "is_banned_alcohol",
+                "is_banned_counter",
+            )
+            .first()
+        )
+        if row is None:
+            return None
+        summary = cls(*row)
+        cache.set(cls.cache_key(summary.user_id), summary)
+        return summary
+
+    @property
+    def can_buy(self) -> bool:
+        """Same as [Customer.can_buy][counter.models.Customer.can_buy]."""
+        if self.subscription_end is None:
+            return False
+        return (date.today() - self.subscription_end) < timedelta(days=90)
+
+    @property
+    def age(self) -> int:
+        """The age of the customer, or 0 if it is unknown."""
+        if self.date_of_birth is None:
+            return 0
+        today = timezone.localdate()
+        born = self.date_of_birth
+        return (
+            today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+        )
+
+
 class BillingInfo(models.Model):
     """Represent the billing information of a user, which are required
     by the 3D-Secure v2 system used by the etransaction module.
@@ -383,6 +661,74 @@ class CounterQuerySet(models.QuerySet):
         subquery = user.counters.filter(pk=OuterRef("pk"))
         return self.annotate(has_annotated_barman=Exists(subquery))
 
+    def annotate_cash_sums(
+        self, begin: datetime | None = None, end: datetime | None = None
+    ) -> CounterQuerySet:
+        """Annotate the counters with the sums of their refillings
+        and cash register summaries between the given dates.
+
+        The `refilling_sum` field is the money refilled in the counter,
+        and the `summaries_sum` field is the money counted in its cash register.
+        If no begin date is given, the sums start after the last time
+        the cash register of each counter was emptied.
+
+        All the sums are computed in a single query,
+        whatever the number of counters.
+
+        Args:
+            begin: the date from which the sums start (included)
+            end: the date at which the sums stop (included)
+
+        Examples:
+            ```python
+            for counter in Counter.objects.filter(type="BAR").annotate_cash_sums():
+                if counter.refilling_sum != counter.summaries_sum:
+                    print(f"{counter.name} : {counter.refilling_sum} € refilled, "
+                          f"but {counter.summaries_sum} € in the cash register")
+            ```
+        """
+        queryset = self
+        if begin is not None:
+            refilling_dates = Q(date__gte=begin)
+            summary_dates = Q(cash_summary__date__gte=begin)
+        else:
+            last_emptied = CashRegisterSummary.objects.filter(
+                counter=OuterRef("pk"), emptied=True
+            ).order_by("-date")
+            # a counter which has never been emptied has its sums start
+            # at the beginning of time
+            queryset = queryset.annotate(
+                last_emptied=Coalesce(
+                    Subquery(last_emptied.values("date")[:1]),
+                    Value(datetime(1994, 5, 17, tzinfo=tz.utc)),
+                )
+            )
+            refilling_dates = Q(date__gt=OuterRef("last_emptied"))
+            summary_dates = Q(cash_summary__date__gt=OuterRef("last_emptied"))
+        if end is not None:
+            refilling_dates &= Q(date__lte=end)
+            summary_dates &= Q(cash_summary__date__lte=end)
+        refillings = Refilling.objects.filter(refilling_dates, counter=OuterRef("pk"))
+        summaries = CashRegisterSummaryItem.objects.filter(
+            summary_dates, cash_summary__counter=OuterRef("pk")
+        )
+        return queryset.annotate(
+            refilling_sum=_subquery_sum(refillings, "counter", F("amount")),
+            summaries_sum=_subquery_sum(
+                summaries, "cash_summary__counter", F("quantity") * F("value")
+            ),
+        )
+
+
+def _subquery_sum(queryset: QuerySet, group_by: str, amount: F) -> Coalesce:
+    """Return a subquery summing the given amount over the queryset, or 0."""
+    total = queryset.values(group_by).annotate(res=Sum(amount)).values("res")
+    return Coalesce(
+        Subquery(total, output_field=CurrencyField()),
+        Decimal(0),
+        output_field=CurrencyField(),
+    )
+
 
 class Counter(models.Model):
     name = models.CharField(_("name"), max_length=30)
@@ -410,6 +756,9 @@ class Counter(models.Model):
 
     objects = CounterQuerySet.as_manager()
 
+    # the edit groups are computed from the club, not read from the field
+    resolver_prefetch = False
+
     class Meta:
         verbose_name = _("counter")
 
@@ -448,6 +797,10 @@ class Counter(models.Model):
         )
         self.save()
 
+    @cached_property
+    def presence(self) -> BarmenPresence:
+        return BarmenPresence(self)
+
     @cached_property
     def barmen_list(self) -> list[User]:
         return self.get_barmen_list()
@@ -457,13 +810,7 @@ class Counter(models.Model):
 
         Also handle the timeout of the barmen
         """
-        perms = self.permanencies.filter(end=None)
-
-        # disconnect barmen who are inactive
-        timeout = timezone.now() - timedelta(minutes=settings.SITH_BARMAN_TIMEOUT)
-        perms.filter(activity__lte=timeout).update(end=F("activity"))
-
-        return [p.user for p in perms.select_related("user")]
+        return self.presence.barmen
 
     def get_random_barman(self) -> User:
         """Return a random user being currently a barman."""
@@ -471,7 +818,7 @@ class Counter(models.Model):
 
     def update_activity(self) -> None:
         """Update the barman activity to prevent timeout."""
-        self.permanencies.filter(end=None).update(activity=timezone.now())
+        self.presence.touch()
 
     @property
     def is_open(self) -> bool:
@@ -480,7 +827,7 @@ class Counter(models.Model):
     def is_inactive(self) -> bool:
         """Returns True if the counter self is inactive from SITH_COUNTER_MINUTE_INACTIVE's value minutes, else False."""
         return self.is_open and (
-            (timezone.now() - self.permanencies.order_by("-activity").first().activity)
+            (timezone.now() - self.presence.activity)
             > timedelta(minutes=settings.SITH_COUNTER_MINUTE_INACTIVE)
         )
 
@@ -496,8 +843,7 @@ class Counter(models.Model):
             # If the counter is either 'AE' or 'BdF', refills are authorized
             return True
         # at least one of the barmen is in the AE board
-        ae = Club.objects.get(unix_name=SITH_MAIN_CLUB["unix_name"])
-        return any(ae.get_membership_for(barman) for barman in self.barmen_list)
+        return self.presence.can_refill
 
     def get_top_barmen(self) -> QuerySet:
         """Return a QuerySet querying the office hours stats of all the barmen of all time
@@ -532,15 +878,15 @@ class Counter(models.Model):
         - the nickname of the customer
         - the amount of money spent by the customer
 
+        The amounts are computed from the daily
+        [SellingRollup][counter.models.SellingRollup],
+        so `since` is rounded down to the start of its day.
+
         Args:
             since: timestamp from which to perform the calculation
         """
-        if since is None:
-            since = get_start_of_semester()
-        if isinstance(since, date):
-            since = datetime(since.year, since.month, since.day, tzinfo=tz.utc)
         return (
-            self.sellings.filter(date__gte=since)
+            SellingRollup.objects.filter(counter=self, day__gte=_rollup_day(since))
             .annotate(
                 name=Concat(
                     F("customer__user__first_name"),
@@ -552,11 +898,7 @@ class Counter(models.Model):
             .annotate(promo=F("customer__user__promo"))
             .annotate(user=F("customer__user"))
             .values("user", "promo", "name", "nickname")
-            .annotate(
-                selling_sum=Sum(
-                    F("unit_price") * F("quantity"), output_field=CurrencyField()
-                )
-            )
+            .annotate(selling_sum=Sum("total", output_field=CurrencyField()))
             .filter(selling_sum__gt=0)
             .order_by("-selling_sum")
         )
@@ -565,6 +907,7 @@ class Counter(models.Model):
         """Compute and return the total turnover of this counter since the given date.
 
         By default, the date is the start of the current semester.
+        As for `get_top_customers`, `since` is rounded down to the start of its day.
 
         Args:
             since: timestamp from which to perform the calculation
@@ -572,17 +915,22 @@ class Counter(models.Model):
         Returns:
             Total revenue earned at this counter.
         """
-        if since is None:
-            since = get_start_of_semester()
-        if isinstance(since, date):
-            since = datetime(since.year, since.month, since.day, tzinfo=tz.utc)
-        return self.sellings.filter(date__gte=since).aggregate(
-            total=Sum(
-                F("quantity") * F("unit_price"),
-                default=0,
-                output_field=CurrencyField(),
-            )
-        )["total"]
+        return SellingRollup.objects.filter(
+            counter=self, day__gte=_rollup_day(since)
+        ).aggregate(total=Sum("total", default=0, output_field=CurrencyField()))[
+            "total"
+        ]
+
+
+def _rollup_day(since: datetime | date | None) -> date:
+    """Return the day of the rollups from which statistics starting at `since`
+    must be computed.
+    """
+    if since is None:
+        return get_start_of_semester()
+    if isinstance(since, datetime):
+        return timezone.localdate(since) if timezone.is_aware(since) else since.date()
+    return since
 
 
 class Refilling(models.Model):
@@ -627,8 +975,7 @@ class Refilling(models.Model):
             self.date = timezone.now()
         self.full_clean()
         if not self.is_validated:
-            self.customer.amount += self.amount
-            self.customer.save()
+            self.customer.credit(self.amount, "Refilling")
             self.is_validated = True
         if self.customer.user.preferences.notify_on_refill:
             Notification(
@@ -652,8 +999,7 @@ class Refilling(models.Model):
         return user.is_owner(self.counter) and self.payment_method != "CARD"
 
     def delete(self, *args, **kwargs):
-        self.customer.amount -= self.amount
-        self.customer.save()
+        self.customer.debit(self.amount, "Refilling deletion", allow_negative=True)
         super().delete(*args, **kwargs)
 
 
@@ -720,57 +1066,15 @@ class Selling(models.Model):
             self.date = timezone.now()
         self.full_clean()
         if not self.is_validated:
-            self.customer.amount -= self.quantity * self.unit_price
-            self.customer.save(allow_negative=allow_negative, is_selling=True)
+            self.customer.debit(
+                self.quantity * self.unit_price,
+                "Selling",
+                allow_negative=allow_negative,
+            )
             self.is_validated = True
         user = self.customer.user
         if user.was_subscribed:
-            if (
-                self.product
-                and self.product.id == settings.SITH_PRODUCT_SUBSCRIPTION_ONE_SEMESTER
-            ):
-                sub = Subscription(
-                    member=user,
-                    subscription_type="un-semestre",
-                    payment_method="EBOUTIC",
-                    location="EBOUTIC",
-                )
-                sub.subscription_start = Subscription.compute_start()
-                sub.subscription_start = Subscription.compute_start(
-                    duration=settings.SITH_SUBSCRIPTIONS[sub.subscription_type][
-                        "duration"
-                    ]
-                )
-                sub.subscription_end = Subscription.compute_end(
-                    duration=settings.SITH_SUBSCRIPTIONS[sub.subscription_type][
-                        "duration"
-                    ],
-                    start=sub.subscription_start,
-                )
-                sub.save()
-            elif (
-                self.product
-                and self.product.id == settings.SITH_PRODUCT_SUBSCRIPTION_TWO_SEMESTERS
-            ):
-                sub = Subscription(
-                    member=user,
-                    subscription_type="deux-semestres",
-                    payment_method="EBOUTIC",
-                    location="EBOUTIC",
-                )
-                sub.subscription_start = Subscription.compute_start()
-                sub.subscription_start = Subscription.compute_start(
-                    duration=settings.SITH_SUBSCRIPTIONS[sub.subscription_type][
-                        "duration"
-                    ]
-                )
-                sub.subscription_end = Subscription.compute_end(
-                    duration=settings.SITH_SUBSCRIPTIONS[sub.subscription_type][
-                        "duration"
-                    ],
-                    start=sub.subscription_start,
-                )
-                sub.save()
+            self.subscribe_customer()
         if user.preferences.notify_on_click:
             Notification(
                 user=user,
@@ -787,7 +1091,29 @@ class Selling(models.Model):
             ).save()
         super().save(*args, **kwargs)
         if hasattr(self.product, "eticket"):
-            self.send_mail_customer()
+            # the eticket itself is drawn in the background (see `counter.signals`)
+            transaction.on_commit(self.send_mail_customer)
+
+    def subscribe_customer(self):
+        """Give a new subscription to the customer, if this selling is one."""
+        subscription_types = {
+            settings.SITH_PRODUCT_SUBSCRIPTION_ONE_SEMESTER: "un-semestre",
+            settings.SITH_PRODUCT_SUBSCRIPTION_TWO_SEMESTERS: "deux-semestres",
+        }
+        if self.product_id not in subscription_types:
+            return
+        sub = Subscription(
+            member=self.customer.user,
+            subscription_type=subscription_types[self.product_id],
+            payment_method="EBOUTIC",
+            location="EBOUTIC",
+        )
+        duration = settings.SITH_SUBSCRIPTIONS[sub.subscription_type]["duration"]
+        sub.subscription_start = Subscription.compute_start(duration=duration)
+        sub.subscription_end = Subscription.compute_end(
+            duration=duration, start=sub.subscription_start
+        )
+        sub.save()
 
     def is_owned_by(self, user: User) -> bool:
         if user.is_anonymous:
@@ -803,8 +1129,7 @@ class Selling(models.Model):
 
     def delete(self, *args, **kwargs):
         if self.payment_method == "SITH_ACCOUNT":
-            self.customer.amount += self.quantity * self.unit_price
-            self.customer.save()
+            self.customer.credit(self.quantity * self.unit_price, "Selling deletion")
         super().delete(*args, **kwargs)
 
     def send_mail_customer(self):
@@ -849,6 +1174,30 @@ class Selling(models.Model):
         return "".join(["https://", settings.SITH_URL, eticket_url])
 
 
+class BalanceMovement(models.Model):
+    """A change of the amount of a customer account.
+
+    Movements are only ever added, never modified nor deleted,
+    so that the amount of an account is always the sum of its movements.
+    """
+
+    customer = models.ForeignKey(
+        Customer,
+        related_name="balance_movements",
+        verbose_name=_("customer"),
+        on_delete=models.CASCADE,
+    )
+    amount = CurrencyField(_("amount"))
+    label = models.CharField(_("label"), max_length=64)
+    date = models.DateTimeField(_("date"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("balance movement")
+
+    def __str__(self):
+        return f"{self.label}: {self.amount:.2f} for {self.customer_id}"
+
+
 class Permanency(models.Model):
     """A permanency of a barman, on a counter.
 
@@ -891,6 +1240,113 @@ class Permanency(models.Model):
         return self.end - self.start
 
 
+class BarmenPresence:
+    """The barmen currently working in a counter.
+
+    The barmen of a counter are needed by almost every request made
+    in this counter, so they are kept in the cache,
+    along with the right to refill accounts with physic money,
+    which is computed once when the barmen change.
+
+    The last activity of the counter is also kept in the cache,
+    and written in the database only once per `FLUSH_INTERVAL`
+    for all the permanencies of the counter.
+    When the counter has been inactive for more than
+    `settings.SITH_BARMAN_TIMEOUT` minutes, all its permanencies are closed.
+
+    The cached barmen are dropped each time a permanency is saved
+    or deleted (see `counter.signals`) and when the barmen log out.
+    """
+
+    FLUSH_INTERVAL = timedelta(minutes=1)
+
+    def __init__(self, counter: Counter):
+        self.counter = counter
+        self.barmen_key = f"counter_barmen_{counter.id}"
+        self.activity_key = f"counter_activity_{counter.id}"
+        cached = cache.get_many([self.barmen_key, self.activity_key])
+        self.activity, self.flushed = cached.get(self.activity_key, (None, None))
+        self.barmen, self.can_refill = cached.get(self.barmen_key, (None, False))
+        if self.barmen is None or (self.barmen and self.activity is None):
+            self._load()
+        inactivity = timedelta(minutes=settings.SITH_BARMAN_TIMEOUT)
+        if self.barmen and timezone.now() - self.activity > inactivity:
+            self._close_all()
+
+    @classmethod
+    def invalidate(cls, counter_id: int) -> None:
+        """Drop the cached barmen of the counter."""
+        cache.delete(f"counter_barmen_{counter_id}")
+
+    @property
+    def cache_timeout(self) -> int:
+        return settings.SITH_BARMAN_TIMEOUT * 60
+
+    def _load(self) -> None:
+        perms = list(
+            self.counter.permanencies.filter(end=None)
+            .select_related("user")
+            .order_by("id")
+        )
+        self.barmen = [p.user for p in perms]
+        ae = Club.objects.filter(unix_name=SITH_MAIN_CLUB["unix_name"])
+        self.can_refill = bool(perms) and (
+            Membership.objects.filter(
+                club__in=ae, user__in=self.barmen, end_date=None
+            ).exists()
+        )
+        if not perms:
+            self.activity, self.flushed = None, None
+        else:
+            # the cached activity may be more recent than the flushed one
+            flushed = max(p.activity for p in perms)
+            self.activity = max(flushed, self.activity or flushed)
+            self.flushed = self.flushed or flushed
+        cache.set_many(
+            {
+                self.barmen_key: (self.barmen, self.can_refill),
+                self.activity_key: (self.activity, self.flushed),
+            },
+            timeout=self.cache_timeout,
+        )
+
+    def _close_all(self) -> None:
+        """End all the permanencies of the counter, at its last activity."""
+        self.counter.permanencies.filter(end=None).update(
+            end=self.activity, activity=self.activity
+        )
+        self.barmen, self.can_refill = [], False
+        cache.set(self.barmen_key, (self.barmen, self.can_refill), self.cache_timeout)
+
+    def touch(self) -> None:
+        """Mark the counter as active now, to prevent the barmen timeout."""
+        now = timezone.now()
+        self.activity = now
+        if self.flushed is None or now - self.flushed >= self.FLUSH_INTERVAL:
+            self.counter.permanencies.filter(end=None).update(activity=now)
+            self.flushed = now
+        cache.set(self.activity_key, (self.activity, self.flushed), self.cache_timeout)
+
+    def logout(self, user_id: int) -> None:
+        """End the permanency of the user in this counter."""
+        self.counter.permanencies.filter(user_id=user_id, end=None).update(
+            end=self.activity or timezone.now()
+        )
+        self.invalidate(self.counter.id)
+
+
+class CashRegisterSummaryQuerySet(models.QuerySet):
+    def annotate_total(self) -> CashRegisterSummaryQuerySet:
+        """Annotate the summaries with the `total` of their items."""
+        return self.annotate(
+            total=_subquery_sum(
+                CashRegisterSummaryItem.objects.filter(cash_summary=OuterRef("pk")),
+                "cash_summary",
+                F("quantity") * F("value"),
+            )
+        )
+
+
 class CashRegisterSummary(models.Model):
     user = models.ForeignKey(
         User,
@@ -908,6 +1364,8 @@ class CashRegisterSummary(models.Model):
     comment = models.TextField(_("comment"), null=True, blank=True)
     emptied = models.BooleanField(_("emptied"), default=False)
 
+    objects = CashRegisterSummaryQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("cash register summary")
 
@@ -967,10 +1425,11 @@ class CashRegisterSummary(models.Model):
         return False
 
     def get_total(self):
-        t = 0
-        for it in self.items.all():
-            t += it.quantity * it.value
-        return t
+        if "total" in self.__dict__:  # annotated by the queryset
+            return self.total
+        return self.items.aggregate(total=Sum(F("quantity") * F("value"), default=0))[
+            "total"
+        ]
 
 
 class CashRegisterSummaryItem(models.Model):
@@ -1080,3 +1539,159 @@ class StudentCard(models.Model):
         if isinstance(obj, User):
             return StudentCard.can_create(self.customer, obj)
         return False
+
+
+class SellingRollup(models.Model):
+    """The sum of the sellings of a day, by counter, club, product,
+    customer and payment method.
+
+    Statistics computed on these rollups don't get slower
+    as the sellings pile up.
+    The rollups are kept up to date when sellings are created, edited or deleted
+    (see `counter.signals`) and can be rebuilt from scratch
+    with the `rebuild_sales_rollups` command.
+
+    Many rows may exist for the same day and keys,
+    so the rollups must always be summed.
+    """
+
+    KEYS = ("counter_id", "club_id", "product_id", "customer_id", "payment_method")
+
+    day = models.DateField(_("day"), db_index=True)
+    counter = models.ForeignKey(
+        Counter, related_name="+", null=True, on_delete=models.SET_NULL
+    )
+    club = models.ForeignKey(
+        Club, related_name="+", null=True, on_delete=models.SET_NULL
+    )
+    product = models.ForeignKey(
+        Product, related_name="+", null=True, on_delete=models.SET_NULL
+    )
+    customer = models.ForeignKey(
+        Customer, related_name="+", null=True, on_delete=models.SET_NULL
+    )
+    payment_method = models.CharField(_("payment method"), max_length=255)
+    quantity = models.IntegerField(_("quantity"), default=0)
+    total = CurrencyField(_("total"), default=0)
+
+    class Meta:
+        verbose_name = _("selling rollup")
+
+    def __str__(self):
+        return f"{self.day} - {self.product_id} x {self.quantity} ({self.total})"
+
+    @classmethod
+    def add(cls, sellings: Iterable[Selling], *, sign: int = 1) -> None:
+        """Add the given sellings to the rollups (or remove them if sign is -1)."""
+        totals = {}
+        for s in sellings:
+            key = (timezone.localdate(s.date), *(getattr(s, k) for k in cls.KEYS))
+            quantity, total = totals.get(key, (0, 0))
+            totals[key] = (quantity + s.quantity, total + s.quantity * s.unit_price)
+        for (day, *keys), (quantity, total) in totals.items():
+            _increment_rollup(
+                cls,
+                {"day": day, **dict(zip(cls.KEYS, keys))},
+                quantity=sign * quantity,
+                total=sign * total,
+            )
+
+    @classmethod
+    def rebuild(cls) -> None:
+        """Compute again all the rollups from the sellings."""
+        rollups = (
+            Selling.objects.annotate(day=TruncDate("date"))
+            .values("day", *cls.KEYS)
+            .annotate(
+                sum_quantity=Sum("quantity"),
+                sum_total=Sum(F("quantity") * F("unit_price")),
+            )
+            .order_by()
+        )
+        cls.objects.all().delete()
+        cls.objects.bulk_create(
+            (
+                cls(
+                    day=r["day"],
+                    quantity=r["sum_quantity"],
+                    total=r["sum_total"],
+                    **{k: r[k] for k in cls.KEYS},
+                )
+                for r in rollups.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class RefillingRollup(models.Model):
+    """The sum of the refillings of a day, by counter, customer and payment method.
+
+    As for the [SellingRollup][counter.models.SellingRollup],
+    many rows may exist for the same day and keys.
+    """
+
+    KEYS = ("counter_id", "customer_id", "payment_method")
+
+    day = models.DateField(_("day"), db_index=True)
+    counter = models.ForeignKey(
+        Counter, related_name="+", null=True, on_delete=models.SET_NULL
+    )
+    customer = models.ForeignKey(
+        Customer, related_name="+", null=True, on_delete=models.SET_NULL
+    )
+    payment_method = models.CharField(_("payment method"), max_length=255)
+    total = CurrencyField(_("total"), default=0)
+
+    class Meta:
+        verbose_name = _("refilling rollup")
+
+    def __str__(self):
+        return f"{self.day} - {self.payment_method} ({self.total})"
+
+    @classmethod
+    def add(cls, refillings: Iterable[Refilling], *, sign: int = 1) -> None:
+        """Add the given refillings to the rollups (or remove them if sign is -1)."""
+        totals = {}
+        for r in refillings:
+            key = (timezone.localdate(r.date), *(getattr(r, k) for k in cls.KEYS))
+            totals[key] = totals.get(key, 0) + r.amount
+        for (day, *keys), total in totals.items():
+            _increment_rollup(
+                cls, {"day": day, **dict(zip(cls.KEYS, keys))}, total=sign * total
+            )
+
+    @classmethod
+    def rebuild(cls) -> None:
+        """Compute again all the rollups from the refillings."""
+        rollups = (
+            Refilling.objects.annotate(day=TruncDate("date"))
+            .values("day", *cls.KEYS)
+            .annotate(sum_total=Sum("amount"))
+            .order_by()
+        )
+        cls.objects.all().delete()
+        cls.objects.bulk_create(
+            (
+                cls(day=r["day"], total=r["sum_total"], **{k: r[k] for k in cls.KEYS})
+                for r in rollups.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+def _increment_rollup(model: type[models.Model], keys: dict, **increments) -> None:
+    """Atomically add the increments to a rollup row with the given keys,
+    creating it if it doesn't exist yet.
+
+    If another process creates the same row concurrently, there will be two rows,
+    which is fine as rollups are always summed.
+    But then, only one of them must be incremented,
+    else the increment would be counted twice.
+    """
+    pk = model.objects.filter(**keys).values_list("pk", flat=True).first()
+    if pk is None:
+        model.objects.create(**keys, **increments)
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: F(field) + value for field, value in increments.items()}
+    )
@@ -1,4 +1,8 @@
-from ninja import ModelSchema
+from datetime import datetime
+from typing import Literal
+
+from ninja import ModelSchema, Schema
+from pydantic import PositiveInt
 
 from core.schemas import SimpleUserSchema
 from counter.models import Counter
@@ -11,3 +15,40 @@ class CounterSchema(ModelSchema):
     class Meta:
         model = Counter
         fields = ["id", "name", "type", "club", "products"]
+
+
+class BasketItemSchema(Schema):
+    id: int
+    quantity: PositiveInt = 1
+
+
+class BasketLineSchema(Schema):
+    id: int
+    quantity: int
+    bonus_quantity: int
+    unit_price: float
+
+
+class BasketErrorSchema(Schema):
+    id: int
+    error: Literal[
+        "unknown_product", "not_allowed", "not_enough", "no_age", "too_young"
+    ]
+
+
+class BasketSchema(Schema):
+    items: list[BasketLineSchema]
+    total: float
+    errors: list[BasketErrorSchema]
+
+
+class CashSumsFilterSchema(Schema):
+    begin_date: datetime | None = None
+    end_date: datetime | None = None
+
+
+class CounterCashSumsSchema(Schema):
+    id: int
+    name: str
+    refilling_sum: float
+    summaries_sum: float
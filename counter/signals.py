@@ -21,12 +21,33 @@
 #
 #
 
-from django.db.models.signals import pre_delete
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 
 from core.middleware import get_signal_request
-from core.models import OperationLog
-from counter.models import Counter, Refilling, Selling
+from core.models import OperationLog, User
+from counter.basket import Catalogue
+from counter.etickets import render_in_background
+from counter.models import (
+    BarmenPresence,
+    Counter,
+    Customer,
+    CustomerSummary,
+    Permanency,
+    Product,
+    Refilling,
+    RefillingRollup,
+    Selling,
+    SellingRollup,
+    StudentCard,
+)
+from subscription.models import Subscription
 
 
 def write_log(instance, operation_type):
@@ -66,3 +87,99 @@ def write_log_refilling_deletion(sender, instance, **kwargs):
 @receiver(pre_delete, sender=Selling, dispatch_uid="write_log_refilling_deletion")
 def write_log_selling_deletion(sender, instance, **kwargs):
     write_log(instance, "SELLING_DELETION")
+
+
+@receiver(post_save, sender=Product, dispatch_uid="product_saved")
+@receiver(post_delete, sender=Product, dispatch_uid="product_deleted")
+@receiver(m2m_changed, sender=Counter.products.through, dispatch_uid="counter_products")
+@receiver(
+    m2m_changed, sender=Product.buying_groups.through, dispatch_uid="buying_groups"
+)
+def product_changed(sender, **kwargs):
+    """Reload the catalogues of the counters when their products change."""
+    Catalogue.invalidate()
+
+
+@receiver(pre_save, sender=Selling, dispatch_uid="selling_rollup_edited")
+@receiver(pre_save, sender=Refilling, dispatch_uid="refilling_rollup_edited")
+def keep_rolled_up(sender, instance, **kwargs):
+    """Keep the stored version of an edited selling or refilling,
+    to remove it from the sales rollups once the new version is saved.
+    """
+    if not instance._state.adding:
+        instance._rolled_up = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Selling, dispatch_uid="selling_rollup_saved")
+@receiver(post_save, sender=Refilling, dispatch_uid="refilling_rollup_saved")
+def add_to_rollup(sender, instance, created, **kwargs):
+    """Add the new and edited sellings and refillings to the sales rollups.
+
+    Sellings created with `bulk_create` don't send this signal,
+    so they must be added to the rollups by the code creating them.
+    """
+    rollup = SellingRollup if sender is Selling else RefillingRollup
+    previous = None if created else instance.__dict__.pop("_rolled_up", None)
+    if previous is not None:
+        rollup.add([previous], sign=-1)
+    rollup.add([instance])
+
+
+@receiver(post_delete, sender=Selling, dispatch_uid="selling_rollup_deleted")
+@receiver(post_delete, sender=Refilling, dispatch_uid="refilling_rollup_deleted")
+def remove_from_rollup(sender, instance, **kwargs):
+    """Remove the deleted sellings and refillings from the sales rollups."""
+    rollup = SellingRollup if sender is Selling else RefillingRollup
+    rollup.add([instance], sign=-1)
+
+
+@receiver(post_save, sender=Permanency, dispatch_uid="permanency_saved")
+@receiver(post_delete, sender=Permanency, dispatch_uid="permanency_deleted")
+def permanency_changed(sender, instance, **kwargs):
+    """Reload the barmen of the counter when its permanencies change."""
+    BarmenPresence.invalidate(instance.counter_id)
+
+
+@receiver(post_save, sender=Customer, dispatch_uid="customer_summary_saved")
+@receiver(post_delete, sender=Customer, dispatch_uid="customer_summary_deleted")
+def customer_changed(sender, instance: Customer, **kwargs):
+    """Drop the cached summary of the customer."""
+    CustomerSummary.invalidate([instance.user_id])
+    CustomerSummary.invalidate_codes([instance.account_id])
+
+
+@receiver(post_save, sender=User, dispatch_uid="customer_summary_user")
+@receiver(post_save, sender=Subscription, dispatch_uid="customer_summary_sub")
+@receiver(post_delete, sender=Subscription, dispatch_uid="customer_summary_unsub")
+def customer_user_changed(sender, instance: User | Subscription, **kwargs):
+    """Drop the cached summary of the customer of the user."""
+    user_id = instance.member_id if sender is Subscription else instance.id
+    CustomerSummary.invalidate([user_id])
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid="customer_summary_ban")
+def customer_groups_changed(sender, instance, reverse, pk_set, **kwargs):
+    """Drop the cached summary of the customers whose bans may have changed."""
+    if reverse:
+        # when the users are added from the group side, the instance is the group
+        CustomerSummary.invalidate(
+            pk_set
+            if pk_set is not None
+            else instance.users.values_list("id", flat=True)
+        )
+    else:
+        CustomerSummary.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=StudentCard, dispatch_uid="customer_summary_card")
+@receiver(post_delete, sender=StudentCard, dispatch_uid="customer_summary_uncard")
+def student_card_changed(sender, instance: StudentCard, **kwargs):
+    """Forget the customer the uid of the student card led to."""
+    CustomerSummary.invalidate_codes([instance.uid])
+
+
+@receiver(post_save, sender=Selling, dispatch_uid="render_eticket")
+def render_eticket(sender, instance: Selling, created, **kwargs):
+    """Draw the eticket of the new selling, once the transaction is committed."""
+    if created and hasattr(instance.product, "eticket"):
+        render_in_background([instance.id])
@@ -0,0 +1,161 @@
+"""Statistics of the account of a customer.
+
+The account and stats pages of a user used to load all the buyings,
+refillings, invoices and permanencies of the user,
+then sum them in Python, with one query per month or per counter.
+[CustomerStats.of][counter.stats.CustomerStats.of] computes all these
+totals with a few `GROUP BY` queries, and keeps the result in the cache
+until the customer makes a new operation.
+
+Example:
+    ```python
+    stats = CustomerStats.of(customer)
+    for year in stats.buyings_by_month:
+        for month in year:
+            print(month.date, month.sum)
+    print(stats.buyings_by_counter.get("Foyer", 0))
+    ```
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db.models import F, QuerySet, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from core.utils import get_start_of_semester
+from counter.models import BalanceMovement, Customer, Permanency, Selling
+from eboutic.models import Invoice, InvoiceItem
+
+
+class MonthlyTotal(NamedTuple):
+    date: datetime
+    sum: Decimal
+
+
+class CustomerStats(NamedTuple):
+    """The totals of the operations of a customer.
+
+    The monthly totals are grouped by year,
+    the most recent years and months first.
+    """
+
+    buyings_by_month: list[list[MonthlyTotal]]
+    refillings_by_month: list[list[MonthlyTotal]]
+    invoices_by_month: list[list[MonthlyTotal]]
+    buyings_by_counter: dict[str, Decimal]
+    """The money spent in each counter since the requested date."""
+    perm_time_by_counter: dict[str, timedelta]
+    top_products: list[dict]
+    """The ten products the most bought, with their name and quantity."""
+
+    CACHE_TIMEOUT = 10 * 60
+
+    @property
+    def total_perm_time(self) -> timedelta:
+        return sum(self.perm_time_by_counter.values(), timedelta())
+
+    @classmethod
+    def of(cls, customer: Customer, *, since: date | None = None) -> CustomerStats:
+        """Return the stats of the customer, from the cache if possible.
+
+        The stats are cached with a key containing the last operation
+        of the customer, so a new operation makes them computed again.
+
+        Args:
+            customer: the customer whose stats are computed
+            since: the date from which the money spent in each counter is summed.
+                If None, the start of the current semester.
+        """
+        if since is None:
+            since = get_start_of_semester()
+        key = f"customer_stats_{customer.pk}_{since}_{cls._last_operation(customer)}"
+        stats = cache.get(key)
+        if stats is None:
+            stats = cls._compute(customer, since)
+            cache.set(key, stats, timeout=cls.CACHE_TIMEOUT)
+        return stats
+
+    @staticmethod
+    def _last_operation(customer: Customer) -> str:
+        """Return a value which changes whenever the customer makes an operation."""
+
+        def last(queryset: QuerySet, field: str = "id"):
+            return Subquery(queryset.order_by(f"-{field}").values(field)[:1])
+
+        user_id = customer.user_id
+        ops = (
+            Customer.objects.filter(pk=customer.pk)
+            .values(
+                movement=last(BalanceMovement.objects.filter(customer=customer)),
+                selling=last(Selling.objects.filter(customer=customer)),
+                invoice=last(Invoice.objects.filter(user_id=user_id), "date"),
+                perm=last(
+                    Permanency.objects.filter(user_id=user_id).annotate(
+                        last_activity=Coalesce("end", "start")
+                    ),
+                    "last_activity",
+                ),
+            )
+            .first()
+        )
+        return "_".join(str(v) for v in (ops or {}).values()).replace(" ", "_")
+
+    @classmethod
+    def _compute(cls, customer: Customer, since: date) -> CustomerStats:
+        buyings = customer.buyings.all()
+        perm_time = (
+            Permanency.objects.filter(user_id=customer.user_id)
+            .exclude(end=None)
+            .values("counter__name")
+            .annotate(time=Sum(F("end") - F("start")))
+            .values_list("counter__name", "time")
+        )
+        spent = (
+            buyings.filter(date__gte=since)
+            .values("counter__name")
+            .annotate(total=Sum(F("unit_price") * F("quantity")))
+            .values_list("counter__name", "total")
+        )
+        return cls(
+            buyings_by_month=cls._by_month(
+                buyings, "date", F("unit_price") * F("quantity")
+            ),
+            refillings_by_month=cls._by_month(
+                customer.refillings.all(), "date", F("amount")
+            ),
+            invoices_by_month=cls._by_month(
+                InvoiceItem.objects.filter(invoice__user_id=customer.user_id),
+                "invoice__date",
+                F("quantity") * F("product_unit_price"),
+            ),
+            buyings_by_counter=dict(spent),
+            perm_time_by_counter=dict(perm_time),
+            top_products=list(
+                buyings.values("product__name")
+                .annotate(product_sum=Sum("quantity"))
+                .exclude(product_sum=None)
+                .order_by("-product_sum")[:10]
+            ),
+        )
+
+    @staticmethod
+    def _by_month(
+        queryset: QuerySet, date_field: str, amount: F
+    ) -> list[list[MonthlyTotal]]:
+        months = (
+            queryset.annotate(month=TruncMonth(date_field))
+            .values("month")
+            .annotate(total=Sum(amount))
+            .order_by("-month")
+            .values_list("month", "total")
+        )
+        return [
+            [MonthlyTotal(date=month, sum=total) for month, total in year]
+            for _, year in groupby(months, key=lambda m: m[0].year)
+        ]
@@ -15,20 +15,50 @@
 import json
 import re
 import string
+from decimal import Decimal
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from unittest import mock
 
 import pytest
+from django.conf import settings
+from django.core import mail
 from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.timezone import timedelta
 from model_bakery import baker
+from model_bakery.recipe import Recipe
 
 from club.models import Club, Membership
 from core.baker_recipes import subscriber_user
 from core.models import User
-from counter.models import BillingInfo, Counter, Customer, Permanency, Product, Selling
+from counter.basket import Basket, Catalogue
+from counter.etickets import _render, eticket_pdf, render_batch
+from counter.models import (
+    AccountIdSequence,
+    BarmenPresence,
+    BillingInfo,
+    CashRegisterSummary,
+    CashRegisterSummaryItem,
+    Counter,
+    Customer,
+    CustomerSummary,
+    Eticket,
+    Permanency,
+    Product,
+    Refilling,
+    RefillingRollup,
+    Selling,
+    SellingRollup,
+    StudentCard,
+)
+from counter.stats import CustomerStats
 from sith.settings import SITH_MAIN_CLUB
+from subscription.models import Subscription
 
 
 class TestCounter(TestCase):
@@ -831,6 +861,24 @@ class TestCustomerAccountId(TestCase):
         assert account.account_id == "1111a"
         assert account.amount == 10
 
+    def test_bulk_get_or_create(self):
+        users = baker.make(User, _quantity=3)
+        with self.assertNumQueries(6):
+            # existing accounts, sequence lock and update (in a savepoint),
+            # then a single insert
+            customers = Customer.bulk_get_or_create([self.user_a, *users])
+        assert customers[0].account_id == "1111a"
+        assert [c.user_id for c in customers] == [
+            self.user_a.id,
+            *(u.id for u in users),
+        ]
+        assert [c.account_id[:-1] for c in customers[1:]] == ["12346", "12347", "12348"]
+        assert Customer.get_or_create(baker.make(User))[0].account_id[:-1] == "12349"
+
+    def test_sequence_follows_manual_ids(self):
+        Customer.objects.create(user=baker.make(User), account_id="20000b")
+        assert AccountIdSequence.allocate(2)[1][:-1] == "20002"
+
 
 class TestClubCounterClickAccess(TestCase):
     @classmethod
@@ -874,3 +922,533 @@ class TestClubCounterClickAccess(TestCase):
         self.client.force_login(self.user)
         res = self.client.get(self.click_url)
         assert res.status_code == 200
+
+
+class TestCheckBasket(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counter = Counter.objects.get(name="MDE")
+        cls.customer = baker.make(Customer, user=subscriber_user.make(), amount=10)
+        cls.beer = baker.make(Product, selling_price=2, special_selling_price=1)
+        cls.tray = baker.make(
+            Product, selling_price="1.5", special_selling_price=1, tray=True
+        )
+        cls.counter.products.add(cls.beer, cls.tray)
+        cls.url = reverse(
+            "api:check_basket",
+            kwargs={"counter_id": cls.counter.id, "user_id": cls.customer.user_id},
+        )
+
+    def setUp(self):
+        self.client.post(
+            reverse("counter:login", kwargs={"counter_id": self.counter.id}),
+            {"username": "skia", "password": "plop"},
+        )
+
+    def test_valid_basket(self):
+        items = [{"id": self.beer.id, "quantity": 2}, {"id": self.tray.id}]
+        res = self.client.post(self.url, items, content_type="application/json")
+        assert res.status_code == 200
+        assert res.json() == {
+            "items": [
+                {
+                    "id": self.beer.id,
+                    "quantity": 2,
+                    "bonus_quantity": 0,
+                    "unit_price": 2,
+                },
+                {
+                    "id": self.tray.id,
+                    "quantity": 1,
+                    "bonus_quantity": 0,
+                    "unit_price": 1.5,
+                },
+            ],
+            "total": 5.5,
+            "errors": [],
+        }
+
+    def test_tray(self):
+        """Test that one product out of six is free when sold by tray."""
+        items = [{"id": self.tray.id, "quantity": 6}]
+        res = self.client.post(self.url, items, content_type="application/json")
+        assert res.json()["items"] == [
+            {"id": self.tray.id, "quantity": 5, "bonus_quantity": 1, "unit_price": 1.5}
+        ]
+
+    def test_invalid_items(self):
+        product_elsewhere = baker.make(Product, selling_price=1)
+        items = [
+            {"id": self.beer.id, "quantity": 4},
+            {"id": self.beer.id, "quantity": 2},
+            {"id": product_elsewhere.id},
+        ]
+        res = self.client.post(self.url, items, content_type="application/json")
+        assert res.status_code == 200
+        assert res.json()["total"] == 8
+        assert res.json()["errors"] == [
+            {"id": self.beer.id, "error": "not_enough"},
+            {"id": product_elsewhere.id, "error": "unknown_product"},
+        ]
+
+    def test_not_logged_in_counter(self):
+        self.client.logout()
+        res = self.client.post(
+            self.url, [{"id": self.beer.id}], content_type="application/json"
+        )
+        assert res.status_code == 403
+
+    def test_catalogue_kept_in_memory(self):
+        """Test that the catalogue is loaded once, until a product changes."""
+        catalogue = Catalogue.of(self.counter.id)
+        with self.assertNumQueries(0):
+            assert Catalogue.of(self.counter.id) is catalogue
+        self.beer.selling_price = 3
+        self.beer.save()
+        assert Catalogue.of(self.counter.id).get(self.beer.id).selling_price == 3
+
+
+class TestBasketCheckout(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counter = Counter.objects.get(name="MDE")
+        cls.barman = User.objects.get(username="skia")
+        cls.customer = baker.make(Customer, user=subscriber_user.make(), amount=20)
+        cls.beer = baker.make(Product, selling_price=2)
+        cls.tray = baker.make(Product, selling_price="1.5", tray=True)
+        cls.counter.products.add(cls.beer, cls.tray)
+
+    def make_basket(self) -> Basket:
+        basket = Basket(Catalogue.of(self.counter.id), self.customer, is_barman=False)
+        basket.add(self.beer.id, 2)
+        basket.add(self.tray.id, 6)
+        return basket
+
+    def test_checkout(self):
+        basket = self.make_basket()
+        _ = self.customer.user.preferences
+        # debit, ledger, sellings, etickets, refresh and the savepoint,
+        # plus the update (and here the creation) of the rollup of each product
+        with self.assertNumQueries(11):
+            basket.checkout(self.counter, self.barman)
+        assert self.customer.amount == Decimal("8.5")
+        self.customer.refresh_from_db()
+        assert self.customer.amount == Decimal("8.5")
+        sellings = Selling.objects.filter(customer=self.customer).order_by("id")
+        assert [(s.product_id, s.quantity, s.unit_price) for s in sellings] == [
+            (self.beer.id, 2, 2),
+            (self.tray.id, 5, Decimal("1.5")),
+            (self.tray.id, 1, 0),
+        ]
+
+    def test_not_enough_money(self):
+        """Test that nothing is bought if the money is spent in the meantime."""
+        basket = self.make_basket()
+        Customer.objects.filter(pk=self.customer.pk).update(amount=10)
+        with pytest.raises(ValidationError):
+            basket.checkout(self.counter, self.barman)
+        assert not Selling.objects.filter(customer=self.customer).exists()
+        self.customer.refresh_from_db()
+        assert self.customer.amount == 10
+
+    def test_eticket_mail_after_commit(self):
+        baker.make(Eticket, product=self.beer)
+        basket = self.make_basket()
+        with self.captureOnCommitCallbacks() as callbacks:
+            basket.checkout(self.counter, self.barman)
+            assert len(mail.outbox) == 0
+        for callback in callbacks:
+            callback()
+        assert len(mail.outbox) == 1
+
+
+class TestBalanceLedger(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = baker.make(Customer, amount=10)
+
+    def test_no_lost_update(self):
+        """Test that operations made with outdated objects aren't lost."""
+        other = Customer.objects.get(pk=self.customer.pk)
+        other.debit(Decimal(3), "Selling")
+        self.customer.credit(Decimal(5), "Refilling")
+        assert self.customer.amount == 12
+        self.customer.refresh_from_db()
+        assert self.customer.amount == 12
+        assert list(
+            self.customer.balance_movements.order_by("id").values_list(
+                "amount", flat=True
+            )
+        ) == [10, -3, 5]
+
+    def test_debit_not_enough_money(self):
+        with pytest.raises(ValidationError):
+            self.customer.debit(Decimal(11), "Selling")
+        self.customer.debit(Decimal(11), "Selling", allow_negative=True)
+        assert self.customer.amount == -1
+
+    def test_check_balances(self):
+        wrong = baker.make(Customer, amount=5)
+        Customer.objects.filter(pk=wrong.pk).update(amount=8)
+        assert list(Customer.objects.unbalanced()) == [wrong]
+        call_command("check_balances", stdout=StringIO())
+        wrong.refresh_from_db()
+        assert wrong.amount == 8
+        call_command("check_balances", "--fix", stdout=StringIO())
+        wrong.refresh_from_db()
+        assert wrong.amount == 5
+        assert not Customer.objects.unbalanced().exists()
+
+
+class TestSalesRollup(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counter = baker.make(Counter)
+        cls.customer = baker.make(Customer, amount=100)
+        cls.product = baker.make(Product)
+        cls.seller = baker.make(User)
+
+    def sell(self, quantity: int, unit_price: int, **kwargs) -> Selling:
+        return baker.make(
+            Selling,
+            counter=self.counter,
+            customer=self.customer,
+            product=self.product,
+            club=self.product.club,
+            seller=self.seller,
+            quantity=quantity,
+            unit_price=unit_price,
+            **kwargs,
+        )
+
+    def test_rollup_follows_sellings(self):
+        self.sell(2, 3)
+        self.sell(1, 4)
+        rollup = SellingRollup.objects.get(counter=self.counter)
+        assert (rollup.quantity, rollup.total) == (3, 10)
+        assert self.counter.get_total_sales() == 10
+        Selling.objects.filter(quantity=1).delete()
+        rollup.refresh_from_db()
+        assert (rollup.quantity, rollup.total) == (2, 6)
+        assert self.counter.get_total_sales() == 6
+
+    def test_edited_selling(self):
+        selling = self.sell(2, 3)
+        selling.quantity = 4
+        selling.save()
+        rollup = SellingRollup.objects.get(counter=self.counter)
+        assert (rollup.quantity, rollup.total) == (4, 12)
+        other_counter = baker.make(Counter)
+        selling.counter = other_counter
+        selling.save()
+        assert self.counter.get_total_sales() == 0
+        assert other_counter.get_total_sales() == 12
+
+    def test_duplicated_rows(self):
+        """When two rows exist for the same keys, only one is incremented."""
+        selling = self.sell(2, 3)
+        rollup = SellingRollup.objects.get(counter=self.counter)
+        rollup.pk = None
+        rollup.save()
+        assert self.counter.get_total_sales() == 12
+        self.sell(1, 4)
+        assert self.counter.get_total_sales() == 16
+        selling.delete()
+        assert self.counter.get_total_sales() == 10
+
+    def test_since(self):
+        self.sell(1, 5, date=timezone.now() - timedelta(days=2))
+        self.sell(1, 3)
+        yesterday = timezone.now() - timedelta(days=1)
+        assert self.counter.get_total_sales(since=yesterday) == 3
+        assert self.counter.get_total_sales(since=timezone.localdate(yesterday)) == 3
+        assert list(
+            self.counter.get_top_customers(since=yesterday).values_list(
+                "user", "selling_sum"
+            )
+        ) == [(self.customer.user_id, 3)]
+
+    def test_rebuild(self):
+        self.sell(2, 3)
+        baker.make(
+            Refilling,
+            counter=self.counter,
+            customer=self.customer,
+            amount=15,
+            payment_method="CARD",
+        )
+        SellingRollup.objects.all().update(total=0)
+        RefillingRollup.objects.all().delete()
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        assert self.counter.get_total_sales() == 6
+        assert RefillingRollup.objects.get(counter=self.counter).total == 15
+
+
+class TestCustomerStats(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = baker.make(Customer, amount=100)
+        cls.foyer = Counter.objects.get(name="Foyer")
+        cls.seller = baker.make(User)
+        now = timezone.now()
+        cls.product = baker.make(Product)
+        sale_recipe = Recipe(
+            Selling,
+            customer=cls.customer,
+            seller=cls.seller,
+            product=cls.product,
+            club=cls.product.club,
+            unit_price=2,
+        )
+        sale_recipe.make(counter=cls.foyer, quantity=3, date=now)
+        sale_recipe.make(counter=cls.foyer, quantity=1, date=now)
+        sale_recipe.make(counter=cls.foyer, quantity=1, date=now - timedelta(days=400))
+        baker.make(
+            Permanency,
+            user=cls.customer.user,
+            counter=cls.foyer,
+            start=now - timedelta(hours=3),
+            end=now - timedelta(hours=1),
+        )
+
+    def test_stats(self):
+        stats = CustomerStats.of(self.customer)
+        assert [[m.sum for m in year] for year in stats.buyings_by_month] == [[8], [2]]
+        assert stats.buyings_by_counter == {"Foyer": 8}
+        assert stats.total_perm_time == timedelta(hours=2)
+        assert stats.top_products == [
+            {"product__name": self.product.name, "product_sum": 5}
+        ]
+
+    def test_cache(self):
+        CustomerStats.of(self.customer)
+        with self.assertNumQueries(1):
+            CustomerStats.of(self.customer)
+        baker.make(Refilling, customer=self.customer, counter=self.foyer, amount=10)
+        stats = CustomerStats.of(self.customer)
+        assert [[m.sum for m in year] for year in stats.refillings_by_month] == [[10]]
+
+    def test_views(self):
+        self.client.force_login(self.customer.user)
+        for url in ("core:user_account", "core:user_stats"):
+            response = self.client.get(
+                reverse(url, kwargs={"user_id": self.customer.user_id})
+            )
+            assert response.status_code == 200
+
+
+class TestCashSums(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.bar = baker.make(Counter, type="BAR")
+        cls.customer = Customer.get_or_create(baker.make(User))[0]
+        now = timezone.now()
+        cls.emptied = cls.make_summary(now - timedelta(days=10), 100, emptied=True)
+        cls.make_summary(now - timedelta(days=5), 30)
+        cls.make_summary(now - timedelta(days=1), 12)
+        for days, amount in ((12, 100), (6, 20), (2, 15)):
+            baker.make(
+                Refilling,
+                counter=cls.bar,
+                customer=cls.customer,
+                amount=amount,
+                date=now - timedelta(days=days),
+            )
+
+    @classmethod
+    def make_summary(cls, date, total, *, emptied=False) -> CashRegisterSummary:
+        summary = baker.make(CashRegisterSummary, counter=cls.bar, emptied=emptied)
+        # the date is set to now when the summary is created
+        CashRegisterSummary.objects.filter(pk=summary.pk).update(date=date)
+        baker.make(
+            CashRegisterSummaryItem, cash_summary=summary, value=1, quantity=total
+        )
+        return summary
+
+    def test_since_last_emptied(self):
+        with self.assertNumQueries(1):
+            bar = Counter.objects.filter(pk=self.bar.pk).annotate_cash_sums().get()
+        assert bar.refilling_sum == 35
+        assert bar.summaries_sum == 42
+
+    def test_date_range(self):
+        now = timezone.now()
+        bar = (
+            Counter.objects.filter(pk=self.bar.pk)
+            .annotate_cash_sums(now - timedelta(days=11), now - timedelta(days=3))
+            .get()
+        )
+        assert bar.refilling_sum == 20
+        assert bar.summaries_sum == 130
+
+    def test_never_emptied(self):
+        CashRegisterSummary.objects.filter(pk=self.emptied.pk).update(emptied=False)
+        bar = Counter.objects.filter(pk=self.bar.pk).annotate_cash_sums().get()
+        assert bar.refilling_sum == 135
+        assert bar.summaries_sum == 142
+
+    def test_api(self):
+        url = reverse("api:cash_sums")
+        self.client.force_login(subscriber_user.make())
+        assert self.client.get(url).status_code == 403
+        self.client.force_login(User.objects.get(username="root"))
+        response = self.client.get(url)
+        assert response.status_code == 200
+        sums = {c["id"]: c for c in response.json()}
+        assert sums[self.bar.id]["refilling_sum"] == 35
+        assert sums[self.bar.id]["summaries_sum"] == 42
+
+    def test_list_view(self):
+        self.client.force_login(User.objects.get(username="root"))
+        response = self.client.get(reverse("counter:cash_summary_list"))
+        assert response.status_code == 200
+        assert f"{self.bar.name}: 35" in response.content.decode()
+
+
+class TestBarmenPresence(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counter = baker.make(Counter, type="BAR")
+        cls.barman = subscriber_user.make()
+        cls.barman.set_password("plop")
+        cls.barman.save()
+        cls.counter.sellers.add(cls.barman)
+
+    def login(self):
+        self.client.post(
+            reverse("counter:login", args=[self.counter.id]),
+            {"username": self.barman.username, "password": "plop"},
+        )
+
+    def test_no_write_on_activity(self):
+        Permanency.objects.create(
+            counter=self.counter, user=self.barman, start=timezone.now()
+        )
+        counter = Counter.objects.get(pk=self.counter.pk)
+        assert counter.barmen_list == [self.barman]
+        counter.update_activity()
+        # the activity has just been flushed, so it stays in the cache
+        counter = Counter.objects.get(pk=self.counter.pk)
+        with self.assertNumQueries(0):
+            counter.update_activity()
+            assert counter.barmen_list == [self.barman]
+            assert not counter.is_inactive()
+
+    def test_timeout(self):
+        start = timezone.now() - timedelta(hours=2)
+        Permanency.objects.create(counter=self.counter, user=self.barman, start=start)
+        Permanency.objects.filter(counter=self.counter).update(
+            activity=start + timedelta(minutes=5)
+        )
+        BarmenPresence.invalidate(self.counter.id)
+        assert Counter.objects.get(pk=self.counter.pk).barmen_list == []
+        perm = Permanency.objects.get(counter=self.counter)
+        assert perm.end == start + timedelta(minutes=5)
+
+    def test_can_refill(self):
+        ae = Club.objects.get(unix_name=SITH_MAIN_CLUB["unix_name"])
+        Permanency.objects.create(
+            counter=self.counter, user=self.barman, start=timezone.now()
+        )
+        assert not Counter.objects.get(pk=self.counter.pk).can_refill()
+        Membership.objects.create(club=ae, user=self.barman, role=1)
+        # the right to refill is computed when the barmen change
+        assert not Counter.objects.get(pk=self.counter.pk).can_refill()
+        BarmenPresence.invalidate(self.counter.id)
+        assert Counter.objects.get(pk=self.counter.pk).can_refill()
+
+    def test_login_logout(self):
+        self.login()
+        assert Counter.objects.get(pk=self.counter.pk).barmen_list == [self.barman]
+        self.client.post(
+            reverse("counter:logout", args=[self.counter.id]),
+            {"user_id": self.barman.id},
+        )
+        assert Counter.objects.get(pk=self.counter.pk).barmen_list == []
+        assert not Permanency.objects.filter(end=None, user=self.barman).exists()
+
+
+class TestCustomerSummary(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.get_or_create(subscriber_user.make())[0]
+        cls.card = baker.make(StudentCard, customer=cls.customer, uid="ABCDEF12345678")
+
+    def test_lookup(self):
+        for code in (self.card.uid, self.customer.account_id.upper()):
+            summary = CustomerSummary.lookup(code)
+            assert summary.user_id == self.customer.user_id
+            assert summary.can_buy
+            with self.assertNumQueries(0):
+                assert CustomerSummary.lookup(code) == summary
+        assert CustomerSummary.lookup("unknown") is None
+
+    def test_card_deleted(self):
+        CustomerSummary.lookup(self.card.uid)
+        self.card.delete()
+        assert CustomerSummary.lookup(self.card.uid) is None
+
+    def test_updated(self):
+        summary = CustomerSummary.lookup(self.card.uid)
+        assert not summary.is_banned_counter
+        self.customer.user.groups.add(settings.SITH_GROUP_BANNED_COUNTER_ID)
+        self.customer.credit(Decimal(10), "Refilling")
+        summary = CustomerSummary.lookup(self.card.uid)
+        assert summary.is_banned_counter
+        assert summary.amount == 10
+
+    def test_click_view(self):
+        counter = baker.make(Counter, type="OFFICE")
+        self.client.force_login(User.objects.get(username="root"))
+        url = reverse(
+            "counter:click",
+            kwargs={"counter_id": counter.id, "user_id": self.customer.user_id},
+        )
+        assert self.client.get(url).status_code == 200
+        Subscription.objects.filter(member=self.customer.user).delete()
+        assert self.client.get(url).status_code == 404
+
+
+class TestEticketRendering(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.get_or_create(subscriber_user.make())[0]
+        cls.eticket = baker.make(Eticket, event_title="Gala")
+        cls.selling = baker.make(
+            Selling,
+            product=cls.eticket.product,
+            club=cls.eticket.product.club,
+            counter=baker.make(Counter),
+            customer=cls.customer,
+            seller=cls.customer.user,
+            unit_price=0,
+            quantity=2,
+        )
+
+    def test_rendered_once(self):
+        selling = Selling.objects.get(id=self.selling.id)
+        pdf = eticket_pdf(selling)
+        assert pdf.startswith(b"%PDF")
+        with mock.patch("counter.etickets._render", wraps=_render) as render:
+            assert eticket_pdf(selling) == pdf
+        render.assert_not_called()
+
+    def test_render_batch(self):
+        assert render_batch([self.selling.id, self.selling.id + 1000]) == 1
+
+    def test_render_event(self):
+        out = StringIO()
+        with NamedTemporaryFile(suffix=".pdf") as f:
+            call_command(
+                "render_etickets", self.eticket.id, "--output", f.name, stdout=out
+            )
+            assert f.read().startswith(b"%PDF")
+        assert "1 etickets have been drawn" in out.getvalue()
+
+    def test_view(self):
+        self.client.force_login(self.customer.user)
+        response = self.client.get(
+            reverse("counter:eticket_pdf", kwargs={"selling_id": self.selling.id})
+        )
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/pdf"
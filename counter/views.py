@@ -13,16 +13,15 @@
 #
 #
 import re
-from datetime import datetime, timedelta
-from datetime import timezone as tz
+from datetime import date, datetime, timedelta
 from http import HTTPStatus
 from urllib.parse import parse_qs
 
 from django import forms
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
-from django.db import DataError, transaction
-from django.db.models import F
+from django.db import DataError
+from django.db.models import F, Sum
 from django.forms import CheckboxSelectMultiple
 from django.forms.models import modelform_factory
 from django.http import (
@@ -35,6 +34,7 @@ from django.http import (
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_POST
 from django.views.generic import DetailView, ListView, TemplateView
@@ -49,10 +49,11 @@ from django.views.generic.edit import (
 )
 
 from accounting.models import CurrencyField
-from core.models import User
 from core.utils import get_semester_code, get_start_of_semester
 from core.views import CanEditMixin, CanViewMixin, TabedViewMixin
 from core.views.forms import LoginForm
+from counter.basket import Basket, Catalogue
+from counter.etickets import eticket_pdf
 from counter.forms import (
     CashSummaryFormBase,
     CounterEditForm,
@@ -68,12 +69,14 @@ from counter.models import (
     CashRegisterSummaryItem,
     Counter,
     Customer,
+    CustomerSummary,
     Eticket,
-    Permanency,
     Product,
     ProductType,
     Refilling,
+    RefillingRollup,
     Selling,
+    SellingRollup,
     StudentCard,
 )
 from counter.utils import is_logged_in_counter
@@ -320,10 +323,14 @@ class CounterClick(CounterTabsMixin, CanViewMixin, DetailView):
             return super().render_to_response(*args, **kwargs)
 
     def dispatch(self, request, *args, **kwargs):
-        self.customer = get_object_or_404(Customer, user__id=self.kwargs["user_id"])
-        obj: Counter = self.get_object()
-        if not self.customer.can_buy:
+        # the summary is usually cached, as the customer has just been scanned
+        summary = CustomerSummary.of(self.kwargs["user_id"])
+        if summary is None or not summary.can_buy:
             raise Http404
+        self.customer = Customer.objects.select_related("user").get(
+            user_id=summary.user_id
+        )
+        obj: Counter = self.get_object()
         if obj.type != "BAR" and not request.user.is_authenticated:
             raise PermissionDenied
         if obj.type == "BAR" and (
@@ -409,16 +416,17 @@ class CounterClick(CounterTabsMixin, CanViewMixin, DetailView):
         barmen = self.object.barmen_list
         return self.object.type == "BAR" and self.customer.user in barmen
 
-    def get_product(self, pid):
-        return Product.objects.filter(pk=int(pid)).first()
+    @cached_property
+    def catalogue(self) -> Catalogue:
+        return Catalogue.of(self.object.id)
 
-    def get_price(self, pid):
-        p = self.get_product(pid)
-        if self.customer_is_barman():
-            price = p.special_selling_price
-        else:
-            price = p.selling_price
-        return price
+    def get_basket(self, request) -> Basket:
+        return Basket.from_session(
+            self.catalogue,
+            self.customer,
+            request.session["basket"],
+            is_barman=self.customer_is_barman(),
+        )
 
     def sum_basket(self, request):
         total = 0
@@ -426,39 +434,6 @@ class CounterClick(CounterTabsMixin, CanViewMixin, DetailView):
             total += infos["price"] * infos["qty"]
         return total / 100
 
-    def get_total_quantity_for_pid(self, request, pid):
-        pid = str(pid)
-        try:
-            return (
-                request.session["basket"][pid]["qty"]
-                + request.session["basket"][pid]["bonus_qty"]
-            )
-        except:
-            return 0
-
-    def compute_record_product(self, request, product=None):
-        recorded = 0
-        basket = request.session["basket"]
-
-        if product:
-            if product.is_record_product:
-                recorded -= 1
-            elif product.is_unrecord_product:
-                recorded += 1
-
-        for p in basket:
-            bproduct = self.get_product(str(p))
-            if bproduct.is_record_product:
-                recorded -= basket[p]["qty"]
-            elif bproduct.is_unrecord_product:
-                recorded += basket[p]["qty"]
-        return recorded
-
-    def is_record_product_ok(self, request, product):
-        return self.customer.can_record_more(
-            self.compute_record_product(request, product)
-        )
-
     @staticmethod
     def is_ajax(request):
         # when using the fetch API, the django request.POST dict is empty
@@ -474,58 +449,16 @@ class CounterClick(CounterTabsMixin, CanViewMixin, DetailView):
         p is the product id, passed as an integer.
         """
         pid = p or parse_qs(request.body.decode())["product_id"][0]
-        pid = str(pid)
-        price = self.get_price(pid)
-        total = self.sum_basket(request)
-        product: Product = self.get_product(pid)
-        user: User = self.customer.user
-        buying_groups = list(product.buying_groups.values_list("pk", flat=True))
-        can_buy = len(buying_groups) == 0 or any(
-            user.is_in_group(pk=group_id) for group_id in buying_groups
-        )
-        if not can_buy:
-            request.session["not_allowed"] = True
-            return False
-        bq = 0  # Bonus quantity, for trays
-        if (
-            product.tray
-        ):  # Handle the tray to adjust the quantity q to add and the bonus quantity bq
-            total_qty_mod_6 = self.get_total_quantity_for_pid(request, pid) % 6
-            bq = int((total_qty_mod_6 + q) / 6)  # Integer division
-            q -= bq
-        if self.customer.amount < (
-            total + round(q * float(price), 2)
-        ):  # Check for enough money
-            request.session["not_enough"] = True
-            return False
-        if product.is_unrecord_product and not self.is_record_product_ok(
-            request, product
-        ):
-            request.session["not_allowed"] = True
-            return False
-        if product.limit_age >= 18 and not user.date_of_birth:
-            request.session["no_age"] = True
-            return False
-        if product.limit_age >= 18 and user.is_banned_alcohol:
-            request.session["not_allowed"] = True
-            return False
-        if user.is_banned_counter:
+        basket = self.get_basket(request)
+        error = basket.add(int(pid), q)
+        if error == "unknown_product":
+            # this product isn't sold in this counter
             request.session["not_allowed"] = True
             return False
-        if (
-            user.date_of_birth and self.customer.user.get_age() < product.limit_age
-        ):  # Check if affordable
-            request.session["too_young"] = True
+        if error is not None:
+            request.session[error] = True
             return False
-        if pid in request.session["basket"]:  # Add if already in basket
-            request.session["basket"][pid]["qty"] += q
-            request.session["basket"][pid]["bonus_qty"] += bq
-        else:  # or create if not
-            request.session["basket"][pid] = {
-                "qty": q,
-                "price": int(price * 100),
-                "bonus_qty": bq,
-            }
+        request.session["basket"] = basket.to_session()
         request.session.modified = True
         return True
 
@@ -549,18 +482,9 @@ class CounterClick(CounterTabsMixin, CanViewMixin, DetailView):
     def del_product(self, request):
         """Delete a product from the basket."""
         pid = parse_qs(request.body.decode())["product_id"][0]
-        product = self.get_product(pid)
-        if pid in request.session["basket"]:
-            if (
-                product.tray
-                and (self.get_total_quantity_for_pid(request, pid) % 6 == 0)
-                and request.session["basket"][pid]["bonus_qty"]
-            ):
-                request.session["basket"][pid]["bonus_qty"] -= 1
-            else:
-                request.session["basket"][pid]["qty"] -= 1
-            if request.session["basket"][pid]["qty"] <= 0:
-                del request.session["basket"][pid]
+        basket = self.get_basket(request)
+        basket.remove(int(pid))
+        request.session["basket"] = basket.to_session()
         request.session.modified = True
 
     def parse_code(self, request):
@@ -581,63 +505,31 @@ class CounterClick(CounterTabsMixin, CanViewMixin, DetailView):
             nb = m.group("nb")
             code = m.group("code")
             nb = int(nb) if nb is not None else 1
-            p = self.object.products.filter(code=code).first()
-            if p is not None:
-                self.add_product(request, nb, p.id)
+            product = self.catalogue.get_by_code(code)
+            if product is not None:
+                self.add_product(request, nb, product.id)
         context = self.get_context_data(object=self.object)
         return self.render_to_response(context)
 
     def finish(self, request):
         """Finish the click session, and validate the basket."""
-        with transaction.atomic():
-            request.session["last_basket"] = []
-            if self.sum_basket(request) > self.customer.amount:
-                raise DataError(_("You have not enough money to buy all the basket"))
-
-            for pid, infos in request.session["basket"].items():
-                # This duplicates code for DB optimization (prevent to load many times the same object)
-                p = Product.objects.filter(pk=pid).first()
-                if self.customer_is_barman():
-                    uprice = p.special_selling_price
-                else:
-                    uprice = p.selling_price
-                request.session["last_basket"].append(
-                    "%d x %s" % (infos["qty"] + infos["bonus_qty"], p.name)
-                )
-                s = Selling(
-                    label=p.name,
-                    product=p,
-                    club=p.club,
-                    counter=self.object,
-                    unit_price=uprice,
-                    quantity=infos["qty"],
-                    seller=self.operator,
-                    customer=self.customer,
-                )
-                s.save()
-                if infos["bonus_qty"]:
-                    s = Selling(
-                        label=p.name + " (Plateau)",
-                        product=p,
-                        club=p.club,
-                        counter=self.object,
-                        unit_price=0,
-                        quantity=infos["bonus_qty"],
-                        seller=self.operator,
-                        customer=self.customer,
-                    )
-                    s.save()
-                self.customer.recorded_products -= self.compute_record_product(request)
-                self.customer.save()
-            request.session["last_customer"] = self.customer.user.get_display_name()
-            request.session["last_total"] = "%0.2f" % self.sum_basket(request)
-            request.session["new_customer_amount"] = str(self.customer.amount)
-            del request.session["basket"]
-            request.session.modified = True
-            kwargs = {"counter_id": self.object.id}
-            return HttpResponseRedirect(
-                reverse_lazy("counter:details", args=self.args, kwargs=kwargs)
-            )
+        if self.sum_basket(request) > self.customer.amount:
+            raise DataError(_("You have not enough money to buy all the basket"))
+        basket = self.get_basket(request)
+        basket.checkout(self.object, self.operator)
+        request.session["last_basket"] = [
+            "%d x %s" % (line.quantity + line.bonus_quantity, line.product.name)
+            for line in basket.lines.values()
+        ]
+        request.session["last_customer"] = self.customer.user.get_display_name()
+        request.session["last_total"] = "%0.2f" % basket.total
+        request.session["new_customer_amount"] = str(self.customer.amount)
+        del request.session["basket"]
+        request.session.modified = True
+        kwargs = {"counter_id": self.object.id}
+        return HttpResponseRedirect(
+            reverse_lazy("counter:details", args=self.args, kwargs=kwargs)
+        )
 
     def cancel(self, request):
         """Cancel the click session."""
@@ -709,9 +601,8 @@ def counter_login(request: HttpRequest, counter_id: int) -> HttpResponseRedirect
 @require_POST
 def counter_logout(request: HttpRequest, counter_id: int) -> HttpResponseRedirect:
     """End the permanency of a user in this counter."""
-    Permanency.objects.filter(counter=counter_id, user=request.POST["user_id"]).update(
-        end=F("activity")
-    )
+    counter = get_object_or_404(Counter, pk=counter_id)
+    counter.presence.logout(request.POST["user_id"])
     return redirect("counter:details", counter_id=counter_id)
 
 
@@ -1296,7 +1187,11 @@ class CashSummaryListView(CounterAdminTabsMixin, CounterAdminMixin, ListView):
     template_name = "counter/cash_summary_list.jinja"
     context_object_name = "cashsummary_list"
     current_tab = "cash_summary"
-    queryset = CashRegisterSummary.objects.all().order_by("-date")
+    queryset = (
+        CashRegisterSummary.objects.annotate_total()
+        .select_related("user", "counter")
+        .order_by("-date")
+    )
     paginate_by = settings.SITH_COUNTER_CASH_SUMMARY_LENGTH
 
     def get_context_data(self, **kwargs):
@@ -1304,45 +1199,13 @@ class CashSummaryListView(CounterAdminTabsMixin, CounterAdminMixin, ListView):
         kwargs = super().get_context_data(**kwargs)
         form = CashSummaryFormBase(self.request.GET)
         kwargs["form"] = form
-        kwargs["summaries_sums"] = {}
-        kwargs["refilling_sums"] = {}
-        for c in Counter.objects.filter(type="BAR").all():
-            refillings = Refilling.objects.filter(counter=c)
-            cashredistersummaries = CashRegisterSummary.objects.filter(counter=c)
-            if form.is_valid() and form.cleaned_data["begin_date"]:
-                refillings = refillings.filter(
-                    date__gte=form.cleaned_data["begin_date"]
-                )
-                cashredistersummaries = cashredistersummaries.filter(
-                    date__gte=form.cleaned_data["begin_date"]
-                )
-            else:
-                last_summary = (
-                    CashRegisterSummary.objects.filter(counter=c, emptied=True)
-                    .order_by("-date")
-                    .first()
-                )
-                if last_summary:
-                    refillings = refillings.filter(date__gt=last_summary.date)
-                    cashredistersummaries = cashredistersummaries.filter(
-                        date__gt=last_summary.date
-                    )
-                else:
-                    refillings = refillings.filter(
-                        date__gte=datetime(year=1994, month=5, day=17, tzinfo=tz.utc)
-                    )  # My birth date should be old enough
-                    cashredistersummaries = cashredistersummaries.filter(
-                        date__gte=datetime(year=1994, month=5, day=17, tzinfo=tz.utc)
-                    )
-            if form.is_valid() and form.cleaned_data["end_date"]:
-                refillings = refillings.filter(date__lte=form.cleaned_data["end_date"])
-                cashredistersummaries = cashredistersummaries.filter(
-                    date__lte=form.cleaned_data["end_date"]
-                )
-            kwargs["summaries_sums"][c.name] = sum(
-                [s.get_total() for s in cashredistersummaries.all()]
-            )
-            kwargs["refilling_sums"][c.name] = sum([s.amount for s in refillings.all()])
+        begin, end = None, None
+        if form.is_valid():
+            begin = form.cleaned_data["begin_date"]
+            end = form.cleaned_data["end_date"]
+        counters = Counter.objects.filter(type="BAR").annotate_cash_sums(begin, end)
+        kwargs["summaries_sums"] = {c.name: c.summaries_sum for c in counters}
+        kwargs["refilling_sums"] = {c.name: c.refilling_sum for c in counters}
         return kwargs
 
 
@@ -1353,59 +1216,28 @@ class InvoiceCallView(CounterAdminTabsMixin, CounterAdminMixin, TemplateView):
     def get_context_data(self, **kwargs):
         """Add sums to the context."""
         kwargs = super().get_context_data(**kwargs)
-        kwargs["months"] = Selling.objects.datetimes("date", "month", order="DESC")
+        kwargs["months"] = SellingRollup.objects.dates("day", "month", order="DESC")
         if "month" in self.request.GET:
-            start_date = datetime.strptime(self.request.GET["month"], "%Y-%m")
+            start_date = datetime.strptime(self.request.GET["month"], "%Y-%m").date()
         else:
-            start_date = datetime(
+            start_date = date(
                 year=timezone.now().year,
                 month=(timezone.now().month + 10) % 12 + 1,
                 day=1,
             )
-        start_date = start_date.replace(tzinfo=tz.utc)
-        end_date = (start_date + timedelta(days=32)).replace(
-            day=1, hour=0, minute=0, microsecond=0
-        )
-        from django.db.models import Case, F, Sum, When
-
+        end_date = (start_date + timedelta(days=32)).replace(day=1)
+        month = {"day__gte": start_date, "day__lt": end_date}
         kwargs["sum_cb"] = sum(
-            [
-                r.amount
-                for r in Refilling.objects.filter(
-                    payment_method="CARD",
-                    is_validated=True,
-                    date__gte=start_date,
-                    date__lte=end_date,
-                )
-            ]
-        )
-        kwargs["sum_cb"] += sum(
-            [
-                s.quantity * s.unit_price
-                for s in Selling.objects.filter(
-                    payment_method="CARD",
-                    is_validated=True,
-                    date__gte=start_date,
-                    date__lte=end_date,
-                )
-            ]
+            rollup.objects.filter(payment_method="CARD", **month).aggregate(
+                res=Sum("total", default=0)
+            )["res"]
+            for rollup in (RefillingRollup, SellingRollup)
         )
         kwargs["start_date"] = start_date
         kwargs["sums"] = (
-            Selling.objects.values("club__name")
-            .annotate(
-                selling_sum=Sum(
-                    Case(
-                        When(
-                            date__gte=start_date,
-                            date__lt=end_date,
-                            then=F("unit_price") * F("quantity"),
-                        ),
-                        output_field=CurrencyField(),
-                    )
-                )
-            )
-            .exclude(selling_sum=None)
+            SellingRollup.objects.filter(**month)
+            .values("club__name")
+            .annotate(selling_sum=Sum("total", output_field=CurrencyField()))
             .order_by("-selling_sum")
         )
         return kwargs
@@ -1446,85 +1278,15 @@ class EticketPDFView(CanViewMixin, DetailView):
     pk_url_kwarg = "selling_id"
 
     def get(self, request, *args, **kwargs):
-        from reportlab.graphics import renderPDF
-        from reportlab.graphics.barcode.qr import QrCodeWidget
-        from reportlab.graphics.shapes import Drawing
-        from reportlab.lib.units import cm
-        from reportlab.lib.utils import ImageReader
-        from reportlab.pdfgen import canvas
-
+        self.object = self.get_object()
         if not (
             hasattr(self.object, "product") and hasattr(self.object.product, "eticket")
         ):
             raise Http404
-
-        eticket = self.object.product.eticket
-        user = self.object.customer.user
-        code = "%s %s %s %s" % (
-            self.object.customer.user.id,
-            self.object.product.id,
-            self.object.id,
-            self.object.quantity,
+        response = HttpResponse(
+            eticket_pdf(self.object), content_type="application/pdf"
         )
-        code += " " + eticket.get_hash(code)[:8].upper()
-        response = HttpResponse(content_type="application/pdf")
         response["Content-Disposition"] = 'filename="eticket.pdf"'
-        p = canvas.Canvas(response)
-        p.setTitle("Eticket")
-        im = ImageReader("core/static/core/img/eticket.jpg")
-        width, height = im.getSize()
-        size = max(width, height)
-        width = 8 * cm * width / size
-        height = 8 * cm * height / size
-        p.drawImage(im, 10 * cm, 25 * cm, width, height)
-        if eticket.banner:
-            im = ImageReader(eticket.banner)
-            width, height = im.getSize()
-            size = max(width, height)
-            width = 6 * cm * width / size
-            height = 6 * cm * height / size
-            p.drawImage(im, 1 * cm, 25 * cm, width, height)
-        if user.profile_pict:
-            im = ImageReader(user.profile_pict.file)
-            width, height = im.getSize()
-            size = max(width, height)
-            width = 150 * width / size
-            height = 150 * height / size
-            p.drawImage(im, 10.5 * cm - width / 2, 16 * cm, width, height)
-        if eticket.event_title:
-            p.setFont("Helvetica-Bold", 20)
-            p.drawCentredString(10.5 * cm, 23.6 * cm, eticket.event_title)
-        if eticket.event_date:
-            p.setFont("Helvetica-Bold", 16)
-            p.drawCentredString(
-                10.5 * cm, 22.6 * cm, eticket.event_date.strftime("%d %b %Y")
-            )  # FIXME with a locale
-        p.setFont("Helvetica-Bold", 14)
-        p.drawCentredString(
-            10.5 * cm,
-            15 * cm,
-            "%s : %d %s"
-            % (user.get_display_name(), self.object.quantity, str(_("people(s)"))),
-        )
-        p.setFont("Courier-Bold", 14)
-        qrcode = QrCodeWidget(code)
-        bounds = qrcode.getBounds()
-        width = bounds[2] - bounds[0]
-        height = bounds[3] - bounds[1]
-        d = Drawing(260, 260, transform=[260.0 / width, 0, 0, 260.0 / height, 0, 0])
-        d.add(qrcode)
-        renderPDF.draw(d, p, 10.5 * cm - 130, 6.1 * cm)
-        p.drawCentredString(10.5 * cm, 6 * cm, code)
-
-        partners = ImageReader("core/static/core/img/partners.png")
-        width, height = partners.getSize()
-        size = max(width, height)
-        width = width * 2 / 3
-        height = height * 2 / 3
-        p.drawImage(partners, 0 * cm, 0 * cm, width, height)
-
-        p.showPage()
-        p.save()
         return response
 
 
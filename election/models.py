@@ -1,9 +1,29 @@
+from typing import Self
+
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from ordered_model.models import OrderedModel
 
-from core.models import Group, User
+from core.models import Group, PermissionResolver, User
+
+
+class ElectionQuerySet(models.QuerySet):
+    def viewable_by(self, user: User) -> Self:
+        """Filter the elections that this user can view.
+
+        This gives the same result as `user.can_view(election)`
+        on each election, without checking them one by one.
+        """
+        if user.is_root:
+            return self.all()
+        group_ids = PermissionResolver(user).group_ids
+        if user.is_anonymous:
+            return self.filter(view_groups__in=group_ids).distinct()
+        return self.filter(
+            Q(view_groups__in=group_ids) | Q(edit_groups__in=group_ids)
+        ).distinct()
 
 
 class Election(models.Model):
@@ -49,6 +69,8 @@ class Election(models.Model):
     )
     archived = models.BooleanField(_("archived"), default=False)
 
+    objects = ElectionQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -1,8 +1,9 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
-from core.models import Group, User
+from core.models import AnonymousUser, Group, PermissionResolver, User, get_group
 from election.models import Election
 
 
@@ -18,6 +19,48 @@ class TestElection(TestCase):
         cls.public = User.objects.get(username="public")
 
 
+class TestElectionViewableBy(TestElection):
+    def test_same_as_can_view(self):
+        """Test that the elections viewable by a user are the ones they can view."""
+        self.election.view_groups.set([self.ae_board_group])
+        Election.objects.create(
+            title="Open election",
+            start_candidature=self.election.start_candidature,
+            end_candidature=self.election.end_candidature,
+            start_date=self.election.start_date,
+            end_date=self.election.end_date,
+        ).view_groups.add(self.public_group)
+        root = User.objects.get(username="root")
+        for user in AnonymousUser(), self.public, self.subscriber, self.sli, root:
+            expected = {e for e in Election.objects.all() if user.can_view(e)}
+            assert set(Election.objects.viewable_by(user)) == expected
+
+    def test_resolver_queries(self):
+        """Test that the number of queries of the resolver is constant."""
+        Election.objects.bulk_create(
+            [
+                Election(
+                    title=f"Election {i}",
+                    start_candidature=self.election.start_candidature,
+                    end_candidature=self.election.end_candidature,
+                    start_date=self.election.start_date,
+                    end_date=self.election.end_date,
+                )
+                for i in range(20)
+            ]
+        )
+        elections = list(Election.objects.all())
+        resolver = PermissionResolver(self.subscriber)
+        cache.clear()
+        get_group(pk=settings.SITH_GROUP_PUBLIC_ID)  # load the group registry
+        # 2 queries for the groups of the elections,
+        # 3 to build the permission snapshot of the user and resolve its groups
+        with self.assertNumQueries(5):
+            resolver.prefetch(elections)
+            for election in elections:
+                resolver.can_view(election)
+
+
 class TestElectionDetail(TestElection):
     def test_permission_denied(self):
         self.election.view_groups.remove(self.public_group)
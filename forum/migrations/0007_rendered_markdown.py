@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:45
+
+from django.db import migrations
+
+import core.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("forum", "0006_auto_20180426_2013"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="forummessage",
+            name="message_html",
+            field=core.fields.RenderedMarkdownField(
+                editable=False, null=True, source="message"
+            ),
+        ),
+    ]
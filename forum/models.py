@@ -35,6 +35,7 @@ from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 from club.models import Club
+from core.fields import RenderedMarkdownField
 from core.models import Group, User
 
 
@@ -308,6 +309,7 @@ class ForumMessage(models.Model):
     )
     title = models.CharField(_("title"), default="", max_length=64, blank=True)
     message = models.TextField(_("message"), default="")
+    message_html = RenderedMarkdownField(source="message")
     date = models.DateTimeField(_("date"), default=timezone.now)
     readers = models.ManyToManyField(
         User, related_name="read_messages", verbose_name=_("readers")
@@ -27,3 +27,6 @@ from django.apps import AppConfig
 class GalaxyConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "galaxy"
+
+    def ready(self):
+        import galaxy.signals  # noqa F401
@@ -0,0 +1,325 @@
+"""Bulk computation of the relations between the citizens of the Galaxy.
+
+The legacy way to rule the galaxy is to call
+[Galaxy.compute_users_score][galaxy.models.Galaxy.compute_users_score]
+for every pair of citizens, which performs several db queries per pair.
+With a few thousands citizens, this means hundreds of millions of queries.
+
+The [RelationsEngine][galaxy.engine.RelationsEngine] takes the opposite approach :
+the godfather links, the picture identifications and the club memberships
+are fetched once, then all the pair scores are computed in memory :
+
+- the pictures score is the sparse product of the user/picture incidence matrix
+  by its transpose (each picture contributes one point to every pair
+  of users identified on it)
+- the clubs score is obtained by sweeping the membership intervals
+  of each club, sorted by start date
+- the family score is a simple count of the godfather links
+
+The results are exactly the same as the ones of the legacy computation.
+"""
+
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Iterable, Iterator, NamedTuple
+
+from django.utils import timezone
+
+from club.models import Membership
+from core.models import User
+from sas.models import PeoplePictureRelation
+
+
+class RelationCounts(NamedTuple):
+    """Raw counts of what two citizens have in common.
+
+    Those counts are not weighted yet.
+    """
+
+    family: int
+    """The number of godfather links between the two citizens."""
+    pictures: int
+    """The number of pictures on which both citizens are identified."""
+    clubs: int
+    """The number of days during which both citizens were in the same clubs."""
+
+
+class UserCounts(NamedTuple):
+    """Raw counts of the activity of a single citizen."""
+
+    family: int
+    """The number of godfathers and godchildren of the citizen."""
+    pictures: int
+    """The number of pictures the citizen is identified on."""
+    clubs: int
+    """The number of memberships of the citizen."""
+
+
+class _Span(NamedTuple):
+    user: int  # index of the user in the engine
+    start: date
+    end: date | None
+
+
+class RelationsEngine:
+    """Compute in bulk the relations between a set of users.
+
+    The users are referred to by their index in `user_ids`.
+    A pair of users is always given as a `(user1, user2)` tuple
+    of indexes where `user1 > user2`, which is the order in which
+    the legacy algorithm of [Galaxy.rule][galaxy.models.Galaxy.rule]
+    examines the pairs.
+
+    Instantiating the engine performs three db queries ;
+    everything else is done in memory.
+
+    Example:
+        ```python
+        engine = RelationsEngine([user.id for user in users])
+        for (user1, user2), counts in engine.relations().items():
+            print(users[user1], users[user2], counts.pictures)
+        ```
+    """
+
+    def __init__(self, user_ids: Iterable[int]):
+        self.user_ids: list[int] = list(user_ids)
+        self.index: dict[int, int] = {uid: i for i, uid in enumerate(self.user_ids)}
+        self.today = timezone.now().date()
+        self.user_counts: list[UserCounts] = []
+        # Relations are stored by `user1`, then by `user2`
+        self._family: list[Counter[int]] = [Counter() for _ in self.user_ids]
+        self._clubs: list[Counter[int]] = [Counter() for _ in self.user_ids]
+        # The pictures score is computed lazily, row by row,
+        # from the user/picture incidence matrix
+        self._people: list[list[int]] = []
+        self._pictures_of: list[list[int]] = [[] for _ in self.user_ids]
+        # The last day of membership of each user, `date.max` if still running
+        self._last_day_in_club: dict[int, date] = {}
+        self._load()
+
+    def _add(self, relations: list[Counter[int]], a: int, b: int, value: int):
+        if a > b:
+            relations[a][b] += value
+        else:
+            relations[b][a] += value
+
+    def _load(self):
+        family_count = [0] * len(self.user_ids)
+        pictures_count = [0] * len(self.user_ids)
+        clubs_count = [0] * len(self.user_ids)
+
+        links = User.godfathers.through.objects.values_list(
+            "from_user_id", "to_user_id"
+        )
+        for godchild, godfather in links:
+            godchild, godfather = self.index.get(godchild), self.index.get(godfather)
+            if godchild is not None:
+                family_count[godchild] += 1
+            if godfather is not None:
+                family_count[godfather] += 1
+            if godchild is not None and godfather is not None:
+                self._add(self._family, godchild, godfather, 1)
+
+        # Each picture is a column of the user/picture incidence matrix.
+        # Only the non-zero cells are fetched, grouped by column.
+        identifications = PeoplePictureRelation.objects.values_list(
+            "picture_id", "user_id", "picture__is_in_sas", "picture__is_folder"
+        ).order_by("picture_id")
+        for _picture, rows in itertools.groupby(identifications, key=lambda r: r[0]):
+            people = []
+            for _, user_id, is_in_sas, is_folder in rows:
+                user = self.index.get(user_id)
+                if user is None:
+                    continue
+                pictures_count[user] += 1
+                if is_in_sas and not is_folder:
+                    people.append(user)
+            if len(people) < 2:
+                continue
+            people.sort()
+            for user in people:
+                self._pictures_of[user].append(len(self._people))
+            self._people.append(people)
+
+        spans_by_club: dict[int, list[_Span]] = defaultdict(list)
+        memberships = Membership.objects.values_list(
+            "club_id", "user_id", "start_date", "end_date"
+        )
+        for club, user_id, start, end in memberships:
+            user = self.index.get(user_id)
+            if user is None:
+                continue
+            clubs_count[user] += 1
+            spans_by_club[club].append(_Span(user, start, end))
+            last_day = date.max if end is None else end
+            self._last_day_in_club[user] = max(
+                last_day, self._last_day_in_club.get(user, last_day)
+            )
+        for spans in spans_by_club.values():
+            self._sweep_club(spans)
+
+        self.user_counts = [
+            UserCounts(*counts)
+            for counts in zip(family_count, pictures_count, clubs_count, strict=True)
+        ]
+
+    def _sweep_club(self, spans: list[_Span]):
+        """Add the days spent together in the club to the score of each pair of users.
+
+        The membership intervals are sorted by start date,
+        so that each membership only has to be compared with the ones
+        starting before its own end.
+        """
+        spans.sort(key=lambda s: s.start)
+        for i, span in enumerate(spans):
+            bound = date.max if span.end is None else max(span.start, span.end)
+            for other in itertools.islice(spans, i + 1, None):
+                if other.start > bound:
+                    break
+                if other.user == span.user:
+                    continue
+                # The legacy algorithm isn't perfectly symmetric
+                # on its edge cases, so respect its orientation.
+                if span.user > other.user:
+                    days = self._common_days(span, other)
+                else:
+                    days = self._common_days(other, span)
+                if days is not None:
+                    self._add(self._clubs, span.user, other.user, days)
+
+    def _common_days(self, span1: _Span, span2: _Span) -> int | None:
+        """Return the number of days during which the two memberships overlapped.
+
+        This is the exact same computation as the one done by
+        [Galaxy.compute_users_clubs_score][galaxy.models.Galaxy.compute_users_clubs_score],
+        with `span1` belonging to its `user1` and `span2` to its `user2`.
+
+        Returns:
+            The number of common days, or None if the memberships don't overlap.
+        """
+        end1 = span1.end or self.today
+        if not (
+            (
+                span2.start <= span1.start
+                and (span2.end is None or span1.start <= span2.end)
+            )
+            or span1.start <= span2.start <= end1
+        ):
+            return None
+        end2 = span2.end or self.today
+        return (min(end1, end2) - max(span1.start, span2.start)).days
+
+    def relations(
+        self, users: Iterable[int] | None = None
+    ) -> dict[tuple[int, int], RelationCounts]:
+        """Return the counts of the pairs of users having something in common.
+
+        Pairs of users without any relation are omitted.
+
+        Args:
+            users: if given, only return the pairs whose `user1`
+                is one of those users.
+                This allows to split the computation into independent blocks.
+        """
+        if users is None:
+            users = range(len(self.user_ids))
+        res = {}
+        for user1 in users:
+            pictures = Counter()
+            # Row `user1` of the product of the incidence matrix by its transpose
+            for picture in self._pictures_of[user1]:
+                for user2 in self._people[picture]:
+                    if user2 >= user1:
+                        break
+                    pictures[user2] += 1
+            family, clubs = self._family[user1], self._clubs[user1]
+            for user2 in family.keys() | pictures.keys() | clubs.keys():
+                res[user1, user2] = RelationCounts(
+                    family=family[user2], pictures=pictures[user2], clubs=clubs[user2]
+                )
+        return res
+
+    def relations_with(
+        self, users: Iterable[int]
+    ) -> dict[tuple[int, int], RelationCounts]:
+        """Return the counts of the pairs of users having something in common,
+        among the pairs including at least one of the given users.
+
+        Pairs of users without any relation are omitted.
+        """
+        users = set(users)
+        res = self.relations(users)
+        # The pairs whose `user1` is in the given users are already there,
+        # only the ones where they are `user2` are left.
+        pictures: dict[int, Counter[int]] = defaultdict(Counter)
+        for user2 in users:
+            for picture in self._pictures_of[user2]:
+                for user1 in self._people[picture]:
+                    if user1 > user2 and user1 not in users:
+                        pictures[user1][user2] += 1
+        for user1 in range(len(self.user_ids)):
+            if user1 in users:
+                continue
+            family, clubs = self._family[user1], self._clubs[user1]
+            user_pictures = pictures.get(user1, Counter())
+            others = (family.keys() | clubs.keys()) & users
+            for user2 in others | user_pictures.keys():
+                res[user1, user2] = RelationCounts(
+                    family=family[user2],
+                    pictures=user_pictures[user2],
+                    clubs=clubs[user2],
+                )
+        return res
+
+    def members_since(self, day: date) -> set[int]:
+        """Return the users who were still members of a club on the given day.
+
+        As the clubs score of a running membership grows every day,
+        the relations of those users may have changed since then,
+        even if their memberships didn't.
+        """
+        return {user for user, last in self._last_day_in_club.items() if last >= day}
+
+    def relations_by_block(
+        self, blocks: Iterable[range], *, workers: int = 1
+    ) -> Iterator[tuple[range, dict[tuple[int, int], RelationCounts]]]:
+        """Compute the relations of each block of users.
+
+        With more than one worker, the blocks are computed in a pool of processes,
+        and yielded as soon as they are ready, which may not be in the given order.
+        The worker processes are forked from the current one,
+        so they don't need to load the data again,
+        and they never touch the database.
+
+        Args:
+            blocks: the blocks of users, as ranges of indexes
+            workers: the number of worker processes
+
+        Yields:
+            Each block with the relations of its users,
+            as returned by [relations][galaxy.engine.RelationsEngine.relations]
+        """
+        if workers <= 1:
+            for block in blocks:
+                yield block, self.relations(block)
+            return
+        global _worker_engine
+        _worker_engine = self
+        context = multiprocessing.get_context("fork")
+        try:
+            with context.Pool(workers) as pool:
+                yield from pool.imap_unordered(_compute_block, blocks)
+        finally:
+            _worker_engine = None
+
+
+_worker_engine: RelationsEngine | None = None
+"""The engine inherited by the forked worker processes."""
+
+
+def _compute_block(block: range):
+    return block, _worker_engine.relations(block)
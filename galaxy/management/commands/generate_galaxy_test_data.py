@@ -21,6 +21,7 @@
 #
 #
 import logging
+import time
 import warnings
 from datetime import timedelta
 from typing import Final, Optional
@@ -32,7 +33,8 @@ from django.utils import timezone
 
 from club.models import Club, Membership
 from core.models import Group, Page, SithFile, User
-from sas.models import Album, PeoplePictureRelation, Picture
+from galaxy.models import Galaxy, GalaxyChange
+from sas.models import Album, AlbumVisibility, PeoplePictureRelation, Picture
 from subscription.models import Subscription
 
 RED_PIXEL_PNG: Final[bytes] = (
@@ -68,6 +70,24 @@ class Command(BaseCommand):
         parser.add_argument(
             "--club-count", help="Number of clubs to create", type=int, default=50
         )
+        parser.add_argument(
+            "--benchmark",
+            help=(
+                "Once the data is generated, rule the galaxy with both "
+                "the bulk and the legacy algorithms and compare them. "
+                "Existing galaxies will be replaced."
+            ),
+            action="store_true",
+        )
+        parser.add_argument(
+            "--benchmark-threshold",
+            help=(
+                "Minimum number of pictures to be included in the benchmarked galaxy. "
+                "The legacy algorithm is really slow, so keep it high enough."
+            ),
+            type=int,
+            default=26,
+        )
 
     def handle(self, *args, **options):
         self.logger = logging.getLogger("main")
@@ -117,6 +137,40 @@ class Command(BaseCommand):
         for u in range(half_pack, self.NB_USERS, half_pack):
             self.make_important_citizen(u)
 
+        if options["benchmark"]:
+            self.benchmark(options["benchmark_threshold"])
+
+    def benchmark(self, picture_count_threshold: int):
+        """Rule the galaxy with the bulk and the legacy algorithms, and compare them.
+
+        Both algorithms are expected to give the exact same galaxy state.
+        The time taken by each of them is written on the standard output.
+
+        Args:
+            picture_count_threshold: the minimum number of pictures
+                to be included in the galaxy (see `galaxy.models.Galaxy.rule`)
+        """
+        results = {}
+        for name, legacy in (("bulk", False), ("legacy", True)):
+            self.logger.info(f"Ruling the galaxy with the {name} algorithm")
+            galaxy = Galaxy.objects.create()
+            start = time.perf_counter()
+            galaxy.rule(picture_count_threshold, legacy=legacy)
+            results[name] = (time.perf_counter() - start, galaxy.state)
+
+        bulk_time, bulk_state = results["bulk"]
+        legacy_time, legacy_state = results["legacy"]
+        self.stdout.write(
+            f"{len(bulk_state['nodes'])} citizen, {len(bulk_state['links'])} lanes"
+        )
+        self.stdout.write(f"bulk:   {bulk_time:.2f} seconds")
+        self.stdout.write(f"legacy: {legacy_time:.2f} seconds")
+        self.stdout.write(f"speedup: x{legacy_time / bulk_time:.1f}")
+        if bulk_state == legacy_state:
+            self.stdout.write(self.style.SUCCESS("Both galaxies are identical"))
+        else:
+            self.stdout.write(self.style.ERROR("The galaxies are different"))
+
     def make_clubs(self):
         """Create all the clubs (:class:`club.models.Club`).
 
@@ -356,6 +410,20 @@ class Command(BaseCommand):
             if uid % 30 == 0:
                 _tag_neighbors(uid, 4, self.NB_USERS, 110)
         PeoplePictureRelation.objects.bulk_create(self.pictures_tags)
+        self._record_tags(self.pictures_tags)
+
+    @staticmethod
+    def _record_tags(tags: list[PeoplePictureRelation]):
+        """Do what the signals of the given tags would have done.
+
+        Relations created with `bulk_create` don't send the signals
+        which give the tagged users access to the albums of their pictures
+        and record that their galaxy relations have changed.
+        """
+        user_ids = sorted({tag.user_id for tag in tags})
+        for i in range(0, len(user_ids), 500):
+            AlbumVisibility.refresh(user_ids[i : i + 500])
+            GalaxyChange.mark(user_ids[i : i + 500])
 
     def make_important_citizen(self, uid: int):
         """Make the user whose uid is given in parameter a more important citizen.
@@ -397,3 +465,4 @@ class Command(BaseCommand):
         # In this case the conflict will just be ignored
         # and nothing will happen for this entry
         PeoplePictureRelation.objects.bulk_create(pictures_tags, ignore_conflicts=True)
+        self._record_tags(pictures_tags)
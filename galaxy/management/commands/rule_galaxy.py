@@ -23,7 +23,7 @@
 import logging
 import warnings
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
 
 from galaxy.models import Galaxy
@@ -38,6 +38,28 @@ class Command(BaseCommand):
         "environment."
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            help="Number of processes computing the relation scores",
+            type=int,
+            default=1,
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument(
+            "--resume",
+            help="Continue the last interrupted ruling instead of starting a new one",
+            action="store_true",
+        )
+        mode.add_argument(
+            "--update",
+            help=(
+                "Only update the current galaxy with the changes "
+                "made since its last ruling or update"
+            ),
+            action="store_true",
+        )
+
     def handle(self, *args, **options):
         logger = logging.getLogger("main")
         if options["verbosity"] < 0 or 2 < options["verbosity"]:
@@ -52,9 +74,29 @@ class Command(BaseCommand):
         else:
             logger.setLevel(logging.ERROR)
 
-        logger.info("The Galaxy is being ruled by the Sith.")
-        galaxy = Galaxy.objects.create()
-        galaxy.rule()
+        if options["workers"] < 1:
+            raise CommandError("There must be at least one worker")
+
+        if options["update"]:
+            galaxy = Galaxy.get_current_galaxy()
+            if galaxy is None:
+                raise CommandError("There is no ruled galaxy to update")
+            logger.info("The Sith is strengthening its grip on the Galaxy.")
+            galaxy.update()
+            return
+
+        if options["resume"]:
+            galaxy = Galaxy.objects.filter(
+                state__isnull=True, checkpoint__isnull=False
+            ).last()
+            if galaxy is None:
+                raise CommandError("There is no interrupted galaxy to resume")
+            logger.info("The Sith is back to rule the Galaxy.")
+            galaxy.resume(workers=options["workers"])
+        else:
+            logger.info("The Galaxy is being ruled by the Sith.")
+            galaxy = Galaxy.objects.create()
+            galaxy.rule(workers=options["workers"])
         logger.info("Sending old galaxies' remains to garbage.")
         Galaxy.objects.filter(state__isnull=True).delete()
 
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.16 on 2026-10-16 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("galaxy", "0002_auto_20230412_1130"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="galaxy",
+            name="checkpoint",
+            field=models.JSONField(
+                help_text="Blocks of stars whose lanes have already been computed",
+                null=True,
+                verbose_name="ruling checkpoint",
+            ),
+        ),
+    ]
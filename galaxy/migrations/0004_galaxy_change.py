@@ -0,0 +1,55 @@
+# Generated by Django 4.2.16 on 2026-10-16 22:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("galaxy", "0003_galaxy_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="galaxy",
+            name="last_update",
+            field=models.DateField(
+                help_text="Date of the data from which the galaxy was last computed",
+                null=True,
+                verbose_name="last update",
+            ),
+        ),
+        migrations.CreateModel(
+            name="GalaxyChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "date",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="date"
+                    ),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-16 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("galaxy", "0004_galaxy_change"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="galaxy",
+            name="compressed_state",
+            field=models.BinaryField(
+                help_text="The state serialized to JSON and compressed with gzip",
+                null=True,
+                verbose_name="compressed state",
+            ),
+        ),
+        migrations.AddField(
+            model_name="galaxy",
+            name="state_etag",
+            field=models.CharField(
+                blank=True, max_length=64, verbose_name="state ETag"
+            ),
+        ),
+    ]
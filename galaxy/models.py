@@ -23,12 +23,16 @@
 
 from __future__ import annotations
 
+import gzip
+import hashlib
+import itertools
+import json
 import logging
 import math
 import time
-from typing import NamedTuple, TypedDict
+from typing import Iterable, NamedTuple, TypedDict
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Case, Count, F, Q, Value, When
 from django.db.models.functions import Concat
 from django.utils import timezone
@@ -36,6 +40,7 @@ from django.utils.translation import gettext_lazy as _
 
 from club.models import Club
 from core.models import User
+from galaxy.engine import RelationCounts, RelationsEngine, UserCounts
 from sas.models import Picture
 
 
@@ -83,7 +88,8 @@ def current_star(self) -> GalaxyStar | None:
         The star of this user if there is an active Galaxy
         and this user is a citizen of it, else `None`
     """
-    return self.stars.filter(galaxy=Galaxy.get_current_galaxy()).last()
+    galaxy = Galaxy.objects.filter(state__isnull=False).only("pk").last()
+    return self.stars.filter(galaxy=galaxy).last()
 
 
 # Adding a shortcut to User class for getting its star belonging to the latest ruled Galaxy
@@ -131,6 +137,38 @@ class GalaxyLane(models.Model):
         return f"{self.star1} -> {self.star2} ({self.distance})"
 
 
+class GalaxyChange(models.Model):
+    """A user whose relations have changed since the last update of the galaxy.
+
+    Those are recorded by the signals of `galaxy.signals`,
+    then consumed by :meth:`Galaxy.update`.
+    """
+
+    # The user may be deleted before the galaxy is updated,
+    # so don't let the db nor the ORM enforce the relation.
+    user = models.OneToOneField(
+        User,
+        verbose_name=_("user"),
+        related_name="+",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    date = models.DateTimeField(_("date"), default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user_id} ({self.date})"
+
+    @classmethod
+    def mark(cls, user_ids: Iterable[int]) -> None:
+        """Record that the relations of the given users have changed."""
+        cls.objects.bulk_create(
+            [cls(user_id=user_id) for user_id in set(user_ids)],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["date"],
+        )
+
+
 class StarDict(TypedDict):
     id: int
     name: str
@@ -177,8 +215,25 @@ class Galaxy(models.Model):
     FAMILY_LINK_POINTS = 366  # Equivalent to a leap year together in a club, because.
     PICTURE_POINTS = 2  # Equivalent to two days as random members of a club.
     CLUBS_POINTS = 1  # One day together as random members in a club is one point.
+    RULING_BLOCK_SIZE = 200  # Number of stars whose lanes are computed at once.
 
     state = models.JSONField(_("The galaxy current state"), null=True)
+    checkpoint = models.JSONField(
+        _("ruling checkpoint"),
+        null=True,
+        help_text=_("Blocks of stars whose lanes have already been computed"),
+    )
+    last_update = models.DateField(
+        _("last update"),
+        null=True,
+        help_text=_("Date of the data from which the galaxy was last computed"),
+    )
+    compressed_state = models.BinaryField(
+        _("compressed state"),
+        null=True,
+        help_text=_("The state serialized to JSON and compressed with gzip"),
+    )
+    state_etag = models.CharField(_("state ETag"), max_length=64, blank=True)
 
     class Meta:
         ordering = ["pk"]
@@ -406,7 +461,51 @@ class Galaxy(models.Model):
         cls.logger.debug(f"\t\t> Scaled distance: {value}")
         return int(value)
 
-    def rule(self, picture_count_threshold=10) -> None:
+    @classmethod
+    def mass_from_counts(cls, counts: UserCounts) -> int:
+        """Compute the mass of a star from the raw counts of its owner.
+
+        This gives the same result as :meth:`compute_user_score`,
+        without any db query.
+        """
+        score = (
+            counts.family * cls.FAMILY_LINK_POINTS
+            + counts.pictures * cls.PICTURE_POINTS
+            + counts.clubs * cls.CLUBS_POINTS
+        )
+        return int(math.log2(1 + score))
+
+    @classmethod
+    def score_from_counts(cls, counts: RelationCounts) -> RelationScore:
+        """Weight the raw counts of a relation.
+
+        This gives the same result as :meth:`compute_users_score`,
+        without any db query.
+        """
+        return RelationScore(
+            family=counts.family * cls.FAMILY_LINK_POINTS,
+            pictures=counts.pictures * cls.PICTURE_POINTS,
+            clubs=counts.clubs * cls.CLUBS_POINTS,
+        )
+
+    @classmethod
+    def get_rulable_users(cls, picture_count_threshold: int = 10) -> list[User]:
+        """Return the users who can be promoted to citizens.
+
+        See :meth:`rule` for the meaning of `picture_count_threshold`.
+        """
+        # force fetch of the whole query to make sure there won't
+        # be any more db hits
+        # this is memory expensive but prevents a lot of db hits, therefore
+        # is far more time efficient
+        return list(
+            User.objects.filter(subscriptions__isnull=False)
+            .annotate(pictures_count=Count("pictures"))
+            .filter(pictures_count__gt=picture_count_threshold)
+            .distinct()
+        )
+
+    def rule(self, picture_count_threshold=10, *, legacy=False, workers=1) -> None:
         """Main function of the Galaxy.
 
         Iterate over all the rulable users to promote them to citizens.
@@ -419,45 +518,196 @@ class Galaxy(models.Model):
         This does very effectively limit the quantity of computing to do
         and only includes users who have had a minimum of activity.
 
+        By default, the scores are computed in bulk by
+        :class:`galaxy.engine.RelationsEngine`.
+        The legacy computation, which examines each pair of citizens
+        with several db queries, is still available with `legacy=True`.
+        Both give the exact same result,
+        but the legacy one is orders of magnitude slower.
+
+        The lanes are computed by blocks of :attr:`RULING_BLOCK_SIZE` stars,
+        which can be dispatched to several worker processes.
+        Each finished block is saved along with a checkpoint,
+        so that an interrupted ruling can be continued with :meth:`resume`.
+
         This method still remains very expensive, so think thoroughly before
         you call it, especially in production.
 
         :param picture_count_threshold: the minimum number of picture to have to be
                                         included in the galaxy
+        :param legacy: use the legacy pair-by-pair computation
+        :param workers: the number of processes computing the lanes
         """
-        total_time = time.time()
+        start_time = time.time()
+        ruling_date = timezone.now()
         self.logger.info("Listing rulable citizen.")
-        rulable_users = (
-            User.objects.filter(subscriptions__isnull=False)
-            .annotate(pictures_count=Count("pictures"))
-            .filter(pictures_count__gt=picture_count_threshold)
-            .distinct()
+        rulable_users = self.get_rulable_users(picture_count_threshold)
+        self.logger.info(
+            f"{len(rulable_users)} citizen have been listed. Starting to rule."
         )
 
-        # force fetch of the whole query to make sure there won't
-        # be any more db hits
-        # this is memory expensive but prevents a lot of db hits, therefore
-        # is far more time efficient
+        if legacy:
+            self._rule_legacy(rulable_users)
+        else:
+            self.logger.info("Loading the relations of all citizen")
+            engine = RelationsEngine(user.id for user in rulable_users)
+            self.logger.info("Creating stars for all citizen")
+            with transaction.atomic():
+                self._create_stars(
+                    rulable_users,
+                    [self.mass_from_counts(c) for c in engine.user_counts],
+                )
+                self.checkpoint = []
+                # Kept for resume, as the stars are made from the data of this date
+                self.last_update = ruling_date.date()
+                self.save(update_fields=["checkpoint", "last_update"])
+            self._rule_lanes(engine, workers=workers)
 
-        rulable_users = list(rulable_users)
-        rulable_users_count = len(rulable_users)
-        user1_count = 0
+        # All the changes made before the ruling are now taken into account
+        self.last_update = ruling_date.date()
+        GalaxyChange.objects.filter(date__lte=ruling_date).delete()
+        self._finish_ruling(start_time)
+
+    def resume(self, *, workers=1) -> None:
+        """Continue an interrupted ruling of this galaxy.
+
+        The stars are kept as they are, and only the lanes
+        of the blocks which are missing from the checkpoint are computed.
+
+        The stars still reflect the data of the day the ruling started,
+        so only the changes made before that day are considered done ;
+        the next :meth:`update` examines the others again.
+
+        :param workers: the number of processes computing the lanes
+        """
+        if self.checkpoint is None:
+            raise ValueError(f"{self} has no checkpoint to resume from")
+        start_time = time.time()
+        self.logger.info(f"Resuming the ruling of {self}")
+        self.logger.info("Loading the relations of all citizen")
+        # The stars have been created in the same order as the citizen were listed
+        engine = RelationsEngine(
+            self.stars.order_by("pk").values_list("owner_id", flat=True)
+        )
+        self._rule_lanes(engine, workers=workers)
+        if self.last_update is not None:
+            GalaxyChange.objects.filter(date__date__lt=self.last_update).delete()
+        self._finish_ruling(start_time)
+
+    def _finish_ruling(self, start_time: float) -> None:
+        """Make the galaxy state and delete the former galaxies."""
+        # Here, we get the IDs of the old galaxies that we'll need to delete. In normal operation, only one galaxy
+        # should be returned, and we can't delete it yet, as it's the one still displayed by the Sith.
+        old_galaxies_pks = list(
+            Galaxy.objects.filter(state__isnull=False).values_list("pk", flat=True)
+        )
         self.logger.info(
-            f"{rulable_users_count} citizen have been listed. Starting to rule."
+            f"These old galaxies will be deleted once the new one is ready: {old_galaxies_pks}"
         )
 
-        stars = []
-        self.logger.info("Creating stars for all citizen")
-        for user in rulable_users:
-            star = GalaxyStar(
-                owner=user, galaxy=self, mass=self.compute_user_score(user)
+        # Making the state sets this new galaxy as being ready. From now on, the Sith will show us to the world.
+        self.make_state()
+
+        # Avoid accident if there is nothing to delete
+        if len(old_galaxies_pks) > 0:
+            # Former galaxies can now be deleted.
+            Galaxy.objects.filter(pk__in=old_galaxies_pks).delete()
+
+        total_time = time.time() - start_time
+        total_time_hours = int(total_time // 3600)
+        total_time_minutes = int(total_time // 60 % 60)
+        total_time_seconds = int(total_time % 60)
+        self.logger.info(
+            f"{self} ruled in {total_time:.2f} seconds ({total_time_hours} hours, {total_time_minutes} minutes, {total_time_seconds} seconds)"
+        )
+
+    def _create_stars(self, rulable_users: list[User], masses: list[int]):
+        """Create the stars of the given users and return them, mapped by owner id."""
+        GalaxyStar.objects.bulk_create(
+            [
+                GalaxyStar(owner=user, galaxy=self, mass=mass)
+                for user, mass in zip(rulable_users, masses, strict=True)
+            ]
+        )
+        return {star.owner_id: star for star in GalaxyStar.objects.filter(galaxy=self)}
+
+    def _remaining_blocks(self, star_count: int) -> list[range]:
+        """Split the stars whose lanes are not computed yet into blocks."""
+        done = set()
+        for start, stop in self.checkpoint:
+            done.update(range(start, stop))
+        remaining = [i for i in range(star_count) if i not in done]
+        blocks = []
+        for i in remaining:
+            if (
+                blocks
+                and blocks[-1].stop == i
+                and len(blocks[-1]) < self.RULING_BLOCK_SIZE
+            ):
+                blocks[-1] = range(blocks[-1].start, i + 1)
+            else:
+                blocks.append(range(i, i + 1))
+        return blocks
+
+    def _rule_lanes(self, engine: RelationsEngine, *, workers: int) -> None:
+        """Create the lanes between the stars, block by block.
+
+        Each block is saved in its own transaction, along with the checkpoint.
+        """
+        stars = dict(self.stars.values_list("owner_id", "id"))
+        star_ids = [stars[user_id] for user_id in engine.user_ids]
+        blocks = self._remaining_blocks(len(star_ids))
+        self.logger.info(
+            f"Creating lanes between stars ({len(blocks)} blocks, {workers} workers)"
+        )
+        for count, (block, relations) in enumerate(
+            engine.relations_by_block(blocks, workers=workers), start=1
+        ):
+            lanes = self._make_lanes(relations, star_ids)
+            with transaction.atomic():
+                GalaxyLane.objects.bulk_create(lanes, batch_size=1000)
+                self.checkpoint.append([block.start, block.stop])
+                self.save(update_fields=["checkpoint"])
+            self.logger.info(
+                f"Block {count}/{len(blocks)} ruled: {len(lanes)} lanes created"
             )
-            stars.append(star)
-        GalaxyStar.objects.bulk_create(stars)
 
-        stars = {}
-        for star in GalaxyStar.objects.filter(galaxy=self):
-            stars[star.owner.id] = star
+    def _make_lanes(
+        self, relations: dict[tuple[int, int], RelationCounts], star_ids: list[int]
+    ) -> list[GalaxyLane]:
+        """Build the lanes of the given relations which are short enough.
+
+        :param relations: the relations, as returned by the RelationsEngine
+        :param star_ids: the id of the star of each user of the RelationsEngine
+        """
+        lanes = []
+        # Keep the order in which the legacy algorithm creates the lanes
+        for user1, user2 in sorted(relations, key=lambda p: (-p[0], p[1])):
+            score = self.score_from_counts(relations[user1, user2])
+            distance = self.scale_distance(sum(score))
+            if distance < 30:  # TODO: this needs tuning with real-world data
+                lanes.append(
+                    GalaxyLane(
+                        star1_id=star_ids[user1],
+                        star2_id=star_ids[user2],
+                        distance=distance,
+                        family=score.family,
+                        pictures=score.pictures,
+                        clubs=score.clubs,
+                    )
+                )
+        return lanes
+
+    def _rule_legacy(self, rulable_users: list[User]) -> None:
+        """Create the stars and the lanes by examining each pair of citizen."""
+        rulable_users = list(rulable_users)
+        rulable_users_count = len(rulable_users)
+        user1_count = 0
+
+        self.logger.info("Creating stars for all citizen")
+        stars = self._create_stars(
+            rulable_users, [self.compute_user_score(user) for user in rulable_users]
+        )
 
         self.logger.info("Creating lanes between stars")
         # Display current speed every $speed_count_frequency users
@@ -538,37 +788,124 @@ class Galaxy(models.Model):
             self.logger.info("#" * 60)
             t_global_start = time.time()
 
-        # Here, we get the IDs of the old galaxies that we'll need to delete. In normal operation, only one galaxy
-        # should be returned, and we can't delete it yet, as it's the one still displayed by the Sith.
-        old_galaxies_pks = list(
-            Galaxy.objects.filter(state__isnull=False).values_list("pk", flat=True)
-        )
-        self.logger.info(
-            f"These old galaxies will be deleted once the new one is ready: {old_galaxies_pks}"
-        )
+    def update(self, picture_count_threshold=10) -> None:
+        """Bring this galaxy up to date, without ruling it again from scratch.
 
-        # Making the state sets this new galaxy as being ready. From now on, the Sith will show us to the world.
-        self.make_state()
+        Only the citizens whose relations may have changed since the last
+        ruling or update of the galaxy are examined, that is :
 
-        # Avoid accident if there is nothing to delete
-        if len(old_galaxies_pks) > 0:
-            # Former galaxies can now be deleted.
-            Galaxy.objects.filter(pk__in=old_galaxies_pks).delete()
+        - the users recorded in :class:`GalaxyChange`, because their pictures,
+          memberships or godfather links changed
+        - the users who were in a club since then,
+          as their clubs score grows every day
+        - the users who just became rulable
 
-        total_time = time.time() - total_time
-        total_time_hours = int(total_time // 3600)
-        total_time_minutes = int(total_time // 60 % 60)
-        total_time_seconds = int(total_time % 60)
+        The stars of those citizens and all the lanes touching them
+        are computed again, the stars of the users who are not rulable
+        anymore are removed, and the :attr:`state` is patched accordingly.
+        The result is the same as the one of a new ruling,
+        for a fraction of its cost.
+
+        :param picture_count_threshold: the minimum number of picture to have to be
+                                        included in the galaxy.
+                                        It should be the same as the one
+                                        used to rule the galaxy.
+        """
+        if self.state is None:
+            raise ValueError(f"{self} must be ruled before being updated")
+        start_time = time.time()
+        update_date = timezone.now()
+        self.logger.info(f"Updating {self}")
+        rulable_users = self.get_rulable_users(picture_count_threshold)
+        engine = RelationsEngine(user.id for user in rulable_users)
+        former_citizen = {node["id"] for node in self.state["nodes"]}
+        changes = GalaxyChange.objects.filter(date__lte=update_date)
+        changed = {
+            engine.index[user_id]
+            for user_id in changes.values_list("user_id", flat=True)
+            if user_id in engine.index
+        }
+        if self.last_update is None:
+            changed.update(range(len(engine.user_ids)))
+        else:
+            changed |= engine.members_since(self.last_update)
+        new_citizen = [user for user in rulable_users if user.id not in former_citizen]
+        changed.update(engine.index[user.id] for user in new_citizen)
+        changed_ids = {engine.user_ids[user] for user in changed}
+        removed_ids = former_citizen - engine.index.keys()
         self.logger.info(
-            f"{self} ruled in {total_time:.2f} seconds ({total_time_hours} hours, {total_time_minutes} minutes, {total_time_seconds} seconds)"
+            f"{len(changed)} citizen to update, including {len(new_citizen)} "
+            f"new ones, and {len(removed_ids)} citizen to remove"
         )
 
-    def make_state(self) -> None:
-        """Compute JSON structure to send to 3d-force-graph: https://github.com/vasturiano/3d-force-graph/."""
+        with transaction.atomic():
+            GalaxyStar.objects.filter(galaxy=self, owner_id__in=removed_ids).delete()
+            stars = self._create_stars(
+                new_citizen,
+                [
+                    self.mass_from_counts(engine.user_counts[engine.index[user.id]])
+                    for user in new_citizen
+                ],
+            )
+            updated_stars = []
+            for user in changed:
+                star = stars[engine.user_ids[user]]
+                mass = self.mass_from_counts(engine.user_counts[user])
+                if star.mass != mass:
+                    star.mass = mass
+                    updated_stars.append(star)
+            GalaxyStar.objects.bulk_update(updated_stars, ["mass"])
+
+            changed_stars = [stars[user_id].id for user_id in changed_ids]
+            GalaxyLane.objects.filter(
+                Q(star1__in=changed_stars) | Q(star2__in=changed_stars)
+            ).delete()
+            star_ids = [stars[user_id].id for user_id in engine.user_ids]
+            lanes = self._make_lanes(engine.relations_with(changed), star_ids)
+            GalaxyLane.objects.bulk_create(lanes, batch_size=1000)
+
+            # Patch the state instead of making it again
+            touched_ids = changed_ids | removed_ids
+            masses = {user_id: stars[user_id].mass for user_id in changed_ids}
+            nodes = [
+                node for node in self.state["nodes"] if node["id"] not in removed_ids
+            ]
+            for node in nodes:
+                node["mass"] = masses.get(node["id"], node["mass"])
+            nodes.extend(
+                self._star_dict(star)
+                for star in self._named_stars().filter(
+                    owner__in=[user.id for user in new_citizen]
+                )
+            )
+            nodes.sort(key=lambda node: node["id"])
+            links = [
+                link
+                for link in self.state["links"]
+                if link["source"] not in touched_ids
+                and link["target"] not in touched_ids
+            ]
+            owners = {star.id: owner_id for owner_id, star in stars.items()}
+            links.extend(
+                {
+                    "source": owners[lane.star1_id],
+                    "target": owners[lane.star2_id],
+                    "value": lane.distance,
+                }
+                for lane in lanes
+            )
+            self.set_state(GalaxyDict(nodes=nodes, links=links))
+            self.last_update = update_date.date()
+            self.save()
+            changes.delete()
+
         self.logger.info(
-            "Caching current Galaxy state for a quicker display of the Empire's power."
+            f"{self} updated in {time.time() - start_time:.2f} seconds: "
+            f"{len(lanes)} lanes created"
         )
 
+    def _named_stars(self) -> models.QuerySet[GalaxyStar]:
+        """Return the stars of this galaxy, annotated with the name of their owner."""
         without_nickname = Concat(
             F("owner__first_name"), Value(" "), F("owner__last_name")
         )
@@ -580,47 +917,102 @@ class Galaxy(models.Model):
             F("owner__nick_name"),
             Value(")"),
         )
-        stars = (
-            GalaxyStar.objects.filter(galaxy=self)
-            .order_by(
-                "owner"
-            )  # This helps determinism for the tests and doesn't cost much
-            .annotate(
-                owner_name=Case(
-                    When(owner__nick_name=None, then=without_nickname),
-                    default=with_nickname,
-                )
+        return GalaxyStar.objects.filter(galaxy=self).annotate(
+            owner_name=Case(
+                When(owner__nick_name=None, then=without_nickname),
+                default=with_nickname,
             )
         )
-        lanes = (
-            GalaxyLane.objects.filter(star1__galaxy=self)
-            .order_by(
-                "star1"
-            )  # This helps determinism for the tests and doesn't cost much
-            .annotate(
-                star1_owner=F("star1__owner__id"),
-                star2_owner=F("star2__owner__id"),
-            )
+
+    @staticmethod
+    def _star_dict(star: GalaxyStar) -> StarDict:
+        return StarDict(id=star.owner_id, name=star.owner_name, mass=star.mass)
+
+    def _named_lanes(self) -> models.QuerySet[GalaxyLane]:
+        """Return the lanes of this galaxy, annotated with the owners of their stars."""
+        return GalaxyLane.objects.filter(star1__galaxy=self).annotate(
+            star1_owner=F("star1__owner__id"),
+            star2_owner=F("star2__owner__id"),
         )
-        json = GalaxyDict(
-            nodes=[
-                StarDict(
-                    id=star.owner_id,
-                    name=star.owner_name,
-                    mass=star.mass,
-                )
-                for star in stars
-            ],
+
+    def set_state(self, state: GalaxyDict) -> None:
+        """Set the state of the galaxy, along with its compressed version.
+
+        The state is served as is to every citizen looking at the galaxy,
+        so it is serialized and compressed once and for all here.
+        The ETag allows the browsers to keep it in cache until it changes.
+        The galaxy isn't saved.
+        """
+        serialized = json.dumps(state, separators=(",", ":")).encode()
+        self.state = state
+        self.compressed_state = gzip.compress(serialized, mtime=0)
+        self.state_etag = hashlib.sha256(serialized).hexdigest()
+
+    def make_state(self) -> None:
+        """Compute JSON structure to send to 3d-force-graph: https://github.com/vasturiano/3d-force-graph/."""
+        self.logger.info(
+            "Caching current Galaxy state for a quicker display of the Empire's power."
+        )
+
+        stars = self._named_stars().order_by(
+            "owner"
+        )  # This helps determinism for the tests and doesn't cost much
+        lanes = self._named_lanes().order_by(
+            "star1"
+        )  # This helps determinism for the tests and doesn't cost much
+        state = GalaxyDict(
+            nodes=[self._star_dict(star) for star in stars],
             links=[],
         )
         for path in lanes:
-            json["links"].append(
+            state["links"].append(
                 {
                     "source": path.star1_owner,
                     "target": path.star2_owner,
                     "value": path.distance,
                 }
             )
-        self.state = json
+        self.set_state(state)
         self.save()
         self.logger.info(f"{self} is now ready!")
+
+    def neighbourhood(self, user_id: int, depth: int = 1) -> GalaxyDict:
+        """Return the part of the galaxy surrounding the star of the given user.
+
+        This allows to display the galaxy progressively,
+        without loading its whole state.
+
+        :param user_id: the id of the owner of the star at the center
+        :param depth: the maximum number of lanes between the star at the center
+                      and the other stars
+        :raises GalaxyStar.DoesNotExist: if the user is not a citizen of the galaxy
+        :return: the stars within `depth` lanes of the star of the user
+                 and the lanes between them, in the same format as :attr:`state`
+        """
+        center = self.stars.values_list("id", flat=True).get(owner_id=user_id)
+        stars = {center}
+        frontier = {center}
+        for _ in range(depth):
+            lanes = GalaxyLane.objects.filter(
+                Q(star1__in=frontier) | Q(star2__in=frontier)
+            ).values_list("star1_id", "star2_id")
+            frontier = set(itertools.chain.from_iterable(lanes)) - stars
+            if not frontier:
+                break
+            stars |= frontier
+        return GalaxyDict(
+            nodes=[
+                self._star_dict(star)
+                for star in self._named_stars().filter(id__in=stars).order_by("owner")
+            ],
+            links=[
+                {
+                    "source": lane.star1_owner,
+                    "target": lane.star2_owner,
+                    "value": lane.distance,
+                }
+                for lane in self._named_lanes()
+                .filter(star1__in=stars, star2__in=stars)
+                .order_by("star1")
+            ],
+        )
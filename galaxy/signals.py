@@ -0,0 +1,32 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from club.models import Membership
+from core.models import User
+from galaxy.models import GalaxyChange
+from sas.models import PeoplePictureRelation
+
+
+@receiver(post_save, sender=PeoplePictureRelation, dispatch_uid="galaxy_picture_saved")
+@receiver(
+    post_delete, sender=PeoplePictureRelation, dispatch_uid="galaxy_picture_deleted"
+)
+@receiver(post_save, sender=Membership, dispatch_uid="galaxy_membership_saved")
+@receiver(post_delete, sender=Membership, dispatch_uid="galaxy_membership_deleted")
+def user_relations_changed(sender, instance, **kwargs):
+    """Record that the galaxy relations of the user have changed."""
+    GalaxyChange.mark([instance.user_id])
+
+
+@receiver(
+    m2m_changed, sender=User.godfathers.through, dispatch_uid="galaxy_family_changed"
+)
+def user_family_changed(sender, instance: User, action, reverse, pk_set, **kwargs):
+    """Record that the family of the user and of their relatives have changed."""
+    if action == "pre_clear":
+        # The removed relatives are only known before the clear
+        relatives = instance.godchildren if reverse else instance.godfathers
+        pk_set = set(relatives.values_list("id", flat=True))
+    elif action not in ("post_add", "post_remove"):
+        return
+    GalaxyChange.mark([instance.pk, *pk_set])
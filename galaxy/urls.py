@@ -31,6 +31,11 @@ urlpatterns = [
         GalaxyUserView.as_view(),
         name="user",
     ),
+    path(
+        "<int:user_id>/neighbourhood.json",
+        GalaxyNeighbourhoodView.as_view(),
+        name="neighbourhood",
+    ),
     path(
         "data.json",
         GalaxyDataView.as_view(),
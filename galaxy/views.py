@@ -21,9 +21,14 @@
 #
 #
 
+import gzip
+import re
+
 from django.db.models import Case, F, Q, Value, When
 from django.db.models.functions import Concat
-from django.http import Http404, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import DetailView, View
 
@@ -33,7 +38,9 @@ from core.views import (
     FormerSubscriberMixin,
     UserTabsMixin,
 )
-from galaxy.models import Galaxy, GalaxyLane
+from galaxy.models import Galaxy, GalaxyLane, GalaxyStar
+
+re_accepts_gzip = re.compile(r"\bgzip\b")
 
 
 class GalaxyUserView(CanViewMixin, UserTabsMixin, DetailView):
@@ -96,5 +103,66 @@ class GalaxyUserView(CanViewMixin, UserTabsMixin, DetailView):
 
 
 class GalaxyDataView(FormerSubscriberMixin, View):
+    """Serve the state of the current galaxy.
+
+    The state is served as it was serialized and compressed
+    when the galaxy was ruled, along with its ETag,
+    so that browsers only download it again when it changed.
+    """
+
     def get(self, request, *args, **kwargs):
-        return JsonResponse(Galaxy.get_current_galaxy().state)
+        # The state is big : it is only read when it must be sent,
+        # and only in its compressed form.
+        galaxies = Galaxy.objects.filter(state__isnull=False)
+        current = galaxies.values("pk", "state_etag").last()
+        if current is None:
+            raise Http404(_("The galaxy has not been ruled yet"))
+        galaxies = galaxies.filter(pk=current["pk"])
+        if not current["state_etag"]:
+            # Galaxy ruled before its state was stored compressed
+            galaxy = galaxies.get()
+            galaxy.set_state(galaxy.state)
+            galaxy.save(update_fields=["compressed_state", "state_etag"])
+            current["state_etag"] = galaxy.state_etag
+        etag = quote_etag(current["state_etag"])
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content = bytes(galaxies.values_list("compressed_state", flat=True).get())
+            compressed = re_accepts_gzip.search(
+                request.headers.get("Accept-Encoding", "")
+            )
+            if not compressed:
+                content = gzip.decompress(content)
+            response = HttpResponse(content, content_type="application/json")
+            if compressed:
+                response.headers["Content-Encoding"] = "gzip"
+        response.headers["ETag"] = etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+
+class GalaxyNeighbourhoodView(FormerSubscriberMixin, View):
+    """Serve the part of the current galaxy surrounding a citizen.
+
+    The number of lanes between the citizen and the other stars
+    is given by the `depth` parameter, which defaults to 1.
+    """
+
+    max_depth = 3
+
+    def get(self, request, *args, user_id: int, **kwargs):
+        # The neighbourhood is read from the stars and the lanes,
+        # so the state of the galaxy isn't needed
+        galaxy = Galaxy.objects.filter(state__isnull=False).only("pk").last()
+        if galaxy is None:
+            raise Http404(_("The galaxy has not been ruled yet"))
+        try:
+            depth = int(request.GET.get("depth", 1))
+        except ValueError:
+            return HttpResponseBadRequest()
+        if not 0 <= depth <= self.max_depth:
+            return HttpResponseBadRequest()
+        try:
+            return JsonResponse(galaxy.neighbourhood(user_id, depth))
+        except GalaxyStar.DoesNotExist as e:
+            raise Http404(_("This citizen has not yet joined the galaxy")) from e
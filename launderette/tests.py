@@ -12,5 +12,53 @@
 # OR WITHIN THE LOCAL FILE "LICENSE"
 #
 #
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from pytest_django.asserts import assertRedirects
 
-# Create your tests here.
+from core.baker_recipes import subscriber_user
+from core.models import User
+from counter.models import Counter, Customer
+from launderette.models import Launderette, Machine, Slot
+
+
+class TestLaunderetteMainClick(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = User.objects.get(username="root")
+        cls.launderette = baker.make(
+            Launderette, counter=baker.make(Counter, type="OFFICE")
+        )
+        cls.customer = Customer.get_or_create(subscriber_user.make())[0]
+        cls.url = reverse(
+            "launderette:main_click", kwargs={"launderette_id": cls.launderette.id}
+        )
+
+    def test_user_without_slot(self):
+        self.client.force_login(self.root)
+        res = self.client.post(self.url, {"code": self.customer.account_id})
+        assert res.status_code == 200
+        assert "User has booked no slot" in res.content.decode()
+
+    def test_user_with_slot(self):
+        baker.make(
+            Slot,
+            user=self.customer.user,
+            machine=baker.make(Machine, launderette=self.launderette),
+            start_date=timezone.now(),
+        )
+        self.client.force_login(self.root)
+        res = self.client.post(self.url, {"code": self.customer.account_id})
+        assertRedirects(
+            res,
+            reverse(
+                "launderette:click",
+                kwargs={
+                    "launderette_id": self.launderette.id,
+                    "user_id": self.customer.user_id,
+                },
+            ),
+            fetch_redirect_response=False,
+        )
@@ -320,8 +320,7 @@ class LaunderetteAdminView(CanEditPropMixin, BaseFormView, DetailView):
 class GetLaunderetteUserForm(GetUserForm):
     def clean(self):
         cleaned_data = super().clean()
-        sub = cleaned_data["user"]
-        if sub.slots.all().count() <= 0:
+        if not Slot.objects.filter(user_id=cleaned_data["user_id"]).exists():
             raise forms.ValidationError(_("User has booked no slot"))
         return cleaned_data
 
@@ -29,6 +29,7 @@ from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
+from core.fields import RenderedMarkdownField
 from core.models import User
 
 # Create your models here.
@@ -205,6 +206,7 @@ class UVComment(models.Model):
         UV, related_name="comments", verbose_name=_("uv"), on_delete=models.CASCADE
     )
     comment = models.TextField(_("comment"), blank=True)
+    comment_html = RenderedMarkdownField(source="comment")
     grade_global = models.IntegerField(
         _("global grade"),
         validators=[validators.MinValueValidator(-1), validators.MaxValueValidator(4)],
@@ -1,3 +1,6 @@
+from typing import Annotated, Literal
+
+from annotated_types import Interval
 from django.conf import settings
 from django.db.models import F
 from django.urls import reverse
@@ -11,8 +14,19 @@ from pydantic import NonNegativeInt
 
 from core.api_permissions import CanView, IsOwner
 from core.models import Notification, User
-from sas.models import PeoplePictureRelation, Picture
-from sas.schemas import IdentifiedUserSchema, PictureFilterSchema, PictureSchema
+from galaxy.models import GalaxyChange
+from sas.models import AlbumVisibility, PeoplePictureRelation, Picture
+from sas.schemas import (
+    IdentifiedUserSchema,
+    PictureFeedFilterSchema,
+    PictureFeedSchema,
+    PictureFilterSchema,
+    PictureSchema,
+)
+from sas.uploads import rotate_pictures
+
+MAX_FEED_SIZE = 200
+"""The maximum number of pictures in a page of the picture feed."""
 
 
 @api_controller("/sas/picture")
@@ -51,6 +65,49 @@ class PicturesController(ControllerBase):
             .annotate(album=F("parent__name"))
         )
 
+    @route.get(
+        "/feed",
+        response=PictureFeedSchema,
+        permissions=[IsAuthenticated],
+        url_name="picture_feed",
+    )
+    def fetch_picture_feed(
+        self,
+        filters: Query[PictureFeedFilterSchema],
+        cursor: int | None = None,
+        limit: Annotated[int, Interval(gt=0, le=MAX_FEED_SIZE)] = 100,
+    ):
+        """Return a page of the pictures viewable by the user, for an infinite scroll.
+
+        Unlike the `pictures` route, the pages are selected with a cursor
+        instead of an offset, so fetching the last pages of a user identified
+        on thousands of pictures is as fast as fetching the first one.
+
+        Args:
+            filters: the album or the identified user of the pictures
+            cursor: the `next_cursor` of the previous page,
+                or None to get the first page
+            limit: the maximum number of pictures of the page
+        """
+        user: User = self.context.request.user
+        pictures = filters.filter(Picture.objects.viewable_by(user)).feed_order()
+        if cursor is not None:
+            pictures = pictures.after(cursor)
+        # fetch one more picture, to know the neighbour of the last one
+        pictures = list(
+            pictures.select_related("owner").annotate(album=F("parent__name"))[
+                : limit + 1
+            ]
+        )
+        results = pictures[:limit]
+        for i, picture in enumerate(results):
+            picture.previous_id = results[i - 1].id if i > 0 else cursor
+            picture.next_id = pictures[i + 1].id if i + 1 < len(pictures) else None
+        return {
+            "results": results,
+            "next_cursor": results[-1].id if len(pictures) > limit else None,
+        }
+
     @route.get(
         "/{picture_id}/identified",
         permissions=[IsAuthenticated, CanView],
@@ -75,6 +132,9 @@ class PicturesController(ControllerBase):
             PeoplePictureRelation(user=u, picture_id=picture_id) for u in identified
         ]
         PeoplePictureRelation.objects.bulk_create(relations)
+        # bulk_create doesn't send the post_save signals of the relations
+        AlbumVisibility.refresh(u.id for u in identified)
+        GalaxyChange.mark(u.id for u in identified)
         for u in identified:
             Notification.objects.get_or_create(
                 user=u,
@@ -97,6 +157,14 @@ class PicturesController(ControllerBase):
         picture.asked_for_removal = False
         picture.save()
 
+    @route.patch("/{picture_id}/rotate", permissions=[IsOwner])
+    def rotate_picture(self, picture_id: int, degree: Literal[90, 180, 270]):
+        """Rotate a picture counterclockwise.
+
+        The thumbnails of the picture are generated again in the background.
+        """
+        rotate_pictures([self.get_object_or_exception(Picture, pk=picture_id)], degree)
+
 
 @api_controller("/sas/relation", tags="User identification on SAS pictures")
 class UsersIdentifiedController(ControllerBase):
@@ -0,0 +1,25 @@
+#
+# Copyright 2023 © AE UTBM
+# ae@utbm.fr / ae.info@utbm.fr
+#
+# This file is part of the website of the UTBM Student Association (AE UTBM),
+# https://ae.utbm.fr.
+#
+# You can find the source code of the website at https://github.com/ae-utbm/sith3
+#
+# LICENSED UNDER THE GNU GENERAL PUBLIC LICENSE VERSION 3 (GPLv3)
+# SEE : https://raw.githubusercontent.com/ae-utbm/sith3/master/LICENSE
+# OR WITHIN THE LOCAL FILE "LICENSE"
+#
+#
+
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class SasConfig(AppConfig):
+    name = "sas"
+    verbose_name = _("SAS")
+
+    def ready(self):
+        import sas.signals  # noqa F401
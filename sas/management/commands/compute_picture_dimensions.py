@@ -0,0 +1,56 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from sas.models import Picture
+
+
+def _compute(picture: Picture) -> Picture | None:
+    try:
+        picture.compute_metadata()
+    except Exception:
+        logging.getLogger("main").exception(
+            "Couldn't read the dimensions of the picture %s", picture.id
+        )
+        return None
+    return picture
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the dimensions and the dominant colour of the SAS pictures "
+        "uploaded before they were stored with the thumbnails."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="The number of pictures read at the same time",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="The number of pictures saved by each query",
+        )
+
+    def handle(self, *args, **options):
+        pictures = Picture.objects.filter(width=None).only("id", "file").order_by("id")
+        nb_computed = 0
+        # only the files are read by the threads ;
+        # the database is queried and updated by the main thread
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            last_id = 0
+            while batch := list(
+                pictures.filter(id__gt=last_id)[: options["batch_size"]]
+            ):
+                computed = [p for p in executor.map(_compute, batch) if p]
+                Picture.objects.bulk_update(
+                    computed, fields=["width", "height", "dominant_color"]
+                )
+                nb_computed += len(computed)
+                last_id = batch[-1].id
+        self.stdout.write(f"{nb_computed} pictures have been processed.")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from sas.models import Picture
+from sas.uploads import render_pictures
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the thumbnails of the SAS pictures which are still processing, "
+        "for example because the server was restarted during an upload."
+    )
+
+    def handle(self, *args, **options):
+        pending = Picture.objects.filter(Q(thumbnail="") | Q(thumbnail=None))
+        nb_rendered = render_pictures(list(pending.values_list("id", flat=True)))
+        self.stdout.write(f"{nb_rendered} pictures have been processed.")
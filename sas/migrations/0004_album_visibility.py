@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_visibilities(apps, schema_editor):
+    """Store the albums visible by each user identified on a moderated picture."""
+    SithFile = apps.get_model("core", "SithFile")
+    PeoplePictureRelation = apps.get_model("sas", "PeoplePictureRelation")
+    AlbumVisibility = apps.get_model("sas", "AlbumVisibility")
+    parents = dict(
+        SithFile.objects.filter(is_in_sas=True, is_folder=True).values_list(
+            "id", "parent_id"
+        )
+    )
+    identifications = PeoplePictureRelation.objects.filter(
+        picture__is_moderated=True
+    ).values_list("user_id", "picture__parent_id")
+    visibilities = set()
+    for user_id, album_id in identifications.iterator():
+        while album_id in parents and (user_id, album_id) not in visibilities:
+            visibilities.add((user_id, album_id))
+            album_id = parents[album_id]
+    AlbumVisibility.objects.bulk_create(
+        (AlbumVisibility(user_id=u, album_id=a) for u, a in visibilities),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("sas", "0003_sasfile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlbumVisibility",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "album",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visibilities",
+                        to="sas.album",
+                        verbose_name="album",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visible_albums",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "album")},
+            },
+        ),
+        migrations.RunPython(fill_visibilities, reverse_code=migrations.RunPython.noop),
+    ]
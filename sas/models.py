@@ -17,19 +17,24 @@ from __future__ import annotations
 
 from io import BytesIO
 from pathlib import Path
-from typing import ClassVar, Self
+from typing import ClassVar, Iterable, Literal, Self
 
 from django.conf import settings
 from django.core.cache import cache
-from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db import models, transaction
+from django.db.models import Q, Subquery
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from PIL import Image
 
 from core.models import SithFile, User
-from core.utils import exif_auto_rotate, resize_image
+from core.utils import (
+    dominant_color,
+    exif_auto_rotate,
+    resize_image,
+    set_jpeg_rotation,
+)
 
 
 class SasFile(SithFile):
@@ -75,6 +80,30 @@ class PictureQuerySet(models.QuerySet):
             return self.filter(is_moderated=True)
         return self.filter(people__user_id=user.id, is_moderated=True)
 
+    def feed_order(self) -> Self:
+        """Order the pictures album by album, the most recent albums first.
+
+        Inside an album, the pictures are ordered by upload.
+        """
+        return self.order_by("-parent__date", "-parent_id", "id")
+
+    def after(self, picture_id: int) -> Self:
+        """Filter the pictures which come after the given one,
+        in the order of [feed_order][sas.models.PictureQuerySet.feed_order].
+
+        The position of the given picture is read by subqueries,
+        so that a page of pictures can be fetched in a single query,
+        without any `OFFSET`.
+        """
+        cursor = Picture.objects.filter(pk=picture_id)
+        album_date = Subquery(cursor.values("parent__date"))
+        album_id = Subquery(cursor.values("parent_id"))
+        return self.filter(
+            Q(parent__date__lt=album_date)
+            | Q(parent__date=album_date, parent_id__lt=album_id)
+            | Q(parent__date=album_date, parent_id=album_id, id__gt=picture_id)
+        )
+
 
 class SASPictureManager(models.Manager):
     def get_queryset(self):
@@ -88,11 +117,47 @@ class Picture(SasFile):
     objects = SASPictureManager.from_queryset(PictureQuerySet)()
 
     @property
-    def is_vertical(self):
-        with open(settings.MEDIA_ROOT / self.file.name, "rb") as f:
-            im = Image.open(BytesIO(f.read()))
-            (w, h) = im.size
-            return (w / h) < 1
+    def is_processing(self) -> bool:
+        """True until the thumbnails of an uploaded picture have been generated."""
+        return not self.thumbnail
+
+    @property
+    def is_vertical(self) -> bool:
+        if self.width is None or self.height is None:
+            # the picture has been uploaded before its dimensions were stored
+            self.compute_metadata()
+        return self.height > self.width
+
+    @property
+    def orientation(self) -> Literal["portrait", "landscape", "square"]:
+        if self.is_vertical:
+            return "portrait"
+        return "square" if self.width == self.height else "landscape"
+
+    def _set_metadata(self, im: Image.Image, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.dominant_color = dominant_color(im)
+
+    def compute_metadata(self):
+        """Read the dimensions and the dominant colour of the picture from its file.
+
+        Only a reduced version of the picture is decoded,
+        which is much faster than generating the thumbnails.
+        The picture isn't saved.
+        """
+        with self.file.open("rb") as f:
+            im = Image.open(f)
+            width, height = im.size
+            # let the JPEG decoder skip most of the pixels
+            im.draft("RGB", (64, 64))
+            try:
+                rotated = exif_auto_rotate(im)
+            except:
+                rotated = im
+            if rotated.size != im.size:
+                width, height = height, width
+            self._set_metadata(rotated, width, height)
 
     def get_download_url(self):
         return reverse("sas:download", kwargs={"picture_id": self.id})
@@ -106,48 +171,81 @@ class Picture(SasFile):
     def get_absolute_url(self):
         return reverse("sas:picture", kwargs={"picture_id": self.id})
 
-    def generate_thumbnails(self, *, overwrite=False):
+    def _open_rotated(self) -> Image.Image:
         im = Image.open(BytesIO(self.file.read()))
         try:
             im = exif_auto_rotate(im)
         except:
             pass
+        self._set_metadata(im, *im.size)
+        return im
+
+    def _set_variants(self, im: Image.Image, *, overwrite: bool):
         # convert the compressed image and the thumbnail into webp
-        # The original image keeps its original type, because it's not
-        # meant to be shown on the website, but rather to keep the real image
-        # for less frequent cases (like downloading the pictures of an user)
-        extension = self.mime_type.split("/")[-1]
-        file = resize_image(im, max(im.size), extension)
         thumb = resize_image(im, 200, "webp")
         compressed = resize_image(im, 1200, "webp")
         if overwrite:
-            self.file.delete()
-            self.thumbnail.delete()
-            self.compressed.delete()
+            self.thumbnail.delete(save=False)
+            self.compressed.delete(save=False)
         new_extension_name = str(Path(self.name).with_suffix(".webp"))
-        self.file = file
-        self.file.name = self.name
         self.thumbnail = thumb
         self.thumbnail.name = new_extension_name
         self.compressed = compressed
         self.compressed.name = new_extension_name
-        self.save()
-
-    def rotate(self, degree):
-        for attr in ["file", "compressed", "thumbnail"]:
-            name = self.__getattribute__(attr).name
-            with open(settings.MEDIA_ROOT / name, "r+b") as file:
-                if file:
-                    im = Image.open(BytesIO(file.read()))
-                    file.seek(0)
-                    im = im.rotate(degree, expand=True)
-                    im.save(
-                        fp=file,
-                        format=self.mime_type.split("/")[-1].upper(),
-                        quality=90,
-                        optimize=True,
-                        progressive=True,
-                    )
+
+    def generate_thumbnails(self, *, overwrite=False):
+        im = self._open_rotated()
+        # The original image keeps its original type, because it's not
+        # meant to be shown on the website, but rather to keep the real image
+        # for less frequent cases (like downloading the pictures of an user)
+        extension = self.mime_type.split("/")[-1]
+        file = resize_image(im, max(im.size), extension)
+        if overwrite:
+            self.file.delete(save=False)
+        self.file = file
+        self.file.name = self.name
+        self._set_variants(im, overwrite=overwrite)
+        # the moderators have already been told about the picture when it was uploaded
+        self.save(notify_moderators=False)
+
+    def generate_variants(self):
+        """Generate again the compressed version and the thumbnail of the picture,
+        from its original file, which is left as is.
+        """
+        self._set_variants(self._open_rotated(), overwrite=True)
+        self.save(notify_moderators=False)
+
+    def rotate(self, degree: int):
+        """Rotate the original file of the picture counterclockwise.
+
+        JPEG pictures are rotated through their EXIF orientation,
+        so that they aren't encoded again and keep their quality.
+        The compressed version and the thumbnail are left as is :
+        they must be generated again with
+        [generate_variants][sas.models.Picture.generate_variants].
+
+        Args:
+            degree: the rotation, a multiple of 90
+        """
+        with self.file.open("rb") as f:
+            data = f.read()
+        if self.mime_type == "image/jpeg":
+            data = set_jpeg_rotation(data, degree)
+        else:
+            # the pictures in other formats are encoded again, without loss
+            im = Image.open(BytesIO(data))
+            content = BytesIO()
+            im.rotate(degree, expand=True).save(
+                content, format=im.format, lossless=True
+            )
+            data = content.getvalue()
+        with self.file.storage.open(self.file.name, "wb") as f:
+            f.write(data)
+        if degree % 180 and self.width is not None and self.height is not None:
+            self.width, self.height = self.height, self.width
+            Picture.objects.filter(id=self.id).update(
+                width=self.width, height=self.height
+            )
 
     def get_next(self):
         if self.is_moderated:
@@ -185,17 +283,10 @@ class AlbumQuerySet(models.QuerySet):
             return self.all()
         if user.was_subscribed:
             return self.filter(is_moderated=True)
-        # known bug : if all children of an album are also albums
-        # then this album is excluded, even if one of the sub-albums should be visible.
-        # The fs-like navigation is likely to be half-broken for non-subscribers,
-        # but that's ok, since non-subscribers are expected to see only the albums
-        # containing pictures on which they have been identified (hence, very few).
-        # Most, if not all, of their albums will be displayed on the
-        # `latest albums` section of the SAS.
-        # Moreover, they will still see all of their picture in their profile.
-        return self.filter(
-            Exists(Picture.objects.filter(parent_id=OuterRef("pk")).viewable_by(user))
-        )
+        # Non-subscribers can see the albums containing, directly or
+        # in one of their sub-albums, a picture on which they have been identified.
+        # Those albums are precomputed in the AlbumVisibility table.
+        return self.filter(visibilities__user_id=user.id)
 
 
 class SASAlbumManager(models.Manager):
@@ -287,3 +378,87 @@ class PeoplePictureRelation(models.Model):
 
     def __str__(self):
         return self.user.get_display_name() + " - " + str(self.picture)
+
+
+class AlbumVisibility(models.Model):
+    """An album that a user can see without being subscribed.
+
+    A user who isn't subscribed can see the albums containing
+    a moderated picture on which they have been identified,
+    either directly or in one of their sub-albums.
+    Those albums are stored in this table, so that the albums viewable
+    by a user can be listed with a simple join.
+
+    The albums visible by a user are computed again by
+    [AlbumVisibility.refresh][sas.models.AlbumVisibility.refresh]
+    each time the user is identified on a picture or unidentified from it,
+    and each time a picture they are identified on is moderated,
+    moved or deleted (see `sas/signals.py`).
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("user"),
+        related_name="visible_albums",
+        on_delete=models.CASCADE,
+    )
+    album = models.ForeignKey(
+        Album,
+        verbose_name=_("album"),
+        related_name="visibilities",
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        unique_together = ["user", "album"]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.album_id}"
+
+    @classmethod
+    def refresh(cls, user_ids: Iterable[int]) -> None:
+        """Compute again the albums visible by the given users.
+
+        The rows of the users are locked during the computation,
+        so that concurrent refreshes of the same user are run one after another.
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        with transaction.atomic():
+            # always lock the users in the same order, to avoid deadlocks
+            list(
+                User.objects.select_for_update()
+                .filter(id__in=user_ids)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            cls.objects.filter(user_id__in=user_ids).delete()
+            cls.objects.bulk_create(
+                cls(user_id=user_id, album_id=album_id)
+                for user_id, album_id in cls._compute(user_ids)
+            )
+
+    @staticmethod
+    def _compute(user_ids: list[int]) -> set[tuple[int, int]]:
+        """Return the pairs of user id and album id of the visible albums."""
+        identifications = set(
+            PeoplePictureRelation.objects.filter(
+                user_id__in=user_ids, picture__is_moderated=True
+            ).values_list("user_id", "picture__parent_id")
+        )
+        # fetch the parents of the albums, one level of the tree at a time
+        parents: dict[int, int | None] = {}
+        to_fetch = {album_id for _, album_id in identifications}
+        while to_fetch:
+            fetched = dict(
+                Album.objects.filter(id__in=to_fetch).values_list("id", "parent_id")
+            )
+            parents.update(fetched)
+            to_fetch = {p for p in fetched.values() if p and p not in parents}
+        visibilities = set()
+        for user_id, album_id in identifications:
+            while album_id in parents and (user_id, album_id) not in visibilities:
+                visibilities.add((user_id, album_id))
+                album_id = parents[album_id]
+        return visibilities
@@ -14,16 +14,32 @@ class PictureFilterSchema(FilterSchema):
     album_id: int | None = Field(None, q="parent_id")
 
 
+class PictureFeedFilterSchema(FilterSchema):
+    album_id: int | None = Field(None, q="parent_id")
+    user_id: int | None = Field(None, q="people__user_id")
+
+
 class PictureSchema(ModelSchema):
     class Meta:
         model = Picture
-        fields = ["id", "name", "date", "size", "is_moderated", "asked_for_removal"]
+        fields = [
+            "id",
+            "name",
+            "date",
+            "size",
+            "width",
+            "height",
+            "dominant_color",
+            "is_moderated",
+            "asked_for_removal",
+        ]
 
     owner: UserProfileSchema
     full_size_url: str
     compressed_url: str
     thumb_url: str
     album: str
+    is_processing: bool
 
     @staticmethod
     def resolve_full_size_url(obj: Picture) -> str:
@@ -31,6 +47,9 @@ class PictureSchema(ModelSchema):
 
     @staticmethod
     def resolve_compressed_url(obj: Picture) -> str:
+        if obj.is_processing:
+            # the compressed version doesn't exist yet
+            return obj.get_download_url()
         return obj.get_download_compressed_url()
 
     @staticmethod
@@ -38,6 +57,19 @@ class PictureSchema(ModelSchema):
         return obj.get_download_thumb_url()
 
 
+class PictureFeedItemSchema(PictureSchema):
+    previous_id: int | None
+    """The picture before this one in the feed, even if it isn't in this page."""
+    next_id: int | None
+    """The picture after this one in the feed, even if it isn't in this page."""
+
+
+class PictureFeedSchema(Schema):
+    results: list[PictureFeedItemSchema]
+    next_cursor: int | None
+    """The cursor of the next page, or None if this page is the last one."""
+
+
 class PictureRelationCreationSchema(Schema):
     picture: NonNegativeInt
     users: list[NonNegativeInt]
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import SithFile
+from sas.models import Album, AlbumVisibility, PeoplePictureRelation, Picture
+
+
+@receiver(
+    post_save, sender=PeoplePictureRelation, dispatch_uid="sas_identification_saved"
+)
+@receiver(
+    post_delete, sender=PeoplePictureRelation, dispatch_uid="sas_identification_deleted"
+)
+def identification_changed(sender, instance: PeoplePictureRelation, **kwargs):
+    """Compute again the albums visible by the identified user."""
+    AlbumVisibility.refresh([instance.user_id])
+
+
+# the signals of a proxy model are sent with the proxy as sender
+@receiver(post_save, sender=SithFile, dispatch_uid="sas_file_saved")
+@receiver(post_save, sender=Picture, dispatch_uid="sas_picture_saved")
+@receiver(post_save, sender=Album, dispatch_uid="sas_album_saved")
+def sas_file_saved(sender, instance: SithFile, *, created: bool, **kwargs):
+    """Compute again the albums visible by the users concerned by a file of the SAS.
+
+    The picture may have been moderated or moved,
+    and the album may have been moved.
+    Saving a file without changing that (like when its thumbnails
+    are generated) doesn't require anything to be computed again.
+    """
+    loaded = getattr(instance, "_loaded_visibility", None)
+    instance._loaded_visibility = instance.visibility
+    if created:
+        # nobody can be identified on a new picture
+        return
+    if loaded == instance.visibility:
+        return
+    was_in_sas = loaded is None or loaded[0]
+    if not was_in_sas and not instance.is_in_sas:
+        return
+    if instance.is_folder:
+        users = AlbumVisibility.objects.filter(album_id=instance.id)
+    else:
+        users = PeoplePictureRelation.objects.filter(picture_id=instance.id)
+    AlbumVisibility.refresh(users.values_list("user_id", flat=True))
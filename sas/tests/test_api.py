@@ -6,7 +6,8 @@ from model_bakery import baker
 from pytest_django.asserts import assertNumQueries
 
 from core.baker_recipes import old_subscriber_user, subscriber_user
-from core.models import RealGroup, User
+from core.models import RealGroup, User, get_group
+from galaxy.models import GalaxyChange
 from sas.baker_recipes import picture_recipe
 from sas.models import Album, PeoplePictureRelation, Picture
 
@@ -118,14 +119,82 @@ class TestPictureSearch(TestSas):
     def test_num_queries(self):
         """Test that the number of queries is stable."""
         self.client.force_login(subscriber_user.make())
-        with assertNumQueries(5):
+        get_group(pk=settings.SITH_GROUP_PUBLIC_ID)  # load the group registry
+        with assertNumQueries(6):
             # 1 request to fetch the user from the db
-            # 2 requests to check the user permissions
+            # 3 requests to build the permission snapshot of the user
             # 1 request to fetch the pictures
             # 1 request to count the total number of items in the pagination
             self.client.get(self.url)
 
 
+class TestPictureFeed(TestSas):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.url = reverse("api:picture_feed")
+
+    def fetch_all(self, query: str, limit: int) -> list[dict]:
+        pictures = []
+        cursor = None
+        while True:
+            url = f"{self.url}?{query}&limit={limit}"
+            if cursor is not None:
+                url += f"&cursor={cursor}"
+            res = self.client.get(url)
+            assert res.status_code == 200
+            pictures.extend(res.json()["results"])
+            cursor = res.json()["next_cursor"]
+            if cursor is None:
+                return pictures
+
+    def test_anonymous_user_forbidden(self):
+        res = self.client.get(self.url)
+        assert res.status_code == 403
+
+    def test_filter_by_album(self):
+        self.client.force_login(self.user_b)
+        pictures = self.fetch_all(f"album_id={self.album_a.id}", limit=2)
+        expected = list(
+            self.album_a.children_pictures.order_by("id").values_list("id", flat=True)
+        )
+        assert [p["id"] for p in pictures] == expected
+        assert [p["previous_id"] for p in pictures] == [None, *expected[:-1]]
+        assert [p["next_id"] for p in pictures] == [*expected[1:], None]
+
+    def test_filter_by_user(self):
+        self.client.force_login(self.user_b)
+        pictures = self.fetch_all(f"user_id={self.user_a.id}", limit=4)
+        expected = list(
+            self.user_a.pictures.order_by(
+                "-picture__parent__date", "-picture__parent_id", "picture_id"
+            ).values_list("picture_id", flat=True)
+        )
+        assert [p["id"] for p in pictures] == expected
+
+    def test_not_subscribed_user(self):
+        """An unsubscribed user only gets the pictures they are identified on."""
+        user = baker.make(User)
+        picture = self.album_a.children_pictures.first()
+        baker.make(PeoplePictureRelation, picture=picture, user=user)
+        self.client.force_login(user)
+        pictures = self.fetch_all(f"user_id={self.user_a.id}", limit=4)
+        assert pictures == []
+        pictures = self.fetch_all(f"album_id={self.album_a.id}", limit=4)
+        assert [p["id"] for p in pictures] == [picture.id]
+
+    def test_num_queries(self):
+        """Test that a page is fetched in a single query, whatever the cursor."""
+        self.client.force_login(subscriber_user.make())
+        get_group(pk=settings.SITH_GROUP_PUBLIC_ID)  # load the group registry
+        cursor = self.album_a.children_pictures.order_by("id")[2].id
+        with assertNumQueries(5):
+            # 1 request to fetch the user from the db
+            # 3 requests to build the permission snapshot of the user
+            # 1 request to fetch the pictures
+            self.client.get(f"{self.url}?cursor={cursor}")
+
+
 class TestPictureRelation(TestSas):
     def test_delete_relation_route_forbidden(self):
         """Test that unauthorized users are properly 403ed"""
@@ -170,3 +239,25 @@ class TestPictureRelation(TestSas):
         res = self.client.delete(f"/api/sas/relation/{relation.id}")
         assert res.status_code == 404
         assert PeoplePictureRelation.objects.count() == relation_count
+
+
+class TestIdentifyUsers(TestSas):
+    def test_identify_users(self):
+        """Test that the identified users are recorded as galaxy changes."""
+        GalaxyChange.objects.all().delete()
+        picture = self.album_a.children_pictures.order_by("id").first()
+        self.client.force_login(self.user_b)
+        res = self.client.put(
+            f"/api/sas/picture/{picture.id}/identified",
+            [self.user_a.id, self.user_c.id],
+            content_type="application/json",
+        )
+        assert res.status_code == 200
+        assert set(picture.people.values_list("user_id", flat=True)) == {
+            self.user_a.id,
+            self.user_c.id,
+        }
+        assert set(GalaxyChange.objects.values_list("user_id", flat=True)) == {
+            self.user_a.id,
+            self.user_c.id,
+        }
@@ -1,10 +1,18 @@
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
 from django.test import TestCase
 from model_bakery import baker
+from PIL import Image
 
 from core.baker_recipes import old_subscriber_user, subscriber_user
 from core.models import User
 from sas.baker_recipes import picture_recipe
-from sas.models import Picture
+from sas.models import Album, AlbumVisibility, PeoplePictureRelation, Picture
+from sas.uploads import regenerate_pictures, rotate_pictures
 
 
 class TestPictureQuerySet(TestCase):
@@ -39,3 +47,131 @@ class TestPictureQuerySet(TestCase):
         user.pictures.create(picture=self.pictures[1])
         pictures = list(Picture.objects.viewable_by(user))
         assert pictures == [self.pictures[1]]
+
+
+class TestPictureMetadata(TestCase):
+    @staticmethod
+    def make_picture(orientation: int) -> Picture:
+        exif = Image.Exif()
+        exif[0x0112] = orientation  # the Orientation tag
+        content = BytesIO()
+        Image.new("RGB", (300, 200), color=(0, 0, 255)).save(
+            content, format="JPEG", exif=exif
+        )
+        return picture_recipe.make(
+            parent_id=settings.SITH_SAS_ROOT_DIR_ID,
+            file=ContentFile(content.getvalue(), name="metadata.jpg"),
+            mime_type="image/jpeg",
+        )
+
+    def test_stored_dimensions(self):
+        """The file isn't read when the dimensions are known."""
+        picture = picture_recipe.make(
+            parent_id=settings.SITH_SAS_ROOT_DIR_ID, width=100, height=200
+        )
+        assert picture.is_vertical
+        assert picture.orientation == "portrait"
+
+    def test_generate_thumbnails(self):
+        picture = self.make_picture(orientation=1)
+        picture.generate_thumbnails()
+        picture.refresh_from_db()
+        assert (picture.width, picture.height) == (300, 200)
+        assert picture.orientation == "landscape"
+        assert picture.dominant_color.startswith("#0000")
+
+    def test_backfill_command(self):
+        rotated = self.make_picture(orientation=6)
+        straight = self.make_picture(orientation=1)
+        call_command("compute_picture_dimensions", batch_size=1, stdout=StringIO())
+        rotated.refresh_from_db()
+        straight.refresh_from_db()
+        assert (rotated.width, rotated.height) == (200, 300)
+        assert (straight.width, straight.height) == (300, 200)
+        assert straight.dominant_color.startswith("#0000")
+
+    def test_rotate(self):
+        picture = self.make_picture(orientation=1)
+        picture.generate_thumbnails()
+        original = picture.file.read()
+        with self.captureOnCommitCallbacks() as callbacks:
+            rotate_pictures([picture], 90)
+        assert len(callbacks) == 1
+        picture.refresh_from_db()
+        assert (picture.width, picture.height) == (200, 300)
+        # only the EXIF segment of the original has changed
+        rotated = picture.file.read()
+        assert rotated.endswith(original[len(original) // 2 :])
+        assert Image.open(BytesIO(rotated)).getexif()[0x0112] == 8
+
+        assert regenerate_pictures([picture.id]) == 1
+        picture.refresh_from_db()
+        assert Image.open(picture.thumbnail).size == (133, 200)
+        assert picture.file.read() == rotated
+
+
+class TestAlbumVisibility(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = baker.make(User)
+        cls.album = baker.make(
+            Album, parent_id=settings.SITH_SAS_ROOT_DIR_ID, name="parent"
+        )
+        # the parent album contains only albums
+        cls.sub_album = baker.make(Album, parent=cls.album, name="child")
+        cls.other_album = baker.make(
+            Album, parent_id=settings.SITH_SAS_ROOT_DIR_ID, name="other"
+        )
+        cls.picture = picture_recipe.make(parent=cls.sub_album)
+
+    def viewable_albums(self) -> set[int]:
+        albums = Album.objects.viewable_by(self.user)
+        return set(albums.values_list("id", flat=True)) - {
+            settings.SITH_SAS_ROOT_DIR_ID
+        }
+
+    def test_nested_albums(self):
+        assert self.viewable_albums() == set()
+        relation = baker.make(
+            PeoplePictureRelation, user=self.user, picture=self.picture
+        )
+        assert self.viewable_albums() == {self.album.id, self.sub_album.id}
+        relation.delete()
+        assert self.viewable_albums() == set()
+
+    def test_moderation(self):
+        baker.make(PeoplePictureRelation, user=self.user, picture=self.picture)
+        self.picture.is_moderated = False
+        self.picture.save()
+        assert self.viewable_albums() == set()
+        self.picture.is_moderated = True
+        self.picture.save()
+        assert self.viewable_albums() == {self.album.id, self.sub_album.id}
+
+    def test_move(self):
+        baker.make(PeoplePictureRelation, user=self.user, picture=self.picture)
+        self.picture.move_to(self.other_album)
+        assert self.viewable_albums() == {self.other_album.id}
+        self.sub_album.move_to(self.other_album)
+        self.picture.move_to(self.sub_album)
+        assert self.viewable_albums() == {self.other_album.id, self.sub_album.id}
+
+    def test_num_queries(self):
+        baker.make(PeoplePictureRelation, user=self.user, picture=self.picture)
+        # load the rights of the user
+        list(Album.objects.viewable_by(self.user))
+        with self.assertNumQueries(1):
+            assert len(list(Album.objects.viewable_by(self.user))) >= 2
+
+    def test_save_without_change(self):
+        """Test that the visibilities are computed again only when they may change."""
+        baker.make(PeoplePictureRelation, user=self.user, picture=self.picture)
+        picture = Picture.objects.get(id=self.picture.id)
+        with patch.object(AlbumVisibility, "refresh") as refresh:
+            picture.width = 42
+            picture.save()
+            Album.objects.get(id=self.sub_album.id).save()
+            refresh.assert_not_called()
+            picture.is_moderated = not picture.is_moderated
+            picture.save()
+            refresh.assert_called_once()
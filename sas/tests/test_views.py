@@ -12,20 +12,25 @@
 # OR WITHIN THE LOCAL FILE "LICENSE"
 #
 #
+from io import BytesIO
 from typing import Callable
+from unittest import mock
 
 import pytest
 from django.conf import settings
 from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase
 from django.urls import reverse
 from model_bakery import baker
+from PIL import Image
 from pytest_django.asserts import assertRedirects
 
 from core.baker_recipes import old_subscriber_user, subscriber_user
-from core.models import RealGroup, User
+from core.models import RealGroup, SithFile, User
 from sas.baker_recipes import picture_recipe
 from sas.models import Album, Picture
+from sas.uploads import render_pictures
 
 # Create your tests here.
 
@@ -132,3 +137,44 @@ class TestSasModeration(TestCase):
         )
         assert res.status_code == 403
         assert Picture.objects.filter(pk=self.to_moderate.id).exists()
+
+
+class TestUpload(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.album = baker.make(
+            Album, parent_id=settings.SITH_SAS_ROOT_DIR_ID, name="upload"
+        )
+        cls.admin = subscriber_user.make(
+            groups=[RealGroup.objects.get(pk=settings.SITH_GROUP_SAS_ADMIN_ID)]
+        )
+
+    @staticmethod
+    def make_image(name: str) -> SimpleUploadedFile:
+        content = BytesIO()
+        Image.new("RGB", (300, 200)).save(content, format="JPEG")
+        return SimpleUploadedFile(name, content.getvalue(), content_type="image/jpeg")
+
+    def test_upload(self):
+        self.client.force_login(self.admin)
+        files = [self.make_image(f"{i}.jpg") for i in range(3)]
+        with (
+            mock.patch.object(SithFile, "notify_sas_moderators") as notify,
+            self.captureOnCommitCallbacks() as callbacks,
+        ):
+            res = self.client.post(
+                reverse("sas:album_upload", kwargs={"album_id": self.album.id}),
+                {"images": files},
+            )
+        assert res.status_code == 200
+        notify.assert_called_once()
+        assert len(callbacks) == 1
+        pictures = list(Picture.objects.filter(parent=self.album))
+        assert len(pictures) == 3
+        assert all(p.is_processing for p in pictures)
+
+        assert render_pictures([p.id for p in pictures]) == 3
+        for picture in Picture.objects.filter(parent=self.album):
+            assert not picture.is_processing
+            assert picture.compressed.name.endswith(".webp")
+            assert (picture.width, picture.height) == (300, 200)
@@ -0,0 +1,148 @@
+"""Upload of many pictures at once in the SAS.
+
+Generating the thumbnails of a picture means decoding it,
+rotating it according to its EXIF data and encoding it three times.
+Doing it for each picture inside the upload request made
+the upload of a whole event time out.
+
+Now, the original pictures are stored right away,
+and the thumbnails are generated by a pool of threads
+once the transaction of the upload is committed.
+Until then, the pictures are shown as being processed
+(see [Picture.is_processing][sas.models.Picture.is_processing]).
+Pillow releases the GIL while decoding and encoding images,
+so the threads of the pool really work in parallel.
+
+The same pool generates the thumbnails of the rotated pictures again
+(see [rotate_pictures][sas.uploads.rotate_pictures]).
+
+Example:
+    ```python
+    pictures, errors = upload_pictures(album, request.user, files)
+    ```
+"""
+
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.models import SithFile, User
+from sas.models import Picture
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sas")
+
+
+def upload_pictures(
+    parent: SithFile, owner: User, files: list[UploadedFile], *, automodere=False
+) -> tuple[list[Picture], dict[str, Exception]]:
+    """Store the given pictures in the album,
+    and generate their thumbnails in the background.
+
+    The SAS admins get a single notification for the whole upload.
+
+    Returns:
+        The stored pictures and the errors of the files that couldn't be stored,
+        by file name.
+    """
+    pictures = []
+    errors = {}
+    for f in files:
+        picture = Picture(
+            parent=parent,
+            name=f.name,
+            file=f,
+            owner=owner,
+            mime_type=f.content_type,
+            size=f.size,
+            is_folder=False,
+            is_moderated=automodere,
+        )
+        if automodere:
+            picture.moderator = owner
+        try:
+            picture.clean()
+            picture.save(notify_moderators=False)
+        except Exception as e:
+            errors[f.name] = e
+            continue
+        pictures.append(picture)
+    if pictures:
+        SithFile.notify_sas_moderators()
+        ids = [p.id for p in pictures]
+        transaction.on_commit(
+            lambda: _executor.submit(_run_in_thread, render_pictures, ids)
+        )
+    return pictures, errors
+
+
+def rotate_pictures(pictures: Iterable[Picture], degree: int) -> None:
+    """Rotate the pictures counterclockwise,
+    and generate their thumbnails again in the background.
+
+    Only the original files are rotated in the current thread,
+    which is fast and lossless for JPEG pictures
+    (see [Picture.rotate][sas.models.Picture.rotate]).
+    """
+    ids = []
+    for picture in pictures:
+        picture.rotate(degree)
+        ids.append(picture.id)
+    transaction.on_commit(
+        lambda: _executor.submit(_run_in_thread, regenerate_pictures, ids)
+    )
+
+
+def _run_in_thread(func: Callable[[list[int]], int], picture_ids: list[int]) -> None:
+    try:
+        func(picture_ids)
+    finally:
+        # each thread of the pool has its own connection,
+        # which must not be left open
+        connection.close()
+
+
+def render_pictures(picture_ids: list[int]) -> int:
+    """Generate the thumbnails of the given pictures.
+
+    Returns:
+        The number of pictures whose thumbnails have been generated.
+    """
+    nb_rendered = 0
+    pictures = Picture.objects.filter(id__in=picture_ids).filter(
+        Q(thumbnail="") | Q(thumbnail=None)
+    )
+    for picture in pictures:
+        try:
+            picture.generate_thumbnails(overwrite=True)
+        except Exception:
+            logging.getLogger("main").exception(
+                "Couldn't generate the thumbnails of the picture %s", picture.id
+            )
+            continue
+        nb_rendered += 1
+    return nb_rendered
+
+
+def regenerate_pictures(picture_ids: list[int]) -> int:
+    """Generate again the compressed versions and the thumbnails of the given pictures.
+
+    Returns:
+        The number of pictures whose thumbnails have been generated.
+    """
+    nb_rendered = 0
+    for picture in Picture.objects.filter(id__in=picture_ids):
+        try:
+            picture.generate_variants()
+        except Exception:
+            logging.getLogger("main").exception(
+                "Couldn't generate the thumbnails of the picture %s", picture.id
+            )
+            continue
+        nb_rendered += 1
+    return nb_rendered
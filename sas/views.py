@@ -30,6 +30,7 @@ from core.views import CanEditMixin, CanViewMixin
 from core.views.files import FileView, MultipleImageField, send_file
 from core.views.forms import SelectDate
 from sas.models import Album, PeoplePictureRelation, Picture
+from sas.uploads import rotate_pictures, upload_pictures
 
 
 class SASForm(forms.Form):
@@ -58,29 +59,13 @@ class SASForm(forms.Form):
                 _("Error creating album %(album)s: %(msg)s")
                 % {"album": self.cleaned_data["album_name"], "msg": repr(e)},
             )
-        for f in files:
-            new_file = Picture(
-                parent=parent,
-                name=f.name,
-                file=f,
-                owner=owner,
-                mime_type=f.content_type,
-                size=f.size,
-                is_folder=False,
-                is_moderated=automodere,
+        _, errors = upload_pictures(parent, owner, files, automodere=automodere)
+        for file_name, e in errors.items():
+            self.add_error(
+                None,
+                _("Error uploading file %(file_name)s: %(msg)s")
+                % {"file_name": file_name, "msg": repr(e)},
             )
-            if automodere:
-                new_file.moderator = owner
-            try:
-                new_file.clean()
-                new_file.generate_thumbnails()
-                new_file.save()
-            except Exception as e:
-                self.add_error(
-                    None,
-                    _("Error uploading file %(file_name)s: %(msg)s")
-                    % {"file_name": f, "msg": repr(e)},
-                )
 
 
 class RelationForm(forms.ModelForm):
@@ -135,9 +120,9 @@ class PictureView(CanViewMixin, DetailView):
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
         if "rotate_right" in request.GET:
-            self.object.rotate(270)
+            rotate_pictures([self.object], 270)
         if "rotate_left" in request.GET:
-            self.object.rotate(90)
+            rotate_pictures([self.object], 90)
         if "ask_removal" in request.GET.keys():
             self.object.is_moderated = False
             self.object.asked_for_removal = True
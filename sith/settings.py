@@ -149,6 +149,7 @@ TEMPLATES = [
             ],
             "filters": {
                 "markdown": "core.templatetags.renderer.markdown",
+                "rendered_markdown": "core.templatetags.renderer.rendered_markdown",
                 "phonenumber": "core.templatetags.renderer.phonenumber",
                 "truncate_time": "core.templatetags.renderer.truncate_time",
                 "format_timedelta": "core.templatetags.renderer.format_timedelta",
@@ -0,0 +1,181 @@
+"""Import of many subscribers at once.
+
+At the start of the year, the subscriptions taken on paper
+or by the school are imported from a CSV file.
+Creating them one by one through the subscription form
+generates the username, the account and the home of each user
+with several queries per user.
+[import_subscribers][subscription.imports.import_subscribers]
+creates all of them with a few bulk queries.
+
+Example:
+    ```python
+    with open("subscribers.csv") as f:
+        rows = [SubscriberRow.from_csv(line) for line in csv.DictReader(f)]
+    subscriptions = import_subscribers(rows)
+    ```
+"""
+
+from __future__ import annotations
+
+import secrets
+from collections import Counter
+from datetime import date
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.translation import gettext as _
+from haystack import connection_router, connections
+
+from core.models import PermissionSnapshot, SithFile, User
+from counter.models import Customer, CustomerSummary
+from subscription.models import Subscription
+
+
+class SubscriberRow(NamedTuple):
+    """A subscriber to import."""
+
+    first_name: str
+    last_name: str
+    email: str
+    date_of_birth: date
+    subscription_type: str
+    payment_method: str
+    location: str
+
+    @classmethod
+    def from_csv(cls, line: dict[str, str]) -> SubscriberRow:
+        """Read a line of a CSV file whose columns are named like the fields.
+
+        Raises:
+            ValidationError: if a value is missing or invalid
+        """
+        try:
+            row = cls(**{field: line[field].strip() for field in cls._fields})
+            row = row._replace(date_of_birth=date.fromisoformat(row.date_of_birth))
+        except (KeyError, ValueError) as e:
+            raise ValidationError(_("Invalid line: %(line)s") % {"line": line}) from e
+        if row.subscription_type not in settings.SITH_SUBSCRIPTIONS:
+            raise ValidationError(_("Bad subscription type"))
+        if row.payment_method not in dict(settings.SITH_SUBSCRIPTION_PAYMENT_METHOD):
+            raise ValidationError(_("Bad payment method"))
+        if row.location not in dict(settings.SITH_SUBSCRIPTION_LOCATIONS):
+            raise ValidationError(_("Bad location"))
+        return row
+
+
+def _make_homes(users: list[User]) -> None:
+    """Give a home folder to the users who don't have one yet.
+
+    This does the same as `User.make_home`, for all the users at once.
+    """
+    home_root = SithFile.objects.filter(parent=None, name="users").first()
+    users = [u for u in users if u.home_id is None]
+    if home_root is None or not users:
+        return
+    homes = SithFile.objects.bulk_create(
+        SithFile(parent=home_root, name=u.username, owner=u) for u in users
+    )
+    for user, home in zip(users, homes):
+        user.home = home
+    User.objects.bulk_update(users, ["home"])
+    for field in ("edit_groups", "view_groups"):
+        through = getattr(SithFile, field).through
+        groups = getattr(home_root, field).values_list("id", flat=True)
+        through.objects.bulk_create(
+            through(sithfile_id=home.id, group_id=group_id)
+            for home in homes
+            for group_id in groups
+        )
+
+
+def _index_users(users: list[User]) -> None:
+    """Add the given users to the search index.
+
+    This does the same as the `post_save` signal of each user.
+    """
+    for using in connection_router.for_write():
+        index = connections[using].get_unified_index().get_index(User)
+        connections[using].get_backend().update(index, users)
+
+
+def import_subscribers(
+    rows: list[SubscriberRow], *, send_mails: bool = True
+) -> list[Subscription]:
+    """Subscribe all the given people, creating the users who don't exist yet.
+
+    The users are matched with their email.
+    The new users get a generated username and a random password ;
+    as with the subscription form, the members without account
+    get a mail to choose their password.
+
+    Returns:
+        The created subscriptions, in the order of the rows.
+
+    Raises:
+        ValidationError: if several rows have the same email
+    """
+    emails = Counter(r.email.lower() for r in rows)
+    if duplicate := next((e for e, count in emails.items() if count > 1), None):
+        raise ValidationError(
+            _("The email %(email)s is on several lines") % {"email": duplicate}
+        )
+    with transaction.atomic():
+        existing = User.objects.in_bulk([r.email for r in rows], field_name="email")
+        new_users = {
+            r.email: User(
+                first_name=r.first_name,
+                last_name=r.last_name,
+                email=r.email,
+                date_of_birth=r.date_of_birth,
+            )
+            for r in rows
+            if r.email not in existing
+        }
+        # The password is a random secret that nobody knows, hashed only once
+        # because hashing it for each user would take most of the import.
+        # It must be usable, else the mail to choose a password isn't sent.
+        password = make_password(secrets.token_urlsafe(32))
+        for user in new_users.values():
+            user.password = password
+        User.generate_usernames(new_users.values())
+        User.objects.bulk_create(new_users.values())
+        users = existing | new_users
+        members = list({u.id: u for u in users.values()}.values())
+
+        subscriptions = []
+        for row in rows:
+            user = users[row.email]
+            duration = settings.SITH_SUBSCRIPTIONS[row.subscription_type]["duration"]
+            # only the existing users may have a subscription to extend
+            start = Subscription.compute_start(
+                duration=duration, user=user if row.email in existing else None
+            )
+            subscriptions.append(
+                Subscription(
+                    member=user,
+                    subscription_type=row.subscription_type,
+                    subscription_start=start,
+                    subscription_end=Subscription.compute_end(duration, start),
+                    payment_method=row.payment_method,
+                    location=row.location,
+                )
+            )
+        Subscription.objects.bulk_create(subscriptions)
+        had_account = set(
+            Customer.objects.filter(user__in=members).values_list("user_id", flat=True)
+        )
+        Customer.bulk_get_or_create(members)
+        _make_homes(members)
+    # the signals aren't sent by the bulk queries
+    PermissionSnapshot.invalidate([u.id for u in members])
+    CustomerSummary.invalidate([u.id for u in members])
+    _index_users(list(new_users.values()))
+    if send_mails:
+        for user in members:
+            if user.id not in had_account:
+                Subscription.send_welcome_mail(user)
+    return subscriptions
@@ -0,0 +1,39 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from subscription.imports import SubscriberRow, import_subscribers
+
+
+class Command(BaseCommand):
+    help = (
+        "Subscribe all the people of a CSV file, creating the missing users. "
+        "The columns of the file are first_name, last_name, email, "
+        "date_of_birth (YYYY-MM-DD), subscription_type, payment_method and location."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="The CSV file of the subscribers")
+        parser.add_argument(
+            "--no-mail",
+            help="Don't send to the new members the mail to choose their password",
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        with open(options["file"], newline="") as f:
+            try:
+                rows = [
+                    SubscriberRow.from_csv(line)
+                    for line in csv.DictReader(f, skipinitialspace=True)
+                ]
+            except ValidationError as e:
+                raise CommandError(e.messages[0]) from e
+        try:
+            subscriptions = import_subscribers(rows, send_mails=not options["no_mail"])
+        except ValidationError as e:
+            raise CommandError(e.messages[0]) from e
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(subscriptions)} subscriptions have been created.")
+        )
@@ -78,19 +78,24 @@ class Subscription(models.Model):
 
         _, created = Customer.get_or_create(self.member)
         if created:
-            form = PasswordResetForm({"email": self.member.email})
-            if form.is_valid():
-                form.save(
-                    use_https=True,
-                    email_template_name="core/new_user_email.jinja",
-                    subject_template_name="core/new_user_email_subject.jinja",
-                    from_email="ae@utbm.fr",
-                )
+            self.send_welcome_mail(self.member)
         self.member.make_home()
 
     def get_absolute_url(self):
         return reverse("core:user_edit", kwargs={"user_id": self.member.pk})
 
+    @staticmethod
+    def send_welcome_mail(user: User) -> None:
+        """Send to a new member the link to choose a password."""
+        form = PasswordResetForm({"email": user.email})
+        if form.is_valid():
+            form.save(
+                use_https=True,
+                email_template_name="core/new_user_email.jinja",
+                subject_template_name="core/new_user_email_subject.jinja",
+                from_email="ae@utbm.fr",
+            )
+
     def clean(self):
         today = timezone.now().date()
         active_subscriptions = Subscription.objects.exclude(pk=self.pk).filter(
@@ -13,12 +13,18 @@
 #
 #
 from datetime import date
+from io import StringIO
+from tempfile import NamedTemporaryFile
 
 import freezegun
 import pytest
 from django.conf import settings
+from django.core import mail
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.urls import reverse
 
+from core.baker_recipes import subscriber_user
 from core.models import User
 from subscription.models import Subscription
 
@@ -215,3 +221,72 @@ class TestSubscriptionIntegration(TestCase):
                 user=user,
             )
             assert d == date(2016, 11, 5)
+
+
+class TestImportSubscribers(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # remove the imported users from the search index
+        call_command("update_index", "core", "--remove")
+
+    def test_import(self):
+        existing = User.objects.get(username="public")
+        with NamedTemporaryFile("w", suffix=".csv") as f:
+            f.write(
+                "first_name,last_name,email,date_of_birth,subscription_type,"
+                "payment_method,location\n"
+                f"Guy,Carlier,{existing.email},2000-01-01,un-semestre,CASH,BELFORT\n"
+                "Jean,Valjean,jean@example.com,2001-02-03,deux-semestres,CARD,SEVENANS\n"
+                "Jeanne,Valjean,jeanne@example.com,2002-03-04,un-semestre,CARD,BELFORT\n"
+            )
+            f.flush()
+            call_command("import_subscribers", f.name, stdout=StringIO())
+        jean = User.objects.get(email="jean@example.com")
+        jeanne = User.objects.get(email="jeanne@example.com")
+        assert (jean.username, jeanne.username) == ("jvaljean", "jvaljean1")
+        for user in (existing, jean, jeanne):
+            assert user.is_subscribed
+            assert hasattr(user, "customer")
+        assert jean.home.parent.name == "users"
+        assert jean.subscriptions.get().subscription_type == "deux-semestres"
+        # the public user had no account, so all three get a mail
+        assert len(mail.outbox) == 3
+
+    def test_invalid_file(self):
+        with NamedTemporaryFile("w", suffix=".csv") as f:
+            f.write("first_name,last_name\nGuy,Carlier\n")
+            f.flush()
+            with pytest.raises(CommandError):
+                call_command("import_subscribers", f.name)
+
+    def test_imported_users_searchable(self):
+        """Test that the imported users can be found by the user search."""
+        with NamedTemporaryFile("w", suffix=".csv") as f:
+            f.write(
+                "first_name,last_name,email,date_of_birth,subscription_type,"
+                "payment_method,location\n"
+                "Fantine,Thenardier,fantine@example.com,2001-02-03,un-semestre,"
+                "CARD,BELFORT\n"
+            )
+            f.flush()
+            call_command("import_subscribers", f.name, stdout=StringIO())
+        fantine = User.objects.get(email="fantine@example.com")
+        self.client.force_login(subscriber_user.make())
+        response = self.client.get(reverse("api:search_users") + "?search=thenard")
+        assert response.status_code == 200
+        assert [r["id"] for r in response.json()["results"]] == [fantine.id]
+
+    def test_duplicate_email(self):
+        """Test that a file with the same email on several lines is rejected."""
+        with NamedTemporaryFile("w", suffix=".csv") as f:
+            f.write(
+                "first_name,last_name,email,date_of_birth,subscription_type,"
+                "payment_method,location\n"
+                "Jean,Valjean,jean@example.com,2001-02-03,un-semestre,CARD,BELFORT\n"
+                "Jean,Valjean,Jean@example.com,2001-02-03,un-semestre,CASH,BELFORT\n"
+            )
+            f.flush()
+            with pytest.raises(CommandError):
+                call_command("import_subscribers", f.name)
+        assert not User.objects.filter(email__iexact="jean@example.com").exists()